@@ -1,21 +1,32 @@
+import uuid
 from typing import TypedDict
 
+from langchain_core.runnables import RunnableLambda
+from langgraph.config import get_stream_writer
 from langgraph.graph import StateGraph, END
 
 # Import existing tools/logic
 # Import existing tools/logic
 try:
-    from .tools import query_medgemma, call_emergency_contact
-    from .safety_guards import detect_emergency, extract_location_and_disease
-    from .config import GOOGLE_MAPS_API_KEY
+    from .tools import query_medgemma, stream_medgemma
+    from .emergency import request_emergency_call
+    from .safety_guards import scan_intent, classify_specialty
+    from .concurrency import run_blocking, upstream_slot, SingleFlight
+    from .providers import get_gmaps
+    from .cache import TTLCache
+    from .chat_cache import chat_cache, bypass_reason, normalize_question
+    from .tracing import traced
+    from .config import MAPS_SEARCH_RADIUS, MAPS_CACHE_ITEMS, GEOCODE_TTL_SECONDS, PLACES_TTL_SECONDS
 except ImportError:
-    from tools import query_medgemma, call_emergency_contact
-    from safety_guards import detect_emergency, extract_location_and_disease
-    from config import GOOGLE_MAPS_API_KEY
-import googlemaps
-
-# Initialize Google Maps
-gmaps = googlemaps.Client(key=GOOGLE_MAPS_API_KEY)
+    from tools import query_medgemma, stream_medgemma
+    from emergency import request_emergency_call
+    from safety_guards import scan_intent, classify_specialty
+    from concurrency import run_blocking, upstream_slot, SingleFlight
+    from providers import get_gmaps
+    from cache import TTLCache
+    from chat_cache import chat_cache, bypass_reason, normalize_question
+    from tracing import traced
+    from config import MAPS_SEARCH_RADIUS, MAPS_CACHE_ITEMS, GEOCODE_TTL_SECONDS, PLACES_TTL_SECONDS
 
 # ==============================================================================
 # 1. State Definition
@@ -24,71 +35,144 @@ gmaps = googlemaps.Client(key=GOOGLE_MAPS_API_KEY)
 class AgentState(TypedDict):
     input: str
     output: str
+    # When True, chat_action emits tokens through the graph's custom stream
+    stream: bool
+    # Session context for the chat prompt (sessions.SessionStore.context) or None
+    history: dict
+    # Who is asking ("session:<id>", or a one-off "anonymous:<uuid>"): one emergency call per caller per cooldown
+    caller: str
     # Internal flags for routing
     is_emergency: bool
-    location_query: dict  # {'location': str, 'disease': str} or None
+    intent: object  # safety_guards.Intent from the single scan in safety_guard
+    location_query: dict  # {'location': str, 'disease': str, 'specialist': str} or None
 
 
 # ==============================================================================
 # 2. Tool / Helper Functions (Preserved from original)
 # ==============================================================================
 
-def execute_emergency_call(message: str) -> str:
-    """Wrapper to call the Twilio emergency function."""
-    call_emergency_contact()
+def execute_emergency_call(caller: str = None) -> str:
+    """
+    Queues the Twilio call in the emergency outbox (emergency.py) and answers at once; a dispatcher
+    thread places it, retrying with backoff. Repeats from the same caller within the cooldown
+    share the call already queued or placed; without a caller the call is always queued.
+    """
+    request_emergency_call(caller or f"anonymous:{uuid.uuid4().hex}")
     return "Emergency helpline has been contacted immediately. Please stay safe — help is on the way."
 
-def execute_medgemma_chat(query: str) -> str:
+CHAT_FALLBACK_MESSAGE = (
+    "I'm having technical difficulties, but I want you to know your feelings matter. "
+    "Please try again shortly."
+)
+
+def execute_medgemma_chat(query: str, history: dict = None) -> str:
     """Wrapper to call the Gemini Medical Agent."""
     try:
-        return query_medgemma(query)
+        return query_medgemma(query, history)
+    except Exception:
+        return CHAT_FALLBACK_MESSAGE
+
+def execute_medgemma_chat_stream(query: str, emit, history: dict = None) -> str:
+    """Streams the Gemini answer through emit(text) and returns the full answer."""
+    parts = []
+    try:
+        for chunk in stream_medgemma(query, history):
+            parts.append(chunk)
+            emit(chunk)
     except Exception:
-        return (
-            "I'm having technical difficulties, but I want you to know your feelings matter. "
-            "Please try again shortly."
+        if not parts:
+            # Nothing was sent yet: let the caller deliver the fallback as the output
+            return CHAT_FALLBACK_MESSAGE
+        tail = "\n\n" + CHAT_FALLBACK_MESSAGE
+        parts.append(tail)
+        emit(tail)
+    return "".join(parts)
+
+# Geocodes and place lists repeat constantly (same cities, same specialties)
+geocode_cache = TTLCache(MAPS_CACHE_ITEMS, GEOCODE_TTL_SECONDS)
+places_cache = TTLCache(MAPS_CACHE_ITEMS, PLACES_TTL_SECONDS)
+
+
+def normalize_location(location: str) -> str:
+    return " ".join(location.lower().split()).strip(" ,.")
+
+
+def geocode_location(location: str):
+    """(lat, lng) of a location string, or None. Cached for GEOCODE_TTL_SECONDS."""
+    key = normalize_location(location)
+    coords = geocode_cache.get(key)
+    if coords is not None:
+        return coords
+
+    with upstream_slot("maps"):
+        geocode_result = get_gmaps().geocode(location)
+    if not geocode_result:
+        return None
+
+    coords = (
+        geocode_result[0]["geometry"]["location"]["lat"],
+        geocode_result[0]["geometry"]["location"]["lng"],
+    )
+    geocode_cache.set(key, coords)
+    return coords
+
+
+def nearby_places(coords, specialist: str, location: str, radius: int = MAPS_SEARCH_RADIUS) -> list:
+    """Places matching the specialist around coords. Cached for PLACES_TTL_SECONDS."""
+    # ~10 m precision: nearby spellings of the same city share an entry
+    key = (round(coords[0], 4), round(coords[1], 4), specialist, radius)
+    results = places_cache.get(key)
+    if results is not None:
+        return results
+
+    query = f"{specialist} in {location}"
+    with upstream_slot("maps"):
+        places_result = get_gmaps().places_nearby(
+            location=coords,
+            radius=radius,
+            keyword=query,
+            type="doctor"
         )
 
-def execute_maps_search(location: str, disease: str = None) -> str:
-    """Performs the Google Maps search."""
-    # Disease → Specialist mapping
-    specialty_map = {
-        "depression": "psychiatrist", "anxiety": "psychiatrist", "stress": "therapist",
-        "mental": "psychologist", "suicide": "psychiatrist", "diabetes": "endocrinologist",
-        "skin": "dermatologist", "rash": "dermatologist", "acne": "dermatologist",
-        "heart": "cardiologist", "chest": "cardiologist", "blood": "hematologist",
-        "eye": "ophthalmologist", "vision": "ophthalmologist", "stomach": "gastroenterologist",
-        "cough": "general physician", "cold": "general physician", "fever": "general physician",
-        "infection": "general physician", "thyroid": "endocrinologist", "bone": "orthopedic",
-        "joint": "orthopedic", "teeth": "dentist", "dental": "dentist", "cancer": "oncologist",
-        "allergy": "immunologist"
-    }
+    results = places_result.get("results", [])
+    places_cache.set(key, results)
+    return results
+
+
+def maps_cache_stats() -> dict:
+    return {"geocode": geocode_cache.stats(), "places": places_cache.stats()}
+
+
+def chat_cache_stats() -> dict:
+    return {**chat_cache.stats(), "coalesced": chat_flight.stats()}
+
 
-    specialist = "doctor"
-    if disease:
-        for keyword, spec in specialty_map.items():
-            if keyword.lower() in disease.lower():
-                specialist = spec
-                break
+# Identical questions asked while the answer is still being generated share that generation
+chat_flight = SingleFlight()
+
+
+def chat_flight_key(message: str, reason, caller: str = None):
+    """
+    General questions coalesce across everyone (the answer would be cached for them anyway);
+    personal or session messages only with the same caller's repeats (e.g. a double-click).
+    """
+    normalized = normalize_question(message) or message
+    return normalized if reason is None else f"{caller}\n{normalized}"
+
+
+def execute_maps_search(location: str, disease: str = None, specialist: str = None) -> str:
+    """Performs the Google Maps search."""
+    # Disease → Specialist (safety_guards.SPECIALTY_MAP), unless the router already resolved it
+    specialist = specialist or classify_specialty(disease)
 
     try:
         # Geocode
-        geocode_result = gmaps.geocode(location)
-        if not geocode_result:
+        coords = geocode_location(location)
+        if not coords:
             return f"⚠️ Couldn't find coordinates for '{location}'."
 
-        lat = geocode_result[0]["geometry"]["location"]["lat"]
-        lng = geocode_result[0]["geometry"]["location"]["lng"]
-
         # Places Search
-        query = f"{specialist} in {location}"
-        places_result = gmaps.places_nearby(
-            location=(lat, lng),
-            radius=5000,
-            keyword=query,
-            type="doctor"
-        )
-
-        results = places_result.get("results", [])
+        results = nearby_places(coords, specialist, location)
         if not results:
             return f"😕 No {specialist}s found near {location}."
 
@@ -111,36 +195,90 @@ def execute_maps_search(location: str, disease: str = None) -> str:
 # ==============================================================================
 
 def node_safety_guard(state: AgentState):
-    """Checks for emergency keywords."""
-    user_input = state["input"]
-    is_danger = detect_emergency(user_input)
-    return {"is_emergency": is_danger}
+    """Scans the message once: emergency keywords plus location/disease for the router."""
+    intent = scan_intent(state["input"])
+    return {"is_emergency": intent.is_emergency, "intent": intent}
 
 def node_emergency_action(state: AgentState):
     """Executes emergency protocol."""
-    result = execute_emergency_call(state["input"])
+    result = execute_emergency_call(state.get("caller"))
     return {"output": result}
 
 def node_router(state: AgentState):
     """Checks if the user is asking for a location."""
-    user_input = state["input"]
-    loc, dis = extract_location_and_disease(user_input)
-    if loc:
-        return {"location_query": {"location": loc, "disease": dis}}
+    intent = state.get("intent") or scan_intent(state["input"])
+    if intent.location:
+        return {"location_query": {
+            "location": intent.location,
+            "disease": intent.disease,
+            "specialist": intent.specialist,
+        }}
     return {"location_query": None}
 
 def node_maps_action(state: AgentState):
     """Executes the maps search."""
     data = state["location_query"]
-    result = execute_maps_search(data["location"], data["disease"])
+    result = execute_maps_search(data["location"], data["disease"], data.get("specialist"))
     return {"output": result}
 
 def node_chat_action(state: AgentState):
-    """Executes the standard medical chat."""
-    result = execute_medgemma_chat(state["input"])
+    """
+    Executes the standard medical chat (general questions may be answered from chat_cache).
+    Concurrent identical questions share one generation (chat_flight).
+    """
+    reason = bypass_reason(state["input"], state.get("history"), state.get("intent"))
+    cacheable = False
+    if chat_cache.enabled:
+        if reason:
+            chat_cache.note_bypass(reason)
+        else:
+            cacheable = True
+            cached = chat_cache.get(state["input"])
+            if cached is not None:
+                if state.get("stream"):
+                    get_stream_writer()({"token": cached})
+                return {"output": cached}
+
+    writer = get_stream_writer() if state.get("stream") else None
+
+    def generate():
+        if writer is not None:
+            return execute_medgemma_chat_stream(
+                state["input"], lambda text: writer({"token": text}), state.get("history")
+            )
+        return execute_medgemma_chat(state["input"], state.get("history"))
+
+    key = chat_flight_key(state["input"], reason, state.get("caller"))
+    result, shared = chat_flight.do(key, generate)
+    if shared:
+        # Another request generated (and stores) it; a streaming follower gets it as one token
+        if writer is not None:
+            writer({"token": result})
+        return {"output": result}
+
+    # Fallback answers (Gemini failed, possibly mid-stream) are never cached
+    if cacheable and not result.endswith(CHAT_FALLBACK_MESSAGE):
+        chat_cache.set(state["input"], result)
     return {"output": result}
 
 
+def make_node(func, blocking: bool = False):
+    """
+    Wraps a node so the graph supports both invoke() and ainvoke().
+    Blocking nodes (network calls) run on the dedicated executor under ainvoke;
+    cheap CPU-only nodes run inline on the event loop.
+    Each node is timed as a "graph.<name>" stage (tracing.py).
+    """
+    func = traced(f"graph.{func.__name__.removeprefix('node_')}")(func)
+
+    async def afunc(state: AgentState):
+        if blocking:
+            return await run_blocking(func, state)
+        return func(state)
+
+    return RunnableLambda(func, afunc=afunc, name=func.__name__)
+
+
 # ==============================================================================
 # 4. Graph Construction
 # ==============================================================================
@@ -148,11 +286,11 @@ def node_chat_action(state: AgentState):
 workflow = StateGraph(AgentState)
 
 # Add Nodes
-workflow.add_node("safety_guard", node_safety_guard)
-workflow.add_node("emergency_action", node_emergency_action)
-workflow.add_node("router", node_router)
-workflow.add_node("maps_action", node_maps_action)
-workflow.add_node("chat_action", node_chat_action)
+workflow.add_node("safety_guard", make_node(node_safety_guard))
+workflow.add_node("emergency_action", make_node(node_emergency_action, blocking=True))
+workflow.add_node("router", make_node(node_router))
+workflow.add_node("maps_action", make_node(node_maps_action, blocking=True))
+workflow.add_node("chat_action", make_node(node_chat_action, blocking=True))
 
 # Add Edges
 workflow.set_entry_point("safety_guard")
@@ -190,5 +328,5 @@ workflow.add_edge("emergency_action", END)
 workflow.add_edge("maps_action", END)
 workflow.add_edge("chat_action", END)
 
-# Compile
+# Compile (use graph.ainvoke from async code so blocking nodes leave the event loop)
 graph = workflow.compile()
@@ -0,0 +1,334 @@
+import re
+from datetime import date
+from typing import NamedTuple, Optional
+
+# Bump when the tables or patterns below change (part of the biomarkers cache version)
+PARSER_VERSION = "3"
+
+# -----------------------------------------------------------
+# 1. Analyte Aliases
+# -----------------------------------------------------------
+# Canonical name → spellings seen on lab printouts. Canonical names follow the
+# Gemini prompt's convention ('HbA1c', 'Glucose Fasting', 'Total Cholesterol').
+ANALYTES = {
+    # Diabetes
+    "HbA1c": ["hba1c", "hb a1c", "a1c", "glycated hemoglobin", "glycated haemoglobin",
+              "glycosylated hemoglobin", "glycosylated haemoglobin"],
+    "Glucose Fasting": ["glucose fasting", "fasting glucose", "fasting blood sugar", "blood sugar fasting",
+                        "fasting plasma glucose", "plasma glucose fasting", "fbs", "fpg"],
+    "Glucose Postprandial": ["glucose postprandial", "postprandial glucose", "post prandial glucose",
+                             "post prandial blood sugar", "blood sugar pp", "glucose pp", "ppbs"],
+    "Glucose Random": ["glucose random", "random glucose", "random blood sugar", "rbs"],
+
+    # Lipid profile
+    "Total Cholesterol": ["total cholesterol", "cholesterol total", "serum cholesterol", "cholesterol"],
+    "HDL Cholesterol": ["hdl cholesterol", "cholesterol hdl", "hdl c", "hdl"],
+    "LDL Cholesterol": ["ldl cholesterol", "cholesterol ldl", "ldl c", "ldl"],
+    "VLDL Cholesterol": ["vldl cholesterol", "vldl"],
+    "Triglycerides": ["triglycerides", "triglyceride", "serum triglycerides"],
+
+    # Complete blood count
+    "Hemoglobin": ["hemoglobin", "haemoglobin", "hgb", "hb"],
+    "WBC": ["total leucocyte count", "total leukocyte count", "white blood cell count", "white blood cells",
+            "wbc count", "wbc", "tlc"],
+    "RBC": ["total rbc count", "red blood cell count", "red blood cells", "rbc count", "rbc"],
+    "Platelets": ["platelet count", "platelets", "plt"],
+    "Hematocrit": ["hematocrit", "haematocrit", "packed cell volume", "hct", "pcv"],
+    "MCV": ["mean corpuscular volume", "mcv"],
+    "MCH": ["mean corpuscular hemoglobin", "mch"],
+    "MCHC": ["mean corpuscular hemoglobin concentration", "mchc"],
+    "ESR": ["erythrocyte sedimentation rate", "esr"],
+
+    # Kidney
+    "Creatinine": ["serum creatinine", "creatinine"],
+    "Urea": ["blood urea", "serum urea", "urea"],
+    "BUN": ["blood urea nitrogen", "bun"],
+    "Uric Acid": ["serum uric acid", "uric acid"],
+    "eGFR": ["estimated gfr", "egfr"],
+    "Sodium": ["serum sodium", "sodium"],
+    "Potassium": ["serum potassium", "potassium"],
+    "Chloride": ["serum chloride", "chloride"],
+    "Calcium": ["serum calcium", "calcium"],
+
+    # Liver
+    "ALT": ["alanine aminotransferase", "sgpt", "alt"],
+    "AST": ["aspartate aminotransferase", "sgot", "ast"],
+    "ALP": ["alkaline phosphatase", "alp"],
+    "Bilirubin Total": ["total bilirubin", "bilirubin total", "serum bilirubin"],
+    "Bilirubin Direct": ["direct bilirubin", "bilirubin direct", "conjugated bilirubin"],
+    "Albumin": ["serum albumin", "albumin"],
+    "Total Protein": ["total protein", "protein total", "serum protein"],
+
+    # Thyroid
+    "TSH": ["thyroid stimulating hormone", "tsh"],
+    "Free T3": ["free t3", "ft3"],
+    "Free T4": ["free t4", "ft4"],
+    "T3": ["total t3", "triiodothyronine", "t3"],
+    "T4": ["total t4", "thyroxine", "t4"],
+
+    # Vitamins, iron, inflammation
+    "Vitamin D": ["25 hydroxy vitamin d", "25 oh vitamin d", "vitamin d3", "vitamin d", "vit d"],
+    "Vitamin B12": ["vitamin b12", "vit b12", "cobalamin", "b12"],
+    "Ferritin": ["serum ferritin", "ferritin"],
+    "Iron": ["serum iron", "iron"],
+    "hs-CRP": ["high sensitivity crp", "hs crp", "hscrp"],
+    "CRP": ["c reactive protein", "crp"],
+    "PSA": ["prostate specific antigen", "psa"],
+
+    # Vitals
+    "Heart Rate": ["heart rate", "pulse rate", "pulse"],
+    "Weight": ["body weight", "weight"],
+    "BMI": ["body mass index", "bmi"],
+}
+
+# Units as printed on reports; matching ignores case and the µ/μ/u spelling
+UNITS = [
+    "g/dL", "g/L", "mg/dL", "mg/L", "µg/dL", "µg/L", "ng/mL", "ng/dL", "pg/mL", "pg", "fL",
+    "mmol/L", "mmol/mol", "µmol/L", "nmol/L", "pmol/L", "mEq/L", "mIU/L", "mIU/mL", "µIU/mL", "IU/L", "IU/mL", "U/L",
+    "x10^3/µL", "10^3/µL", "x10^6/µL", "10^6/µL", "x10^9/L", "10^9/L", "x10^12/L", "10^12/L",
+    "cells/µL", "cells/cumm", "lakhs/cumm", "million/cumm", "mill/cumm", "/cumm", "/µL",
+    "mm/hr", "mm/1st hr", "mL/min/1.73m2", "mmHg", "bpm", "kg/m2", "kg", "%",
+]
+
+
+def _normalize_name(name: str) -> str:
+    """'Glucose, Fasting (FBS)' → 'glucose fasting fbs'."""
+    return " ".join(re.findall(r"[a-z0-9]+", name.lower()))
+
+
+# normalized alias → canonical name
+ALIASES = {
+    _normalize_name(alias): canonical
+    for canonical, aliases in ANALYTES.items()
+    for alias in [canonical] + aliases
+}
+
+
+def canonical_name(name: str) -> str:
+    """Canonical analyte name for a spelling, or the name itself if it isn't in the table."""
+    return ALIASES.get(_normalize_name(name), name)
+
+
+def _alias_regex(alias: str) -> str:
+    # Words may be separated by spaces, commas, dashes or dots ("Glucose, Fasting", "HDL-C")
+    return r"[\s,.\-]*".join(re.escape(word) for word in alias.split())
+
+
+def _unit_regex(unit: str) -> str:
+    pattern = re.escape(unit).replace("µ", "[µμu]").replace(r"\^", r"\^?")
+    return pattern + (r"(?![A-Za-z])" if unit[-1].isalpha() else "")
+
+
+# Longest first, so "HDL Cholesterol" wins over "Cholesterol" and "Free T3" over "T3"
+ALIAS_PATTERN = re.compile(
+    r"(?<![A-Za-z0-9])(" + "|".join(_alias_regex(a) for a in sorted(ALIASES, key=len, reverse=True)) + r")(?![A-Za-z0-9])",
+    re.IGNORECASE,
+)
+
+UNIT_PATTERN = "|".join(_unit_regex(u) for u in sorted(UNITS, key=len, reverse=True))
+
+
+def unit_key(unit: str) -> str:
+    """Comparable form of a unit spelling: 'x10³/μL' → '103/ul', 'mg/dL' → 'mg/dl'."""
+    key = unit.lower().replace("µ", "u").replace("μ", "u").replace("^", "").replace("³", "3").replace(" ", "")
+    return key.lstrip("x*×")
+
+
+_UNIT_SPELLING = {unit_key(u): u for u in UNITS}
+
+# -----------------------------------------------------------
+# 2. Value / Unit / Reference Range
+# -----------------------------------------------------------
+_NUMBER = r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?"
+
+VALUE_PATTERN = re.compile(
+    rf"""
+    (?P<gap>(?:\([^()\n]{{0,30}}\)|[^\d\n<>()]){{0,40}}?)    # method / separators: " (HPLC) : "
+    (?P<cmp>[<>]=?)?\s*
+    (?P<value>{_NUMBER})(?![\d/])
+    (?:\s*(?P<flag>[HL]|High|Low)(?![A-Za-z]))?
+    (?:\s*(?P<unit>{UNIT_PATTERN}))?
+    (?:\s*(?P<flag2>[HL]|High|Low)(?![A-Za-z]))?
+    (?:
+        \s*[\[(]?\s*(?:(?:bio\.?\s*)?ref(?:erence)?\.?\s*(?:range|interval)?|normal(?:\s*range)?)?\s*:?\s*
+        (?:(?P<low>{_NUMBER})\s*(?:-|–|to)\s*(?P<high>{_NUMBER})|(?P<rcmp>[<>]=?)\s*(?P<limit>{_NUMBER}))
+    )?
+    """,
+    re.IGNORECASE | re.VERBOSE,
+)
+
+BLOOD_PRESSURE_PATTERN = re.compile(
+    r"(?<![A-Za-z])(?:blood\s*pressure|b\.?p\.?)\s*[:\-]?\s*(?P<sys>\d{2,3})\s*/\s*(?P<dia>\d{2,3})(?:\s*mm\s*hg)?",
+    re.IGNORECASE,
+)
+
+# A name followed by a number with a unit: something a lab line would look like
+MEASUREMENT_HINT = re.compile(
+    rf"[A-Za-z][A-Za-z0-9 ,()/.\-]{{1,40}}?[\s:]\s*[<>]?(?:{_NUMBER})\s*(?:{UNIT_PATTERN})",
+    re.IGNORECASE,
+)
+
+# -----------------------------------------------------------
+# 3. Dates
+# -----------------------------------------------------------
+_MONTHS = {m: i for i, m in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], start=1
+)}
+_MONTH = r"(?P<mon>jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?"
+
+DATE_PATTERNS = [
+    re.compile(r"(?<!\d)(?P<y>(?:19|20)\d{2})[-/.](?P<m>\d{1,2})[-/.](?P<d>\d{1,2})(?!\d)"),
+    re.compile(r"(?<!\d)(?P<a>\d{1,2})[-/.](?P<b>\d{1,2})[-/.](?P<y>(?:19|20)\d{2})(?!\d)"),
+    re.compile(rf"(?<!\d)(?P<d>\d{{1,2}})(?:st|nd|rd|th)?[\s\-/.,]*{_MONTH}[\s\-/.,]*(?P<y>(?:19|20)\d{{2}})(?!\d)", re.IGNORECASE),
+    re.compile(rf"(?<![A-Za-z]){_MONTH}\s*(?P<d>\d{{1,2}})(?:st|nd|rd|th)?,?\s*(?P<y>(?:19|20)\d{{2}})(?!\d)", re.IGNORECASE),
+]
+
+# Label just before a date → preference (lower wins); birth dates are never the report date
+_DATE_LABELS = [
+    (re.compile(r"(?:birth|dob|d\.o\.b)", re.IGNORECASE), None),
+    (re.compile(r"(?:collect|sample|specimen|drawn)", re.IGNORECASE), 0),
+    (re.compile(r"report", re.IGNORECASE), 1),
+    (re.compile(r"date", re.IGNORECASE), 2),
+]
+_DATE_LABEL_WINDOW = 40
+
+
+def _date_from_match(match, day_first: bool) -> Optional[str]:
+    groups = match.groupdict()
+    year = int(groups["y"])
+    if groups.get("mon"):
+        month, day = _MONTHS[groups["mon"].lower()[:3]], int(groups["d"])
+    elif groups.get("a"):
+        a, b = int(groups["a"]), int(groups["b"])
+        # 13/02/2024 and 02/13/2024 are unambiguous; otherwise follow day_first
+        day, month = (a, b) if (day_first and b <= 12) or a > 12 else (b, a)
+    else:
+        month, day = int(groups["m"]), int(groups["d"])
+    try:
+        return date(year, month, day).isoformat()
+    except ValueError:
+        return None
+
+
+def _date_preference(text: str, start: int) -> Optional[int]:
+    """
+    Best label rank before a date on the same line: 3 when unlabelled,
+    None when the nearest preceding label is a birth date ("DOB:").
+    """
+    window_start = max(0, start - _DATE_LABEL_WINDOW, text.rfind("\n", 0, start) + 1)
+    label = text[window_start:start]
+    preference, after = 3, 0
+    for label_pattern, rank in _DATE_LABELS:
+        for found in label_pattern.finditer(label):
+            if rank is None:
+                preference, after = None, found.end()
+            elif found.start() >= after and (preference is None or rank < preference):
+                preference = rank
+    return preference
+
+
+def find_report_date(text: str, day_first: bool = True) -> Optional[str]:
+    """YYYY-MM-DD of the collection/report date, preferring labelled dates; None if there is none."""
+    best = None  # (preference, position, iso)
+    for pattern in DATE_PATTERNS:
+        for match in pattern.finditer(text):
+            iso = _date_from_match(match, day_first)
+            if iso is None:
+                continue
+            preference = _date_preference(text, match.start())
+            if preference is None:
+                continue
+            candidate = (preference, match.start(), iso)
+            if best is None or candidate < best:
+                best = candidate
+    return best[2] if best else None
+
+
+# -----------------------------------------------------------
+# 4. Parser
+# -----------------------------------------------------------
+class LabParse(NamedTuple):
+    date: Optional[str]
+    metrics: list      # [{"name", "value", "unit", "source": "local", ["reference_range"]}]
+    unresolved: list   # text fragments that look like measurements but weren't parsed
+
+
+def _number(text: str) -> float:
+    value = float(text.replace(",", ""))
+    return int(value) if value.is_integer() and "." not in text else value
+
+
+def _unit_spelling(unit: Optional[str]) -> Optional[str]:
+    return _UNIT_SPELLING.get(unit_key(unit), unit) if unit else None
+
+
+def parse_lab_text(text: str, day_first: bool = True) -> LabParse:
+    """
+    Deterministic extraction of "<analyte> <value> <unit> <range>" results.
+    The first value found for an analyte wins. Fragments that look like
+    measurements but name no known analyte are returned as unresolved.
+    """
+    metrics = {}
+    consumed = []  # (start, end) spans of parsed results
+
+    match = BLOOD_PRESSURE_PATTERN.search(text)
+    if match:
+        metrics["Systolic BP"] = {"name": "Systolic BP", "value": int(match["sys"]), "unit": "mmHg", "source": "local"}
+        metrics["Diastolic BP"] = {"name": "Diastolic BP", "value": int(match["dia"]), "unit": "mmHg", "source": "local"}
+        consumed.append(match.span())
+
+    pos = 0
+    while True:
+        alias = ALIAS_PATTERN.search(text, pos)
+        if alias is None:
+            break
+        pos = alias.end()
+
+        name = ALIASES[_normalize_name(alias.group(1))]
+        result = VALUE_PATTERN.match(text, alias.end())
+        # A unit or a reference range is required, so "Hb 2 times" or "T3 (Page 2)" don't count;
+        # the gap must not name another analyte ("Hemoglobin  Platelet count 250"), though it may
+        # repeat this one ("Glucose, Fasting (FBS) : 110")
+        if result is None or not (result["unit"] or result["low"] or result["limit"]) or any(
+            ALIASES[_normalize_name(other.group(1))] != name for other in ALIAS_PATTERN.finditer(result["gap"])
+        ):
+            continue
+
+        pos = result.end()
+        consumed.append((alias.start(), result.end()))
+        if name in metrics:
+            continue
+
+        metric = {
+            "name": name,
+            "value": _number(result["value"]),
+            "unit": _unit_spelling(result["unit"]),
+            "source": "local",
+        }
+        if result["low"]:
+            metric["reference_range"] = {"low": _number(result["low"]), "high": _number(result["high"])}
+        elif result["limit"]:
+            bound = "high" if result["rcmp"].startswith("<") else "low"
+            metric["reference_range"] = {bound: _number(result["limit"])}
+        metrics[name] = metric
+
+    return LabParse(find_report_date(text, day_first), list(metrics.values()), _unresolved(text, consumed))
+
+
+def _unresolved(text: str, consumed: list) -> list:
+    """Lines (or pieces of lines between parsed results) that still look like measurements."""
+    pieces = []
+    last = 0
+    for start, end in sorted(consumed):
+        if start > last:
+            pieces.append(text[last:start])
+        last = max(last, end)
+    pieces.append(text[last:])
+
+    fragments = []
+    for piece in pieces:
+        for line in piece.splitlines():
+            line = line.strip()
+            if line and MEASUREMENT_HINT.search(line):
+                fragments.append(line)
+    return fragments
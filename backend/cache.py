@@ -0,0 +1,265 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    from .config import (
+        RESULT_CACHE_ENABLED, RESULT_CACHE_DB, RESULT_CACHE_MEMORY_ITEMS, RESULT_CACHE_DISK_ITEMS,
+    )
+    from .storage import SQLiteStore
+    from .concurrency import SingleFlight
+except ImportError:
+    from config import (
+        RESULT_CACHE_ENABLED, RESULT_CACHE_DB, RESULT_CACHE_MEMORY_ITEMS, RESULT_CACHE_DISK_ITEMS,
+    )
+    from storage import SQLiteStore
+    from concurrency import SingleFlight
+
+
+def sha256_hex(data) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+# -----------------------------------------------------------
+# In-memory LRU
+# -----------------------------------------------------------
+class LRUCache:
+    """Thread-safe, size-bounded LRU map."""
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                return default
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def set(self, key, value):
+        if self.max_items <= 0:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+# -----------------------------------------------------------
+# In-memory TTL + LRU
+# -----------------------------------------------------------
+class TTLCache:
+    """Thread-safe LRU map whose entries also expire ttl seconds after being set."""
+
+    def __init__(self, max_items: int, ttl: float):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._items[key]
+                self.misses += 1
+                return default
+            self._items.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl: float = None):
+        if self.max_items <= 0:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._items[key] = (expires_at, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "size": len(self._items),
+        }
+
+    def __len__(self):
+        return len(self._items)
+
+
+# -----------------------------------------------------------
+# Two-tier result cache (memory LRU + shared SQLite file)
+# -----------------------------------------------------------
+_MISSING = object()
+
+
+class ResultCache(SQLiteStore):
+    """
+    Content-addressed cache for pipeline stages.
+    Entries are keyed by (stage, stage version, content digest) and stored as JSON.
+    The SQLite tier is shared by every worker process pointing at the same file;
+    it is trimmed to max_disk_items by least-recent access. Hits in either tier count as
+    accesses; they are written in batches (every TOUCH_INTERVAL seconds, and before a trim).
+    """
+
+    TRIM_EVERY = 100  # inserts between disk trims
+    TOUCH_INTERVAL = 60.0  # seconds between batched writes of access times
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS results (
+        key TEXT PRIMARY KEY, value TEXT NOT NULL, accessed REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS results_accessed ON results(accessed);
+    """
+
+    def __init__(self, db_path: str, max_memory_items: int, max_disk_items: int, enabled: bool = True):
+        super().__init__(db_path)
+        self.max_disk_items = max_disk_items
+        self.enabled = enabled
+        self.memory = LRUCache(max_memory_items)
+        # Concurrent misses on the same key share one compute() (also when the cache is disabled)
+        self.flight = SingleFlight()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._inserts = 0
+        # Access times of hits (either tier), written to disk in one batch per TOUCH_INTERVAL
+        self._touched = {}
+        self._touch_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    # --- SQLite tier ---
+    def _disk_get(self, key):
+        row = self.conn().execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return _MISSING
+        return json.loads(row[0])
+
+    def _touch(self, key):
+        """Records a hit; the disk LRU order is refreshed in batches, not on every read."""
+        with self._touch_lock:
+            self._touched[key] = time.time()
+            if time.monotonic() - self._last_flush < self.TOUCH_INTERVAL:
+                return
+        self.flush_touches()
+
+    def flush_touches(self):
+        with self._touch_lock:
+            batch, self._touched = self._touched, {}
+            self._last_flush = time.monotonic()
+        if not batch:
+            return
+        try:
+            self.conn().executemany(
+                "UPDATE results SET accessed = ? WHERE key = ?", [(t, key) for key, t in batch.items()]
+            )
+        except sqlite3.Error as e:
+            print(f"Result cache touch failed: {e}")
+
+    def _disk_set(self, key, value):
+        conn = self.conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO results (key, value, accessed) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time()),
+        )
+        self._inserts += 1
+        if self._inserts % self.TRIM_EVERY == 0:
+            # Pending hits count as accesses, so hot entries (often memory hits) aren't trimmed
+            self.flush_touches()
+            conn.execute(
+                "DELETE FROM results WHERE key IN ("
+                " SELECT key FROM results ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_disk_items,),
+            )
+
+    # --- Public API ---
+    @staticmethod
+    def make_key(stage: str, version: str, digest: str) -> str:
+        return f"{stage}:{version}:{digest}"
+
+    def get(self, stage: str, version: str, digest: str, default=None):
+        if not self.enabled:
+            return default
+
+        key = self.make_key(stage, version, digest)
+        value = self.memory.get(key, _MISSING)
+        if value is not _MISSING:
+            self.stats["memory_hits"] += 1
+            self._touch(key)
+            return value
+
+        try:
+            value = self._disk_get(key)
+        except sqlite3.Error as e:
+            print(f"Result cache read failed: {e}")
+            value = _MISSING
+
+        if value is _MISSING:
+            self.stats["misses"] += 1
+            return default
+
+        self.stats["disk_hits"] += 1
+        self._touch(key)
+        self.memory.set(key, value)
+        return value
+
+    def set(self, stage: str, version: str, digest: str, value):
+        if not self.enabled:
+            return
+
+        key = self.make_key(stage, version, digest)
+        self.memory.set(key, value)
+        try:
+            self._disk_set(key, value)
+        except sqlite3.Error as e:
+            print(f"Result cache write failed: {e}")
+
+    def get_or_compute(self, stage: str, version: str, digest: str, compute, cacheable=None):
+        """
+        Returns the cached value, or compute() and stores it.
+        Exceptions from compute() propagate and nothing is stored; results for which
+        cacheable(value) is False (e.g. error strings) are returned but not stored.
+        Callers missing on a key whose compute() is already running wait for that run
+        and get its result (or exception), cacheable or not.
+        """
+        value = self.get(stage, version, digest, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        def compute_and_store():
+            value = compute()
+            if cacheable is None or cacheable(value):
+                self.set(stage, version, digest, value)
+            return value
+
+        value, _ = self.flight.do(self.make_key(stage, version, digest), compute_and_store)
+        return value
+
+
+result_cache = ResultCache(
+    RESULT_CACHE_DB,
+    max_memory_items=RESULT_CACHE_MEMORY_ITEMS,
+    max_disk_items=RESULT_CACHE_DISK_ITEMS,
+    enabled=RESULT_CACHE_ENABLED,
+)
@@ -0,0 +1,225 @@
+import random
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+try:
+    from .config import (
+        CHAT_CACHE_ENABLED, CHAT_CACHE_ITEMS, CHAT_CACHE_TTL_SECONDS, CHAT_CACHE_SIMILARITY,
+        CHAT_CACHE_MAX_CHARS,
+    )
+except ImportError:
+    from config import (
+        CHAT_CACHE_ENABLED, CHAT_CACHE_ITEMS, CHAT_CACHE_TTL_SECONDS, CHAT_CACHE_SIMILARITY,
+        CHAT_CACHE_MAX_CHARS,
+    )
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+# Words that make an answer specific to someone: such messages are never served from or stored in the cache
+PERSONAL_WORDS = frozenset("""
+i i'm im i've ive i'd i'll me my mine myself we we're our ours us
+he he's she she's him her hers his they're their
+""".split())
+
+# Doses, lab values, ages and durations ("7.2", "500 mg", "3 days") describe a particular case
+MEASUREMENT_PATTERN = re.compile(
+    r"\d+\.\d+|\b\d+\s*(?:mg|mcg|ug|ml|g|kg|lbs?|cm|mmol|mmhg|bpm|iu|units?|%|years?|yrs?|months?|weeks?|days?|hours?)\b"
+)
+
+# Dropped before comparing questions. "what"/"which" carry no meaning in "what are the symptoms of X",
+# but why/how/when and negations change the question, so they are kept
+STOP_WORDS = frozenset("""
+a an the of is are was were be been to in on at for from by with and or about as
+its it's this that these those there any some please tell explain know what what's whats which
+""".split())
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+_PRIME = (1 << 31) - 1
+_rng = random.Random(0x5EED)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+
+def normalize_question(text: str) -> str:
+    """Case, punctuation and spacing-insensitive form of a message (the exact-match key)."""
+    return " ".join(WORD_PATTERN.findall(text.lower()))
+
+
+def _stem(word: str) -> str:
+    if len(word) > 4 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def question_terms(normalized: str) -> frozenset:
+    """Content words of a normalized question, order-free ("dengue symptoms" == "symptoms of dengue")."""
+    return frozenset(_stem(w) for w in normalized.split() if w not in STOP_WORDS)
+
+
+def minhash(terms) -> list:
+    hashes = [zlib.crc32(term.encode("utf-8")) & _PRIME for term in terms]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def band_keys(signature: list) -> list:
+    return [(band, tuple(signature[band * ROWS:(band + 1) * ROWS])) for band in range(BANDS)]
+
+
+def bypass_reason(message: str, history: dict = None, intent=None):
+    """Why this message must not use the cache (None when it may)."""
+    if intent is not None and intent.is_emergency:
+        return "emergency"
+    if history and (history.get("summary") or history.get("turns")):
+        return "session"
+    if len(message) > CHAT_CACHE_MAX_CHARS:
+        return "long"
+    lowered = message.lower()
+    if any(word in PERSONAL_WORDS for word in WORD_PATTERN.findall(lowered)):
+        return "personal"
+    if MEASUREMENT_PATTERN.search(lowered):
+        return "measurement"
+    return None
+
+
+class _Entry:
+    __slots__ = ("answer", "terms", "bands", "stored", "expires_at")
+
+    def __init__(self, answer, terms, bands, stored, expires_at):
+        self.answer = answer
+        self.terms = terms
+        self.bands = bands
+        self.stored = stored
+        self.expires_at = expires_at
+
+
+class ChatAnswerCache:
+    """
+    Answers to general chat questions, in memory. Two tiers:
+    exact match on the normalized message, then near-duplicates found through a MinHash
+    LSH index over content words and confirmed with the exact Jaccard similarity.
+    Entries expire after ttl seconds; past max_items the least recently used is evicted.
+    """
+
+    def __init__(self, max_items: int, ttl: float, similarity: float, enabled: bool = True):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.similarity = similarity
+        self.enabled = enabled and max_items > 0
+        self._entries = OrderedDict()  # normalized question -> _Entry
+        self._buckets = {}  # (band, band signature) -> set of normalized questions
+        self._lock = threading.Lock()
+        self._counters = {
+            "exact_hits": 0, "similar_hits": 0, "misses": 0,
+            "stored": 0, "evicted": 0, "expired": 0, "hit_age_total": 0.0,
+        }
+        self._bypassed = {}
+
+    def note_bypass(self, reason: str):
+        with self._lock:
+            self._bypassed[reason] = self._bypassed.get(reason, 0) + 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        for band in entry.bands:
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band]
+
+    def _live(self, key, now):
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= now:
+            self._remove(key)
+            self._counters["expired"] += 1
+            return None
+        return entry
+
+    def get(self, message: str):
+        """Cached answer for the message, or None."""
+        key = normalize_question(message)
+        terms = question_terms(key)
+        if not terms:
+            return None
+        signature = minhash(terms) if self.similarity < 1.0 else None
+
+        now = time.time()
+        with self._lock:
+            entry = self._live(key, now)
+            tier = "exact_hits"
+            if entry is None and signature is not None:
+                best, best_score = None, self.similarity
+                candidates = set()
+                for band in band_keys(signature):
+                    candidates.update(self._buckets.get(band, ()))
+                for candidate in candidates:
+                    other = self._live(candidate, now)
+                    if other is None:
+                        continue
+                    score = len(terms & other.terms) / len(terms | other.terms)
+                    if score >= best_score:
+                        best, best_score, key = other, score, candidate
+                entry, tier = best, "similar_hits"
+
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters[tier] += 1
+            self._counters["hit_age_total"] += now - entry.stored
+            return entry.answer
+
+    def set(self, message: str, answer: str):
+        key = normalize_question(message)
+        terms = question_terms(key)
+        if not terms:
+            return
+        bands = band_keys(minhash(terms)) if self.similarity < 1.0 else []
+
+        now = time.time()
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(answer, terms, bands, now, now + self.ttl)
+            for band in bands:
+                self._buckets.setdefault(band, set()).add(key)
+            self._counters["stored"] += 1
+            while len(self._entries) > self.max_items:
+                self._remove(next(iter(self._entries)))
+                self._counters["evicted"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            bypassed = dict(self._bypassed)
+            size = len(self._entries)
+        hits = counters["exact_hits"] + counters["similar_hits"]
+        lookups = hits + counters["misses"]
+        hit_age_total = counters.pop("hit_age_total")
+        return {
+            "enabled": self.enabled,
+            **counters,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "bypassed": bypassed,
+            "mean_hit_age_seconds": round(hit_age_total / hits, 1) if hits else None,
+            "size": size,
+            "ttl_seconds": self.ttl,
+            "similarity": self.similarity,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+chat_cache = ChatAnswerCache(
+    CHAT_CACHE_ITEMS, CHAT_CACHE_TTL_SECONDS, CHAT_CACHE_SIMILARITY, enabled=CHAT_CACHE_ENABLED
+)
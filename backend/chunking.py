@@ -0,0 +1,85 @@
+import re
+
+try:
+    from .sessions import CHARS_PER_TOKEN, estimate_tokens
+except ImportError:
+    from sessions import CHARS_PER_TOKEN, estimate_tokens
+
+# Separates pages in extracted PDF text (a form feed on its own line, so line-based parsers are unaffected)
+PAGE_BREAK = "\n\f\n"
+
+# Lines that open a new section: "DISCHARGE SUMMARY", "Medications:", "3. Hospital Course", "## Plan"
+HEADING_PATTERN = re.compile(
+    r"^(?:#+\s+\S.*"
+    r"|[A-Z][A-Z0-9 /&(),.-]{2,60}:?"
+    r"|[A-Z][A-Za-z0-9 /&(),-]{1,60}:"
+    r"|\d{1,2}[.)]\s+[A-Z][A-Za-z0-9 /&(),-]{1,60}:?)\s*$"
+)
+
+
+def split_pages(text: str) -> list:
+    return [page for page in text.split("\f") if page.strip()]
+
+
+def split_sections(text: str) -> list:
+    """Pieces of a page that each start at a heading line (the first may have none)."""
+    sections = []
+    current = []
+    for line in text.splitlines(keepends=True):
+        if current and HEADING_PATTERN.match(line.strip()):
+            sections.append("".join(current))
+            current = []
+        current.append(line)
+    if current:
+        sections.append("".join(current))
+    return sections
+
+
+def _split_hard(text: str, max_chars: int) -> list:
+    """Last resort for a single over-long line: cut at the last whitespace before max_chars."""
+    pieces = []
+    while len(text) > max_chars:
+        cut = text.rfind(" ", 0, max_chars)
+        cut = cut if cut > max_chars // 2 else max_chars
+        pieces.append(text[:cut])
+        text = text[cut:].lstrip()
+    if text:
+        pieces.append(text)
+    return pieces
+
+
+def _pieces(text: str, max_chars: int, level: int = 0):
+    """
+    Yields pieces of at most max_chars, splitting no finer than needed:
+    pages, then sections, then lines, then words.
+    """
+    if len(text) <= max_chars:
+        yield text
+        return
+
+    splitters = (split_pages, split_sections, lambda t: t.splitlines(keepends=True))
+    for depth in range(level, len(splitters)):
+        parts = splitters[depth](text)
+        if len(parts) > 1:
+            for part in parts:
+                yield from _pieces(part, max_chars, depth + 1)
+            return
+    yield from _split_hard(text, max_chars)
+
+
+def chunk_text(text: str, max_tokens: int) -> list:
+    """
+    Splits text into chunks of about max_tokens each, on page and section boundaries where
+    possible. Consecutive small pieces are packed together, so chunks stay close to the budget.
+    """
+    max_chars = max(1, max_tokens * CHARS_PER_TOKEN)
+    chunks = []
+    current = ""
+    for piece in _pieces(text, max_chars):
+        if current and len(current) + len(piece) + 1 > max_chars:
+            chunks.append(current.strip())
+            current = ""
+        current = f"{current}\n{piece}" if current else piece
+    if current.strip():
+        chunks.append(current.strip())
+    return [chunk for chunk in chunks if chunk]
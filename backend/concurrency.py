@@ -0,0 +1,125 @@
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+try:
+    from .config import BLOCKING_EXECUTOR_WORKERS, UPSTREAM_CONCURRENCY, COALESCE_ENABLED
+    from .tracing import upstream_call, record_wait
+except ImportError:
+    from config import BLOCKING_EXECUTOR_WORKERS, UPSTREAM_CONCURRENCY, COALESCE_ENABLED
+    from tracing import upstream_call, record_wait
+
+# -----------------------------------------------------------
+# Dedicated executor for blocking work
+# -----------------------------------------------------------
+# Graph nodes and pipeline stages are synchronous (Gemini, Groq, Maps, OCR).
+# They run here instead of on the event loop, so one slow upstream call
+# doesn't stall every other request on the worker.
+executor = ThreadPoolExecutor(
+    max_workers=BLOCKING_EXECUTOR_WORKERS,
+    thread_name_prefix="mediflow-blocking",
+)
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Runs a blocking callable on the dedicated executor and awaits its result."""
+    loop = asyncio.get_running_loop()
+    # Copy the context so contextvars (e.g. LangGraph's stream writer) follow the call
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, func, *args, **kwargs)
+    return await loop.run_in_executor(executor, call)
+
+
+# -----------------------------------------------------------
+# Per-upstream concurrency limits
+# -----------------------------------------------------------
+# Thread semaphores (not asyncio ones) so the limit holds for every caller:
+# async graph nodes, sync graph.invoke and pipeline worker threads alike.
+_upstream_semaphores = {
+    name: threading.BoundedSemaphore(max(1, limit))
+    for name, limit in UPSTREAM_CONCURRENCY.items()
+}
+
+
+@contextmanager
+def upstream_slot(name: str):
+    """
+    Holds one of the in-flight slots of the given upstream for the duration of the block.
+    Every upstream call passes through here, so this is also where they are timed and counted (tracing.py).
+    """
+    semaphore = _upstream_semaphores.get(name)
+    if semaphore is None:
+        with upstream_call(name):
+            yield
+        return
+
+    start = time.perf_counter()
+    with semaphore:
+        record_wait(name, time.perf_counter() - start)
+        with upstream_call(name):
+            yield
+
+
+# -----------------------------------------------------------
+# Request coalescing (single-flight)
+# -----------------------------------------------------------
+class _Flight:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the function, callers
+    arriving while it runs wait for it and get the same result (or exception). Nothing is kept
+    once the call returns; remembering results is the caches' job.
+    Waiters block their thread, like the leader does, so it works from any executor or pool.
+    func must not re-enter do() with its own key.
+    """
+
+    def __init__(self, enabled: bool = COALESCE_ENABLED):
+        self.enabled = enabled
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._counters = {"leaders": 0, "shared": 0}
+
+    def do(self, key, func):
+        """(result, shared): shared is True when the result came from another caller's run."""
+        if not self.enabled:
+            return func(), False
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            self._counters["leaders" if leader else "shared"] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, True
+
+        try:
+            flight.value = func()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.value, False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"enabled": self.enabled, **self._counters, "in_flight": len(self._flights)}
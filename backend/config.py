@@ -10,4 +10,232 @@ TWILIO_FROM_NUMBER = os.getenv("TWILIO_FROM_NUMBER")
 EMERGENCY_CONTACT_NUMBER = os.getenv("EMERGENCY_CONTACT_NUMBER")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")      
\ No newline at end of file
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")      
+
+# -----------------------------------------------------------
+# Concurrency
+# -----------------------------------------------------------
+# Threads used to run blocking graph nodes and pipeline calls off the event loop
+BLOCKING_EXECUTOR_WORKERS = int(os.getenv("BLOCKING_EXECUTOR_WORKERS", "32"))
+
+# Maximum number of in-flight calls per upstream provider (per worker process)
+UPSTREAM_CONCURRENCY = {
+    "gemini": int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")),
+    "groq": int(os.getenv("GROQ_MAX_CONCURRENCY", "8")),
+    "maps": int(os.getenv("MAPS_MAX_CONCURRENCY", "4")),
+    "twilio": int(os.getenv("TWILIO_MAX_CONCURRENCY", "2")),
+}
+
+# Identical work already in flight (same upload digest and stage, same chat question) is joined
+# instead of started again: double-clicks and duplicate batches cost one OCR/LLM run (per process)
+COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# -----------------------------------------------------------
+# LLM Providers
+# -----------------------------------------------------------
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "60"))  # seconds per attempt
+GEMINI_RETRY_DEADLINE = float(os.getenv("GEMINI_RETRY_DEADLINE", "90"))  # total seconds incl. retries, 0 = no retry
+GEMINI_RETRY_INITIAL_BACKOFF = float(os.getenv("GEMINI_RETRY_INITIAL_BACKOFF", "1.0"))
+
+GROQ_MODEL = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
+GROQ_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", "60"))
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "2"))
+
+# Agno imaging agent (falls back to the Gemini key)
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY") or GEMINI_API_KEY
+
+# -----------------------------------------------------------
+# Startup / Warm-up
+# -----------------------------------------------------------
+# Heavy backends to load at startup instead of on first use.
+# Comma-separated names from providers.LOADERS, "all", or empty for fully lazy loading.
+PRELOAD_BACKENDS = os.getenv("PRELOAD_BACKENDS", "")
+# Warm up in a background thread (the app serves immediately, /ready reports 503 until done)
+PRELOAD_IN_BACKGROUND = os.getenv("PRELOAD_IN_BACKGROUND", "true").lower() in ("1", "true", "yes")
+
+# -----------------------------------------------------------
+# OCR
+# -----------------------------------------------------------
+# Scanned PDF pages OCR'd in parallel; also the max number of PaddleOCR engines per process.
+# Peak memory is roughly OCR_WORKERS rasterized pages + OCR_WORKERS engines, whatever the page count
+# and the number of concurrent requests (a page is only rasterized once an engine is free).
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "2"))
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+
+# -----------------------------------------------------------
+# Local Storage
+# -----------------------------------------------------------
+# Directory for SQLite stores shared by all uvicorn workers on this host
+DATA_DIR = os.getenv("MEDIFLOW_DATA_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".mediflow"))
+
+# Content-addressed cache of pipeline results (extracted text, keywords, summaries, biomarkers)
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RESULT_CACHE_DB = os.getenv("RESULT_CACHE_DB", os.path.join(DATA_DIR, "result_cache.sqlite3"))
+RESULT_CACHE_MEMORY_ITEMS = int(os.getenv("RESULT_CACHE_MEMORY_ITEMS", "256"))
+RESULT_CACHE_DISK_ITEMS = int(os.getenv("RESULT_CACHE_DISK_ITEMS", "20000"))
+
+# -----------------------------------------------------------
+# Report Summaries
+# -----------------------------------------------------------
+# Reports longer than this (estimated tokens) are summarized map-reduce: chunks on page/section
+# boundaries are summarized concurrently, then combined. Shorter reports take a single LLM call.
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "3000"))
+# Chunk summaries run concurrently per report (the provider semaphores still apply)
+SUMMARY_MAP_WORKERS = int(os.getenv("SUMMARY_MAP_WORKERS", "8"))
+
+# -----------------------------------------------------------
+# Emergency Calls
+# -----------------------------------------------------------
+# Calls are queued in a local SQLite outbox and placed by background dispatcher threads,
+# so the safety message is returned at once; failed calls are retried with exponential backoff.
+EMERGENCY_DB = os.getenv("EMERGENCY_DB", os.path.join(DATA_DIR, "emergency.sqlite3"))
+EMERGENCY_DISPATCHERS = int(os.getenv("EMERGENCY_DISPATCHERS", "1"))  # threads per process, 0 = queue only
+# Further emergencies from the same session (or client) within this window don't place another call
+EMERGENCY_COOLDOWN_SECONDS = float(os.getenv("EMERGENCY_COOLDOWN_SECONDS", "900"))
+EMERGENCY_MAX_ATTEMPTS = int(os.getenv("EMERGENCY_MAX_ATTEMPTS", "5"))
+EMERGENCY_RETRY_BASE_SECONDS = float(os.getenv("EMERGENCY_RETRY_BASE_SECONDS", "5"))  # doubles per attempt
+EMERGENCY_RETRY_MAX_SECONDS = float(os.getenv("EMERGENCY_RETRY_MAX_SECONDS", "120"))
+EMERGENCY_LEASE_SECONDS = float(os.getenv("EMERGENCY_LEASE_SECONDS", "60"))  # a dispatcher that dies mid-call
+EMERGENCY_POLL_SECONDS = float(os.getenv("EMERGENCY_POLL_SECONDS", "1.0"))
+EMERGENCY_RETENTION_SECONDS = float(os.getenv("EMERGENCY_RETENTION_SECONDS", str(30 * 24 * 3600)))
+
+# -----------------------------------------------------------
+# Trend Analysis
+# -----------------------------------------------------------
+# Reports processed concurrently per /analyze_trends request
+TRENDS_MAX_WORKERS = int(os.getenv("TRENDS_MAX_WORKERS", "4"))
+
+# -----------------------------------------------------------
+# Uploads
+# -----------------------------------------------------------
+# Uploads are spooled to disk in chunks; larger files/requests are rejected with 413
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(25 * 1024 * 1024)))     # per file
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(100 * 1024 * 1024)))  # per request (all files)
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+UPLOAD_TMP_DIR = os.getenv("UPLOAD_TMP_DIR") or None  # None = system temp dir
+
+# -----------------------------------------------------------
+# Background Jobs
+# -----------------------------------------------------------
+JOBS_DB = os.getenv("JOBS_DB", os.path.join(DATA_DIR, "jobs.sqlite3"))
+JOBS_DIR = os.getenv("JOBS_DIR", os.path.join(DATA_DIR, "jobs"))  # uploaded inputs of queued jobs
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))  # worker threads per process, 0 = submit only
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1.0"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "600"))  # running jobs not updated for this long are requeued
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+JOB_WEBHOOK_TIMEOUT = float(os.getenv("JOB_WEBHOOK_TIMEOUT", "10"))
+# Hosts a job's callback_url may point at (https only, comma-separated); empty = callbacks disabled
+JOB_CALLBACK_HOSTS = frozenset(
+    host.strip().lower() for host in os.getenv("JOB_CALLBACK_HOSTS", "").split(",") if host.strip()
+)
+
+# -----------------------------------------------------------
+# Google Maps
+# -----------------------------------------------------------
+MAPS_SEARCH_RADIUS = int(os.getenv("MAPS_SEARCH_RADIUS", "5000"))  # meters
+MAPS_CACHE_ITEMS = int(os.getenv("MAPS_CACHE_ITEMS", "2048"))
+GEOCODE_TTL_SECONDS = float(os.getenv("GEOCODE_TTL_SECONDS", str(30 * 24 * 3600)))  # cities don't move
+PLACES_TTL_SECONDS = float(os.getenv("PLACES_TTL_SECONDS", str(6 * 3600)))
+
+# -----------------------------------------------------------
+# Keyword Extraction
+# -----------------------------------------------------------
+# Extra keywords (drug / test names), one per line, appended to the built-in list
+MEDICAL_KEYWORDS_FILE = os.getenv("MEDICAL_KEYWORDS_FILE") or None
+FUZZY_THRESHOLD = int(os.getenv("FUZZY_THRESHOLD", "80"))
+FUZZY_WORKERS = int(os.getenv("FUZZY_WORKERS", "-1"))  # rapidfuzz cdist threads, -1 = all cores
+FUZZY_MAX_CELLS = int(os.getenv("FUZZY_MAX_CELLS", str(16 * 1024 * 1024)))  # token × keyword scores per batch
+
+# -----------------------------------------------------------
+# Biomarker Extraction
+# -----------------------------------------------------------
+# hybrid = local lab-report parser first, Gemini only for what it couldn't resolve;
+# local = never call Gemini; gemini = always send the whole text to Gemini
+BIOMARKER_EXTRACTOR = os.getenv("BIOMARKER_EXTRACTOR", "hybrid").lower()
+BIOMARKER_DAY_FIRST = os.getenv("BIOMARKER_DAY_FIRST", "true").lower() in ("1", "true", "yes")  # 03/02/2024 = 3 Feb
+
+# -----------------------------------------------------------
+# Patient Timelines
+# -----------------------------------------------------------
+TIMELINE_DB = os.getenv("TIMELINE_DB", os.path.join(DATA_DIR, "timelines.sqlite3"))
+
+# -----------------------------------------------------------
+# Chat Sessions
+# -----------------------------------------------------------
+SESSIONS_DB = os.getenv("SESSIONS_DB", os.path.join(DATA_DIR, "sessions.sqlite3"))
+# Prompt budget (estimated tokens) for recent turns; older turns are compacted into a summary
+SESSION_CONTEXT_TOKENS = int(os.getenv("SESSION_CONTEXT_TOKENS", "2000"))
+SESSION_SUMMARY_TOKENS = int(os.getenv("SESSION_SUMMARY_TOKENS", "400"))
+# Compaction keeps this fraction of the budget as verbatim recent turns (hysteresis)
+SESSION_COMPACT_TO = float(os.getenv("SESSION_COMPACT_TO", "0.5"))
+SESSION_RETENTION_SECONDS = float(os.getenv("SESSION_RETENTION_SECONDS", str(30 * 24 * 3600)))
+
+# -----------------------------------------------------------
+# Chat Answer Cache
+# -----------------------------------------------------------
+# Reuses Gemini answers to general questions ("symptoms of dengue"); personal messages always bypass it
+CHAT_CACHE_ENABLED = os.getenv("CHAT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CHAT_CACHE_ITEMS = int(os.getenv("CHAT_CACHE_ITEMS", "1024"))
+CHAT_CACHE_TTL_SECONDS = float(os.getenv("CHAT_CACHE_TTL_SECONDS", str(24 * 3600)))
+# Word-set Jaccard similarity needed for a near-duplicate hit (1.0 = exact tier only)
+CHAT_CACHE_SIMILARITY = float(os.getenv("CHAT_CACHE_SIMILARITY", "0.8"))
+# Longer messages are rarely general questions; they bypass the cache
+CHAT_CACHE_MAX_CHARS = int(os.getenv("CHAT_CACHE_MAX_CHARS", "300"))
+
+# -----------------------------------------------------------
+# LLM Router (provider failover & hedged requests)
+# -----------------------------------------------------------
+# Providers tried in order; the next one is the failover / hedge target
+LLM_CHAT_PROVIDERS = [p.strip() for p in os.getenv("LLM_CHAT_PROVIDERS", "gemini,groq").split(",") if p.strip()]
+LLM_REPORT_PROVIDERS = [p.strip() for p in os.getenv("LLM_REPORT_PROVIDERS", "groq,gemini").split(",") if p.strip()]
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "true").lower() in ("1", "true", "yes")
+# A hedged request goes to the next provider once the first one is slower than this percentile of its recent latencies
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))  # below this, LLM_HEDGE_DEFAULT_DELAY is used
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "10"))  # seconds
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))  # seconds
+LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", "200"))  # recent calls kept per provider
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))  # consecutive failures that open the breaker
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))  # seconds before a trial request
+LLM_ROUTER_WORKERS = int(os.getenv("LLM_ROUTER_WORKERS", "32"))
+
+# -----------------------------------------------------------
+# Image Preprocessing (before images are sent to Gemini)
+# -----------------------------------------------------------
+IMAGE_PREPROCESS = os.getenv("IMAGE_PREPROCESS", "true").lower() in ("1", "true", "yes")
+# Longest side of photographed documents; ~2000 px keeps A4 print at ~180 DPI, plenty for transcription
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "2048"))
+# Longest side of medical images (MRI/X-ray/DICOM) sent to the imaging agent; only downscaled, never enhanced
+SCAN_MAX_SIDE = int(os.getenv("SCAN_MAX_SIDE", "1536"))
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "jpeg").lower()  # jpeg | webp
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+IMAGE_GRAYSCALE = os.getenv("IMAGE_GRAYSCALE", "true").lower() in ("1", "true", "yes")
+IMAGE_CONTRAST = os.getenv("IMAGE_CONTRAST", "true").lower() in ("1", "true", "yes")  # CLAHE on documents
+IMAGE_AUTOCROP = os.getenv("IMAGE_AUTOCROP", "true").lower() in ("1", "true", "yes")
+
+# -----------------------------------------------------------
+# DICOM Series
+# -----------------------------------------------------------
+# Images sent to the imaging agent per series: "slices" (one image per slice) or "montage" (one grid image)
+DICOM_SERIES_MODE = os.getenv("DICOM_SERIES_MODE", "slices").lower()
+DICOM_SERIES_SLICES = int(os.getenv("DICOM_SERIES_SLICES", "6"))  # representative slices per series
+DICOM_MAX_SERIES = int(os.getenv("DICOM_MAX_SERIES", "3"))  # largest series of a study that are analyzed
+DICOM_MONTAGE_TILE = int(os.getenv("DICOM_MONTAGE_TILE", "512"))  # pixels per montage cell
+DICOM_MAX_FILES = int(os.getenv("DICOM_MAX_FILES", "4000"))  # instances read per upload (zip members included)
+# Whole series are large: /analyze_series has its own request limit
+DICOM_MAX_SERIES_BYTES = int(os.getenv("DICOM_MAX_SERIES_BYTES", str(1024 * 1024 * 1024)))
+
+# -----------------------------------------------------------
+# Tracing & Metrics
+# -----------------------------------------------------------
+# Stage timings, upstream call counts/bytes and request latency (see tracing.py). When disabled,
+# nothing is wrapped or recorded and /metrics returns 404.
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() in ("1", "true", "yes")
+# Per-request stage timings in a Server-Timing response header (visible in browser dev tools)
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() in ("1", "true", "yes")
+# Histogram bucket upper bounds, in seconds
+TRACING_BUCKETS = tuple(
+    float(b) for b in os.getenv("TRACING_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30,60").split(",") if b.strip()
+)
@@ -0,0 +1,278 @@
+import io
+import math
+import zipfile
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+try:
+    from .config import DICOM_SERIES_SLICES, DICOM_MAX_SERIES, DICOM_MONTAGE_TILE, DICOM_MAX_FILES
+    from .providers import get_cv2
+except ImportError:
+    from config import DICOM_SERIES_SLICES, DICOM_MAX_SERIES, DICOM_MONTAGE_TILE, DICOM_MAX_FILES
+    from providers import get_cv2
+
+# pydicom is imported inside the functions (see providers.py: heavy SDKs load on first use)
+
+# The first and last 10% of a stack are mostly outside the anatomy of interest
+EDGE_FRACTION = 0.1
+
+
+class Instance(NamedTuple):
+    """One DICOM file of an upload, with its header only (no pixel data read)."""
+    path: str
+    member: Optional[str]  # zip member name, or None for a plain file
+    header: object  # pydicom Dataset read with stop_before_pixels
+    frames: int
+    position: float  # order within the series
+
+
+class SeriesSelection(NamedTuple):
+    description: str  # e.g. "MR T2 AX"
+    total: int  # slices in the series
+    slices: list  # 1-based slice numbers of the selected images
+    images: list  # windowed uint8 arrays (grayscale HxW or RGB HxWx3)
+
+
+# -----------------------------------------------------------
+# Headers & frames
+# -----------------------------------------------------------
+def read_header(source):
+    """Header of a DICOM file (path or binary file object) without reading its pixel data."""
+    import pydicom
+    return pydicom.dcmread(source, stop_before_pixels=True)
+
+
+def _number(value, default=None):
+    """First value of a numeric (possibly multi-valued) DICOM attribute."""
+    if value is None or value == "":
+        return default
+    if not isinstance(value, (int, float)) and hasattr(value, "__len__"):
+        if not len(value):
+            return default
+        value = value[0]
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def frame_count(header) -> int:
+    return max(1, int(_number(header.get("NumberOfFrames"), 1)))
+
+
+def slice_position(header) -> float:
+    """Position along the slice normal (ImagePositionPatient), else InstanceNumber."""
+    position = header.get("ImagePositionPatient")
+    orientation = header.get("ImageOrientationPatient")
+    if position is not None and orientation is not None and len(position) == 3 and len(orientation) == 6:
+        normal = np.cross(np.asarray(orientation[:3], float), np.asarray(orientation[3:], float))
+        return float(np.dot(normal, np.asarray(position, float)))
+    return _number(header.get("InstanceNumber"), 0.0)
+
+
+def decode_frames(source, header, indices: list):
+    """
+    Yields the selected frames (0-based) of a file, one at a time.
+    With pydicom >= 3 only those frames are decoded; older versions decode the pixel data once.
+    """
+    try:
+        from pydicom.pixels import iter_pixels
+    except ImportError:
+        import pydicom
+        pixels = pydicom.dcmread(source).pixel_array
+        multi = frame_count(header) > 1
+        for index in indices:
+            yield pixels[index] if multi else pixels
+        return
+
+    yield from iter_pixels(source, indices=indices)
+
+
+def window_frame(frame: np.ndarray, header) -> np.ndarray:
+    """
+    Stored values → displayable uint8: modality rescale, then the VOI window
+    (WindowCenter/Width, or the 0.5-99.5 percentile range when the file has none),
+    all in float32 and in place on a copy of this single frame.
+    """
+    if frame.ndim == 3:
+        # Colour (RGB) frames are already display values
+        if frame.dtype == np.uint8:
+            return frame
+        shift = max(0, int(_number(header.get("BitsStored"), 8)) - 8)
+        return (frame >> shift).astype(np.uint8)
+
+    values = frame.astype(np.float32)
+    slope = _number(header.get("RescaleSlope"), 1.0)
+    intercept = _number(header.get("RescaleIntercept"), 0.0)
+    if slope != 1.0:
+        values *= slope
+    if intercept:
+        values += intercept
+
+    center = _number(header.get("WindowCenter"))
+    width = _number(header.get("WindowWidth"))
+    if center is not None and width and width > 1:
+        low, high = center - width / 2, center + width / 2
+    else:
+        # Subsampled: the percentiles of a 512x512 frame don't need every pixel
+        low, high = (float(v) for v in np.percentile(values[::4, ::4], (0.5, 99.5)))
+    if high <= low:
+        high = low + 1.0
+
+    np.clip(values, low, high, out=values)
+    values -= low
+    values *= 255.0 / (high - low)
+    if header.get("PhotometricInterpretation") == "MONOCHROME1":
+        np.subtract(255.0, values, out=values)
+    return values.astype(np.uint8)
+
+
+def representative_indices(count: int, k: int) -> list:
+    """k indices spread evenly over the central part of a count-long stack."""
+    if count <= k:
+        return list(range(count))
+    if k <= 1:
+        return [count // 2]
+    low = int(count * EDGE_FRACTION)
+    high = count - 1 - low
+    return sorted({round(low + (high - low) * i / (k - 1)) for i in range(k)})
+
+
+def dicom_frames(source, max_frames: int = DICOM_SERIES_SLICES):
+    """
+    (header, windowed frames) of a single DICOM file (path or seekable binary file object):
+    one image for a plain slice, up to max_frames representative frames of a multi-frame file.
+    """
+    header = read_header(source)
+    if hasattr(source, "seek"):
+        source.seek(0)
+    indices = representative_indices(frame_count(header), max_frames)
+    return header, [window_frame(frame, header) for frame in decode_frames(source, header, indices)]
+
+
+# -----------------------------------------------------------
+# Series / studies
+# -----------------------------------------------------------
+def describe_series(header) -> str:
+    parts = [str(header.get("Modality", "") or ""), str(header.get("SeriesDescription", "") or "")]
+    return " ".join(p for p in parts if p).strip() or "DICOM series"
+
+
+class DicomStudy:
+    """
+    Every DICOM instance of an upload (plain .dcm files and/or zip archives), read header-only,
+    grouped into series and ordered by slice position. Pixel data is decoded only for the
+    slices select() picks. Use as a context manager (zip archives stay open meanwhile).
+    """
+
+    def __init__(self, paths: list, max_files: int = DICOM_MAX_FILES):
+        from pydicom.errors import InvalidDicomError
+
+        self._zips = {}
+        self.instances = []
+        self.skipped = 0
+
+        for path, member in self._entries(paths):
+            if len(self.instances) >= max_files:
+                self.skipped += 1
+                continue
+            try:
+                with self._open(path, member) as f:
+                    header = read_header(f)
+            except (InvalidDicomError, OSError, ValueError, EOFError):
+                self.skipped += 1
+                continue
+            if header.get("Rows") is None:
+                self.skipped += 1  # no image: DICOMDIR, structured reports, ...
+                continue
+            self.instances.append(Instance(path, member, header, frame_count(header), slice_position(header)))
+
+    def _entries(self, paths):
+        for path in paths:
+            if zipfile.is_zipfile(path):
+                archive = zipfile.ZipFile(path)
+                self._zips[path] = archive
+                for info in archive.infolist():
+                    if not info.is_dir() and not info.filename.startswith("__MACOSX/"):
+                        yield path, info.filename
+            else:
+                yield path, None
+
+    def _open(self, path, member):
+        return self._zips[path].open(member) if member is not None else open(path, "rb")
+
+    def _pixel_source(self, instance: Instance):
+        """What decode_frames reads: the path itself, or the member's bytes (zip streams seek slowly)."""
+        if instance.member is None:
+            return instance.path
+        return io.BytesIO(self._zips[instance.path].read(instance.member))
+
+    def close(self):
+        for archive in self._zips.values():
+            archive.close()
+        self._zips.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def series(self) -> list:
+        """[(description, [(instance, frame index), ...]), ...], largest series first."""
+        groups = {}
+        for instance in self.instances:
+            uid = str(instance.header.get("SeriesInstanceUID", "") or instance.path)
+            groups.setdefault(uid, []).append(instance)
+
+        result = []
+        for instances in groups.values():
+            instances.sort(key=lambda i: (i.position, _number(i.header.get("InstanceNumber"), 0.0), i.member or i.path))
+            stack = [(instance, frame) for instance in instances for frame in range(instance.frames)]
+            result.append((describe_series(instances[0].header), stack))
+        result.sort(key=lambda item: len(item[1]), reverse=True)
+        return result
+
+    def select(self, per_series: int = DICOM_SERIES_SLICES, max_series: int = DICOM_MAX_SERIES) -> list:
+        """Representative windowed slices of the largest max_series series."""
+        selections = []
+        for description, stack in self.series()[:max_series]:
+            picked = representative_indices(len(stack), per_series)
+
+            # Decode file by file, only the frames that were picked
+            wanted = {}  # (path, member) -> (instance, [(stack index, frame), ...])
+            for index in picked:
+                instance, frame = stack[index]
+                wanted.setdefault((instance.path, instance.member), (instance, []))[1].append((index, frame))
+
+            images = {}
+            for instance, frames in wanted.values():
+                source = self._pixel_source(instance)
+                decoded = decode_frames(source, instance.header, [frame for _, frame in frames])
+                for (index, _), pixels in zip(frames, decoded):
+                    images[index] = window_frame(pixels, instance.header)
+
+            selections.append(SeriesSelection(
+                description, len(stack), [i + 1 for i in picked], [images[i] for i in picked if i in images]
+            ))
+        return selections
+
+
+def montage(images: list, tile: int = DICOM_MONTAGE_TILE) -> np.ndarray:
+    """Grayscale grid of the images (row by row), each fitted into a tile x tile cell."""
+    cv2 = get_cv2()
+    cols = math.ceil(math.sqrt(len(images)))
+    rows = math.ceil(len(images) / cols)
+    canvas = np.zeros((rows * tile, cols * tile), np.uint8)
+
+    for n, img in enumerate(images):
+        if img.ndim == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+        scale = tile / max(img.shape)
+        height, width = max(1, round(img.shape[0] * scale)), max(1, round(img.shape[1] * scale))
+        cell = cv2.resize(img, (width, height), interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+        top = (n // cols) * tile + (tile - height) // 2
+        left = (n % cols) * tile + (tile - width) // 2
+        canvas[top:top + height, left:left + width] = cell
+    return canvas
@@ -0,0 +1,220 @@
+import random
+import threading
+import time
+import uuid
+
+try:
+    from .config import (
+        EMERGENCY_DB, EMERGENCY_DISPATCHERS, EMERGENCY_COOLDOWN_SECONDS, EMERGENCY_MAX_ATTEMPTS,
+        EMERGENCY_RETRY_BASE_SECONDS, EMERGENCY_RETRY_MAX_SECONDS, EMERGENCY_LEASE_SECONDS,
+        EMERGENCY_POLL_SECONDS, EMERGENCY_RETENTION_SECONDS,
+    )
+    from .storage import SQLiteStore
+    from .tools import call_emergency_contact
+except ImportError:
+    from config import (
+        EMERGENCY_DB, EMERGENCY_DISPATCHERS, EMERGENCY_COOLDOWN_SECONDS, EMERGENCY_MAX_ATTEMPTS,
+        EMERGENCY_RETRY_BASE_SECONDS, EMERGENCY_RETRY_MAX_SECONDS, EMERGENCY_LEASE_SECONDS,
+        EMERGENCY_POLL_SECONDS, EMERGENCY_RETENTION_SECONDS,
+    )
+    from storage import SQLiteStore
+    from tools import call_emergency_contact
+
+# Call lifecycle: pending -> sending -> sent | failed (pending again between retries)
+# `suppressed` counts later emergencies from the same caller that fell in the cooldown window.
+
+
+class EmergencyOutbox(SQLiteStore):
+    """
+    Durable outbox of emergency calls. The request only inserts a row; dispatcher threads
+    (in any process sharing the file) place the calls. Claiming works like jobs.JobStore:
+    BEGIN IMMEDIATE, with a lease so a call whose dispatcher died is retried.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS emergency_calls (
+        id TEXT PRIMARY KEY,
+        caller TEXT NOT NULL,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        suppressed INTEGER NOT NULL DEFAULT 0,
+        next_attempt REAL NOT NULL,
+        lease_until REAL,
+        call_sid TEXT,
+        error TEXT,
+        created REAL NOT NULL,
+        updated REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS emergency_calls_caller ON emergency_calls(caller, created);
+    CREATE INDEX IF NOT EXISTS emergency_calls_due ON emergency_calls(status, next_attempt);
+    """
+
+    def enqueue(self, caller: str, cooldown: float = EMERGENCY_COOLDOWN_SECONDS):
+        """
+        (call_id, queued): a new pending call, or the caller's call from the cooldown window
+        (queued=False) when there is one that hasn't failed for good.
+        """
+        now = time.time()
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT id FROM emergency_calls WHERE caller = ? AND created >= ? AND status != 'failed'"
+                " ORDER BY created DESC LIMIT 1",
+                (caller, now - cooldown),
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE emergency_calls SET suppressed = suppressed + 1, updated = ? WHERE id = ?",
+                    (now, row["id"]),
+                )
+                return row["id"], False
+
+            call_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO emergency_calls (id, caller, status, next_attempt, created, updated)"
+                " VALUES (?, ?, 'pending', ?, ?, ?)",
+                (call_id, caller, now, now, now),
+            )
+        return call_id, True
+
+    def claim(self):
+        """Takes the oldest due call; returns (id, attempt number) or None."""
+        now = time.time()
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE emergency_calls SET status = 'pending', updated = ?"
+                " WHERE status = 'sending' AND lease_until < ?",
+                (now, now),
+            )
+            row = conn.execute(
+                "SELECT id, attempts FROM emergency_calls WHERE status = 'pending' AND next_attempt <= ?"
+                " ORDER BY created LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE emergency_calls SET status = 'sending', attempts = attempts + 1,"
+                " updated = ?, lease_until = ? WHERE id = ?",
+                (now, now + EMERGENCY_LEASE_SECONDS, row["id"]),
+            )
+        return row["id"], row["attempts"] + 1
+
+    def mark_sent(self, call_id: str, call_sid: str = None):
+        self.conn().execute(
+            "UPDATE emergency_calls SET status = 'sent', call_sid = ?, error = NULL, updated = ?,"
+            " lease_until = NULL WHERE id = ?",
+            (call_sid, time.time(), call_id),
+        )
+
+    def mark_failed(self, call_id: str, attempt: int, error: str) -> bool:
+        """Schedules a retry with exponential backoff; returns False once attempts are exhausted."""
+        now = time.time()
+        retry = attempt < EMERGENCY_MAX_ATTEMPTS
+        self.conn().execute(
+            "UPDATE emergency_calls SET status = ?, error = ?, next_attempt = ?, updated = ?,"
+            " lease_until = NULL WHERE id = ?",
+            ("pending" if retry else "failed", error, now + retry_delay(attempt), now, call_id),
+        )
+        return retry
+
+    def next_due(self):
+        """Earliest next_attempt of the pending calls, or None."""
+        row = self.conn().execute(
+            "SELECT MIN(next_attempt) AS due FROM emergency_calls WHERE status = 'pending'"
+        ).fetchone()
+        return row["due"]
+
+    def get(self, call_id: str):
+        row = self.conn().execute("SELECT * FROM emergency_calls WHERE id = ?", (call_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def stats(self) -> dict:
+        rows = self.conn().execute(
+            "SELECT status, COUNT(*) AS calls, SUM(suppressed) AS suppressed FROM emergency_calls GROUP BY status"
+        ).fetchall()
+        return {
+            "calls": {row["status"]: row["calls"] for row in rows},
+            "deduplicated": sum(row["suppressed"] or 0 for row in rows),
+        }
+
+    def purge(self, older_than: float = EMERGENCY_RETENTION_SECONDS):
+        self.conn().execute(
+            "DELETE FROM emergency_calls WHERE status IN ('sent', 'failed') AND updated < ?",
+            (time.time() - older_than,),
+        )
+
+
+emergency_outbox = EmergencyOutbox(EMERGENCY_DB)
+
+
+def retry_delay(attempt: int) -> float:
+    """EMERGENCY_RETRY_BASE_SECONDS doubling per attempt, capped, with +-20% jitter."""
+    delay = min(EMERGENCY_RETRY_MAX_SECONDS, EMERGENCY_RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+# -----------------------------------------------------------
+# Dispatcher
+# -----------------------------------------------------------
+_wakeup = threading.Event()
+_dispatchers = []
+
+
+def request_emergency_call(caller: str) -> dict:
+    """Queues a call for this caller (a session) unless one is already in its cooldown window."""
+    call_id, queued = emergency_outbox.enqueue(caller)
+    if queued:
+        _wakeup.set()
+    return {"call_id": call_id, "queued": queued}
+
+
+def deliver(call_id: str, attempt: int, place_call=call_emergency_contact):
+    try:
+        emergency_outbox.mark_sent(call_id, place_call())
+    except Exception as e:
+        if emergency_outbox.mark_failed(call_id, attempt, str(e)):
+            print(f"Emergency call {call_id} attempt {attempt} failed, retrying: {e}")
+        else:
+            print(f"EMERGENCY CALL {call_id} FAILED after {attempt} attempts: {e}")
+
+
+def dispatcher_loop():
+    last_purge = 0.0
+    while True:
+        try:
+            claimed = emergency_outbox.claim()
+        except Exception as e:
+            print(f"Emergency outbox error: {e}")
+            claimed = None
+
+        if claimed is not None:
+            deliver(*claimed)
+            continue
+
+        if time.time() - last_purge > 3600:
+            last_purge = time.time()
+            try:
+                emergency_outbox.purge()
+            except Exception as e:
+                print(f"Emergency outbox purge failed: {e}")
+
+        # Sleep until the next retry is due; new calls in this process wake the loop at once
+        timeout = EMERGENCY_POLL_SECONDS
+        try:
+            due = emergency_outbox.next_due()
+            if due is not None:
+                timeout = min(timeout, max(0.0, due - time.time()))
+        except Exception:
+            pass
+        _wakeup.wait(timeout)
+        _wakeup.clear()
+
+
+def start_dispatchers(count: int = EMERGENCY_DISPATCHERS):
+    """Starts the dispatcher threads (idempotent)."""
+    while len(_dispatchers) < count:
+        thread = threading.Thread(
+            target=dispatcher_loop, name=f"mediflow-emergency-{len(_dispatchers)}", daemon=True
+        )
+        thread.start()
+        _dispatchers.append(thread)
@@ -0,0 +1,192 @@
+from typing import NamedTuple
+
+import numpy as np
+
+try:
+    from .config import (
+        IMAGE_PREPROCESS, IMAGE_MAX_SIDE, SCAN_MAX_SIDE, IMAGE_FORMAT, IMAGE_QUALITY,
+        IMAGE_GRAYSCALE, IMAGE_CONTRAST, IMAGE_AUTOCROP,
+    )
+    from .providers import get_cv2
+except ImportError:
+    from config import (
+        IMAGE_PREPROCESS, IMAGE_MAX_SIDE, SCAN_MAX_SIDE, IMAGE_FORMAT, IMAGE_QUALITY,
+        IMAGE_GRAYSCALE, IMAGE_CONTRAST, IMAGE_AUTOCROP,
+    )
+    from providers import get_cv2
+
+# Bump when the preprocessing steps change (cached transcriptions depend on them)
+PREPROCESS_VERSION = "1"
+
+MIME_TYPES = {"jpeg": "image/jpeg", "webp": "image/webp"}
+
+# Edge detection for auto-crop runs on a copy this size; contours below MIN_CONTOUR_AREA of it are noise
+DETECT_SIDE = 800
+MIN_CONTOUR_AREA = 0.001
+# Crops that keep less than this fraction of the image are rejected as detection failures
+MIN_CROP_AREA = 0.2
+CROP_MARGIN = 0.02
+
+
+class PreparedImage(NamedTuple):
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    source_bytes: int
+
+
+def preprocess_settings() -> tuple:
+    """Everything that changes the bytes sent upstream (part of the cached stage versions)."""
+    return (
+        PREPROCESS_VERSION, IMAGE_PREPROCESS, IMAGE_MAX_SIDE, SCAN_MAX_SIDE, IMAGE_FORMAT,
+        IMAGE_QUALITY, IMAGE_GRAYSCALE, IMAGE_CONTRAST, IMAGE_AUTOCROP,
+    )
+
+
+def read_bytes(source) -> bytes:
+    """source: a path or a binary file object."""
+    if hasattr(source, "read"):
+        return source.read()
+    with open(source, "rb") as f:
+        return f.read()
+
+
+def decode_image(data: bytes, grayscale: bool = False) -> np.ndarray:
+    """Decodes (and EXIF-rotates) an encoded image into a BGR or grayscale array."""
+    cv2 = get_cv2()
+    flag = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+    if img is None:
+        raise ValueError("Unsupported or corrupt image")
+    return img
+
+
+def cap_resolution(img: np.ndarray, max_side: int) -> np.ndarray:
+    height, width = img.shape[:2]
+    scale = max_side / max(height, width)
+    if scale >= 1:
+        return img
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return get_cv2().resize(img, size, interpolation=get_cv2().INTER_AREA)
+
+
+def find_document_bounds(img: np.ndarray):
+    """
+    (x, y, w, h) of the document in a photo: the box around every significant edge
+    contour (the page outline, or the text itself on a page-coloured background).
+    None when nothing worth cropping was found.
+    """
+    cv2 = get_cv2()
+    gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    height, width = gray.shape
+    scale = min(1.0, DETECT_SIDE / max(height, width))
+    small = cap_resolution(gray, DETECT_SIDE)
+
+    edges = cv2.Canny(cv2.GaussianBlur(small, (5, 5), 0), 50, 150)
+    edges = cv2.dilate(edges, np.ones((5, 5), np.uint8), iterations=2)
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    min_area = MIN_CONTOUR_AREA * small.shape[0] * small.shape[1]
+    significant = [c for c in contours if cv2.contourArea(c) >= min_area]
+    if not significant:
+        return None
+
+    x, y, w, h = cv2.boundingRect(np.concatenate(significant))
+    margin_x, margin_y = round(CROP_MARGIN * small.shape[1]), round(CROP_MARGIN * small.shape[0])
+    x0, y0 = max(0, x - margin_x), max(0, y - margin_y)
+    x1, y1 = min(small.shape[1], x + w + margin_x), min(small.shape[0], y + h + margin_y)
+
+    kept = (x1 - x0) * (y1 - y0) / (small.shape[0] * small.shape[1])
+    if kept < MIN_CROP_AREA or kept > 0.95:
+        return None
+    return (
+        int(x0 / scale), int(y0 / scale),
+        min(width, int(round((x1 - x0) / scale))), min(height, int(round((y1 - y0) / scale))),
+    )
+
+
+def normalize_contrast(img: np.ndarray) -> np.ndarray:
+    """CLAHE: evens out shadows and faded ink without blowing out the paper."""
+    cv2 = get_cv2()
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    if img.ndim == 2:
+        return clahe.apply(img)
+    lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
+    lab[:, :, 0] = clahe.apply(lab[:, :, 0])
+    return cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+
+
+def encode_image(img: np.ndarray, fmt: str = IMAGE_FORMAT, quality: int = IMAGE_QUALITY):
+    """(bytes, mime type); unknown formats fall back to JPEG."""
+    cv2 = get_cv2()
+    fmt = fmt if fmt in MIME_TYPES else "jpeg"
+    ext, flag = (".webp", cv2.IMWRITE_WEBP_QUALITY) if fmt == "webp" else (".jpg", cv2.IMWRITE_JPEG_QUALITY)
+    ok, buffer = cv2.imencode(ext, img, [flag, quality])
+    if not ok:
+        raise ValueError(f"Could not encode image as {fmt}")
+    return buffer.tobytes(), MIME_TYPES[fmt]
+
+
+def _sniff_mime(data: bytes):
+    if data.startswith(b"\xFF\xD8\xFF"):
+        return "image/jpeg"
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+def _finish(img: np.ndarray, data: bytes, changed_geometry: bool) -> PreparedImage:
+    encoded, mime_type = encode_image(img)
+    source_mime = _sniff_mime(data)
+    # Re-encoding an already small image can grow it; then the original is just as good
+    if not changed_geometry and source_mime and len(encoded) >= len(data):
+        encoded, mime_type = data, source_mime
+    return PreparedImage(encoded, mime_type, img.shape[1], img.shape[0], len(data))
+
+
+def prepare_document_image(data: bytes) -> PreparedImage:
+    """
+    Photo/scan of a document → compact image for transcription, all in memory:
+    auto-crop to the document, cap the resolution, grayscale + contrast normalization, re-encode.
+    """
+    img = decode_image(data, grayscale=IMAGE_GRAYSCALE)
+    original_shape = img.shape
+
+    if IMAGE_AUTOCROP:
+        bounds = find_document_bounds(img)
+        if bounds is not None:
+            x, y, w, h = bounds
+            img = img[y:y + h, x:x + w]
+    img = cap_resolution(img, IMAGE_MAX_SIDE)
+    if IMAGE_CONTRAST:
+        img = normalize_contrast(img)
+
+    return _finish(img, data, img.shape != original_shape)
+
+
+def prepare_scan_image(data: bytes = None, array: np.ndarray = None) -> PreparedImage:
+    """
+    Medical image (encoded bytes, or an RGB/grayscale uint8 array e.g. from DICOM) → re-encoded
+    at SCAN_MAX_SIDE. Pixels are only downscaled: no crop or contrast change on diagnostic images.
+    Single-channel content is sent as grayscale.
+    """
+    cv2 = get_cv2()
+    if array is None:
+        img = decode_image(data)
+    elif array.ndim == 3:
+        img = cv2.cvtColor(np.ascontiguousarray(array), cv2.COLOR_RGB2BGR)
+    else:
+        img = array
+
+    if img.ndim == 3 and np.array_equal(img[:, :, 0], img[:, :, 1]) and np.array_equal(img[:, :, 1], img[:, :, 2]):
+        img = np.ascontiguousarray(img[:, :, 0])
+
+    original_side = max(img.shape[:2])
+    img = cap_resolution(img, SCAN_MAX_SIDE)
+    if data is None:
+        encoded, mime_type = encode_image(img)
+        return PreparedImage(encoded, mime_type, img.shape[1], img.shape[0], array.nbytes)
+    return _finish(img, data, max(img.shape[:2]) != original_side)
@@ -0,0 +1,291 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+try:
+    from .config import (
+        JOBS_DB, JOBS_DIR, JOB_WORKERS, JOB_POLL_SECONDS, JOB_LEASE_SECONDS,
+        JOB_MAX_ATTEMPTS, JOB_RETENTION_SECONDS, JOB_WEBHOOK_TIMEOUT, JOB_CALLBACK_HOSTS,
+    )
+    from .storage import SQLiteStore
+except ImportError:
+    from config import (
+        JOBS_DB, JOBS_DIR, JOB_WORKERS, JOB_POLL_SECONDS, JOB_LEASE_SECONDS,
+        JOB_MAX_ATTEMPTS, JOB_RETENTION_SECONDS, JOB_WEBHOOK_TIMEOUT, JOB_CALLBACK_HOSTS,
+    )
+    from storage import SQLiteStore
+
+# Job lifecycle: queued -> running -> done | failed
+# While running, `stage` holds the pipeline step (e.g. extracting, summarizing).
+FINAL_STATUSES = ("done", "failed")
+
+
+class JobStore(SQLiteStore):
+    """
+    Durable local job queue. Several worker processes can share the file:
+    claiming uses BEGIN IMMEDIATE, and a running job whose lease expires
+    (its process died) goes back to the queue. Updates from a worker carry the
+    attempt it claimed, so a worker whose lease was taken over changes nothing.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        status TEXT NOT NULL,
+        stage TEXT,
+        payload TEXT NOT NULL,
+        result TEXT,
+        error TEXT,
+        callback_url TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        created REAL NOT NULL,
+        updated REAL NOT NULL,
+        lease_until REAL
+    );
+    CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs(status, created);
+    """
+
+    def submit(self, kind: str, payload: dict, callback_url: str = None, job_id: str = None) -> str:
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        self.conn().execute(
+            "INSERT INTO jobs (id, kind, status, stage, payload, callback_url, created, updated)"
+            " VALUES (?, ?, 'queued', 'queued', ?, ?, ?, ?)",
+            (job_id, kind, json.dumps(payload), callback_url, now, now),
+        )
+        return job_id
+
+    def get(self, job_id: str):
+        row = self.conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "stage": row["stage"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "attempts": row["attempts"],
+            "created": row["created"],
+            "updated": row["updated"],
+        }
+
+    def claim(self):
+        """Takes the oldest queued (or abandoned) job; returns (id, attempt, kind, payload, callback_url) or None."""
+        now = time.time()
+        with self.transaction() as conn:
+            # Requeue jobs whose worker stopped renewing the lease (crash/restart)
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', stage = 'queued', updated = ?"
+                " WHERE status = 'running' AND lease_until < ?",
+                (now, now),
+            )
+            row = conn.execute(
+                "SELECT id, kind, payload, callback_url, attempts FROM jobs"
+                " WHERE status = 'queued' ORDER BY created LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+
+            if row["attempts"] >= JOB_MAX_ATTEMPTS:
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', stage = 'failed', updated = ?,"
+                    " error = 'Job abandoned after repeated worker failures.' WHERE id = ?",
+                    (now, row["id"]),
+                )
+                return None
+
+            conn.execute(
+                "UPDATE jobs SET status = 'running', stage = 'starting', attempts = attempts + 1,"
+                " updated = ?, lease_until = ? WHERE id = ?",
+                (now, now + JOB_LEASE_SECONDS, row["id"]),
+            )
+        return row["id"], row["attempts"] + 1, row["kind"], json.loads(row["payload"]), row["callback_url"]
+
+    def _update_owned(self, job_id: str, attempt: int, assignments: str, params: tuple) -> bool:
+        """Applies the update only while `attempt` still holds the job; returns whether it did."""
+        cursor = self.conn().execute(
+            f"UPDATE jobs SET {assignments} WHERE id = ? AND attempts = ? AND status = 'running'",
+            (*params, job_id, attempt),
+        )
+        return cursor.rowcount == 1
+
+    def renew(self, job_id: str, attempt: int) -> bool:
+        """Extends the lease of a running job (heartbeat)."""
+        return self._update_owned(job_id, attempt, "lease_until = ?", (time.time() + JOB_LEASE_SECONDS,))
+
+    def set_stage(self, job_id: str, attempt: int, stage: str) -> bool:
+        """Records progress and renews the lease."""
+        now = time.time()
+        return self._update_owned(
+            job_id, attempt, "stage = ?, updated = ?, lease_until = ?", (stage, now, now + JOB_LEASE_SECONDS)
+        )
+
+    def finish(self, job_id: str, attempt: int, result) -> bool:
+        return self._update_owned(
+            job_id, attempt, "status = 'done', stage = 'done', result = ?, updated = ?, lease_until = NULL",
+            (json.dumps(result), time.time()),
+        )
+
+    def fail(self, job_id: str, attempt: int, error: str) -> bool:
+        return self._update_owned(
+            job_id, attempt, "status = 'failed', stage = 'failed', error = ?, updated = ?, lease_until = NULL",
+            (error, time.time()),
+        )
+
+    def purge(self, older_than: float = JOB_RETENTION_SECONDS):
+        """Deletes finished jobs (and any leftover inputs) older than the retention window."""
+        cutoff = time.time() - older_than
+        rows = self.conn().execute(
+            "SELECT id FROM jobs WHERE status IN ('done', 'failed') AND updated < ?", (cutoff,)
+        ).fetchall()
+        for row in rows:
+            shutil.rmtree(job_dir(row["id"]), ignore_errors=True)
+        self.conn().execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated < ?", (cutoff,)
+        )
+
+
+job_store = JobStore(JOBS_DB)
+
+
+def job_dir(job_id: str) -> str:
+    return os.path.join(JOBS_DIR, job_id)
+
+
+def keep_input(job_id: str, src_path: str, index: int, filename: str) -> str:
+    """Moves a spooled upload into the job's own directory so it outlives the request."""
+    directory = job_dir(job_id)
+    os.makedirs(directory, exist_ok=True)
+    suffix = os.path.splitext(filename or "")[1][:10]
+    dest = os.path.join(directory, f"{index}{suffix}")
+    shutil.move(src_path, dest)
+    return dest
+
+
+# -----------------------------------------------------------
+# Workers
+# -----------------------------------------------------------
+# kind -> handler(payload, progress) returning a JSON-serializable result.
+# progress(stage: str) records the current stage for pollers / SSE listeners.
+HANDLERS = {}
+
+_wakeup = threading.Event()
+_workers = []
+
+
+def register_handler(kind: str, handler):
+    HANDLERS[kind] = handler
+
+
+def enqueue(kind: str, payload: dict, callback_url: str = None, job_id: str = None) -> str:
+    job_id = job_store.submit(kind, payload, callback_url, job_id)
+    _wakeup.set()
+    return job_id
+
+
+def callback_allowed(callback_url: str, hosts=JOB_CALLBACK_HOSTS) -> bool:
+    """
+    Job results are medical data POSTed from inside the network: only https URLs on the
+    JOB_CALLBACK_HOSTS allow-list (no credentials in the URL) may receive them.
+    """
+    try:
+        parts = urlsplit(callback_url)
+        port = parts.port
+    except ValueError:
+        return False
+    return (
+        parts.scheme == "https"
+        and not parts.username and not parts.password
+        and (parts.hostname or "").lower() in hosts
+        and port in (None, 443)
+    )
+
+
+def post_webhook(callback_url: str, job: dict):
+    import requests
+
+    if not callback_allowed(callback_url):
+        print(f"Job webhook to {callback_url} skipped: not in JOB_CALLBACK_HOSTS")
+        return
+    try:
+        # No redirects: they could lead off the allow-list
+        requests.post(callback_url, json=job, timeout=JOB_WEBHOOK_TIMEOUT, allow_redirects=False)
+    except Exception as e:
+        print(f"Job webhook to {callback_url} failed: {e}")
+
+
+def heartbeat(job_id: str, attempt: int, stop: threading.Event):
+    """Renews the lease while the handler runs, even through one long stage (MRI agent, OCR)."""
+    while not stop.wait(JOB_LEASE_SECONDS / 3):
+        try:
+            if not job_store.renew(job_id, attempt):
+                return  # requeued and claimed by another worker
+        except Exception as e:
+            print(f"Job {job_id} lease renewal failed: {e}")
+
+
+def run_job(job_id: str, attempt: int, kind: str, payload: dict, callback_url: str = None):
+    handler = HANDLERS.get(kind)
+    stop = threading.Event()
+    threading.Thread(
+        target=heartbeat, args=(job_id, attempt, stop), name=f"mediflow-lease-{job_id[:8]}", daemon=True
+    ).start()
+    try:
+        if handler is None:
+            raise ValueError(f"Unknown job kind '{kind}'")
+        result = handler(payload, lambda stage: job_store.set_stage(job_id, attempt, stage))
+        owned = job_store.finish(job_id, attempt, result)
+    except Exception as e:
+        print(f"Job {job_id} ({kind}) failed: {e}")
+        owned = job_store.fail(job_id, attempt, str(e))
+    finally:
+        stop.set()
+
+    if not owned:
+        # The lease ran out and another worker took the job over: its inputs and outcome are theirs
+        print(f"Job {job_id} attempt {attempt} lost its lease; result discarded")
+        return
+
+    # Inputs are only needed while the job runs
+    shutil.rmtree(job_dir(job_id), ignore_errors=True)
+    if callback_url:
+        post_webhook(callback_url, job_store.get(job_id))
+
+
+def worker_loop():
+    last_purge = 0.0
+    while True:
+        try:
+            claimed = job_store.claim()
+        except Exception as e:
+            print(f"Job queue error: {e}")
+            claimed = None
+
+        if claimed is None:
+            if time.time() - last_purge > 3600:
+                last_purge = time.time()
+                try:
+                    job_store.purge()
+                except Exception as e:
+                    print(f"Job purge failed: {e}")
+            # Woken early by enqueue() in this process; other processes' jobs are found by polling
+            _wakeup.wait(JOB_POLL_SECONDS)
+            _wakeup.clear()
+            continue
+
+        run_job(*claimed)
+
+
+def start_workers(count: int = JOB_WORKERS):
+    """Starts the job worker threads (idempotent)."""
+    while len(_workers) < count:
+        thread = threading.Thread(target=worker_loop, name=f"mediflow-job-{len(_workers)}", daemon=True)
+        thread.start()
+        _workers.append(thread)
@@ -0,0 +1,403 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+try:
+    from .config import (
+        LLM_HEDGE_ENABLED, LLM_HEDGE_PERCENTILE, LLM_HEDGE_MIN_SAMPLES, LLM_HEDGE_DEFAULT_DELAY,
+        LLM_HEDGE_MIN_DELAY, LLM_LATENCY_WINDOW, LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN,
+        LLM_ROUTER_WORKERS,
+    )
+    from .concurrency import upstream_slot
+    from .providers import get_gemini_model, gemini_request_options, get_groq_llm
+    from .tracing import add_bytes, bind
+except ImportError:
+    from config import (
+        LLM_HEDGE_ENABLED, LLM_HEDGE_PERCENTILE, LLM_HEDGE_MIN_SAMPLES, LLM_HEDGE_DEFAULT_DELAY,
+        LLM_HEDGE_MIN_DELAY, LLM_LATENCY_WINDOW, LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN,
+        LLM_ROUTER_WORKERS,
+    )
+    from concurrency import upstream_slot
+    from providers import get_gemini_model, gemini_request_options, get_groq_llm
+    from tracing import add_bytes, bind
+
+
+# -----------------------------------------------------------
+# Rolling latency & circuit breaker
+# -----------------------------------------------------------
+class LatencyWindow:
+    """The last `size` latencies (seconds) of a provider, for rolling percentiles."""
+
+    def __init__(self, size: int):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float):
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, round(p / 100 * (len(samples) - 1)))]
+
+    def __len__(self):
+        return len(self._samples)
+
+
+class CircuitBreaker:
+    """
+    Opens after `failures` consecutive failures; once `cooldown` seconds have passed
+    a single trial request is let through (half-open), and its outcome closes or reopens it.
+    """
+
+    def __init__(self, failures: int, cooldown: float):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def release(self):
+        """Ends a call without an outcome (e.g. a cancelled hedge), freeing the half-open trial."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failures:
+                if self.state != "open":
+                    self.opened += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+# -----------------------------------------------------------
+# Providers
+# -----------------------------------------------------------
+class LLMProvider:
+    """
+    One text-in/text-out LLM backend. Subclasses implement _generate (and _stream when the
+    SDK can stream); generate/stream add latency tracking and circuit-breaker bookkeeping.
+    """
+
+    name = "llm"
+
+    def __init__(self):
+        self.latency = LatencyWindow(LLM_LATENCY_WINDOW)
+        self.first_token = LatencyWindow(LLM_LATENCY_WINDOW)
+        self.breaker = CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN)
+        self.calls = 0
+        self.errors = 0
+
+    def _generate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    def _stream(self, prompt: str):
+        yield self._generate(prompt)
+
+    def generate(self, prompt: str) -> str:
+        self.calls += 1
+        start = time.perf_counter()
+        try:
+            text = self._generate(prompt)
+        except Exception:
+            self.errors += 1
+            self.breaker.record_failure()
+            raise
+        self.latency.add(time.perf_counter() - start)
+        self.breaker.record_success()
+        return text
+
+    def stream(self, prompt: str, cancelled: threading.Event = None):
+        """Yields text chunks; stops quietly (recording nothing) once `cancelled` is set."""
+        self.calls += 1
+        start = time.perf_counter()
+        first = True
+        try:
+            for chunk in self._stream(prompt):
+                if cancelled is not None and cancelled.is_set():
+                    self.breaker.release()
+                    return
+                if first:
+                    self.first_token.add(time.perf_counter() - start)
+                    first = False
+                yield chunk
+        except Exception:
+            self.errors += 1
+            self.breaker.record_failure()
+            raise
+        self.latency.add(time.perf_counter() - start)
+        self.breaker.record_success()
+
+    def stats(self) -> dict:
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "p50_ms": ms(self.latency.percentile(50)),
+            "p95_ms": ms(self.latency.percentile(95)),
+            "first_token_p95_ms": ms(self.first_token.percentile(95)),
+            "samples": len(self.latency),
+            "breaker": self.breaker.state,
+            "breaker_opened": self.breaker.opened,
+        }
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def _generate(self, prompt: str) -> str:
+        model = get_gemini_model()
+        with upstream_slot("gemini"):
+            response = model.generate_content(prompt, request_options=gemini_request_options())
+        add_bytes("gemini", sent=len(prompt.encode()), received=len(response.text.encode()))
+        return response.text
+
+    def _stream(self, prompt: str):
+        model = get_gemini_model()
+        add_bytes("gemini", sent=len(prompt.encode()))
+        with upstream_slot("gemini"):
+            response = model.generate_content(prompt, stream=True, request_options=gemini_request_options())
+            for chunk in response:
+                text = getattr(chunk, "text", "")
+                if text:
+                    add_bytes("gemini", received=len(text.encode()))
+                    yield text
+
+
+class GroqProvider(LLMProvider):
+    name = "groq"
+
+    def _generate(self, prompt: str) -> str:
+        llm = get_groq_llm()
+        with upstream_slot("groq"):
+            response = llm.invoke(prompt)
+        text = response.content if hasattr(response, "content") else str(response)
+        add_bytes("groq", sent=len(prompt.encode()), received=len(text.encode()))
+        return text
+
+    def _stream(self, prompt: str):
+        llm = get_groq_llm()
+        add_bytes("groq", sent=len(prompt.encode()))
+        with upstream_slot("groq"):
+            for chunk in llm.stream(prompt):
+                text = getattr(chunk, "content", "")
+                if text:
+                    add_bytes("groq", received=len(text.encode()))
+                    yield text
+
+
+# -----------------------------------------------------------
+# Router
+# -----------------------------------------------------------
+class LLMRouter:
+    """
+    Sends a prompt to the first provider in `order` whose breaker is closed. If it fails,
+    the next provider is tried at once; if it is merely slow (past LLM_HEDGE_PERCENTILE of its
+    recent latencies) a hedged request goes to the next provider and the first answer wins.
+    The losing call is left to finish in the background (HTTP calls can't be cancelled), so
+    its latency still feeds the rolling percentiles.
+    """
+
+    def __init__(
+        self,
+        providers: dict,
+        hedge: bool = LLM_HEDGE_ENABLED,
+        percentile: float = LLM_HEDGE_PERCENTILE,
+        min_samples: int = LLM_HEDGE_MIN_SAMPLES,
+        default_delay: float = LLM_HEDGE_DEFAULT_DELAY,
+        min_delay: float = LLM_HEDGE_MIN_DELAY,
+        workers: int = LLM_ROUTER_WORKERS,
+    ):
+        self.providers = providers
+        self.hedge = hedge
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mediflow-llm")
+        self.counters = {"hedges": 0, "hedge_wins": 0, "failovers": 0, "unavailable": 0}
+
+    def _candidates(self, order):
+        """Providers in order, skipping those whose breaker rejects the call (checked lazily)."""
+        for name in order:
+            provider = self.providers.get(name)
+            if provider is not None and provider.breaker.allow():
+                yield provider
+
+    def hedge_delay(self, provider: LLMProvider, window: LatencyWindow = None) -> float:
+        """Seconds to wait for the provider before hedging: a percentile of its recent latencies."""
+        window = window or provider.latency
+        if len(window) < self.min_samples:
+            return self.default_delay
+        return max(self.min_delay, window.percentile(self.percentile))
+
+    def _unavailable(self, order):
+        self.counters["unavailable"] += 1
+        return RuntimeError(f"No LLM provider answered (tried {', '.join(order)})")
+
+    def generate(self, prompt: str, order: list) -> str:
+        candidates = self._candidates(order)
+        primary = next(candidates, None)
+        if primary is None:
+            raise self._unavailable(order)
+
+        # bind: provider calls on the pool still count towards the caller's request trace
+        pending = {self._pool.submit(bind(primary.generate), prompt): primary}
+        hedge_at = time.monotonic() + self.hedge_delay(primary) if self.hedge else None
+        hedged = False
+        error = None
+
+        while pending:
+            timeout = max(0.0, hedge_at - time.monotonic()) if hedge_at is not None else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                # Primary is past its latency percentile: race it against the next provider
+                hedge_at = None
+                backup = next(candidates, None)
+                if backup is not None:
+                    self.counters["hedges"] += 1
+                    hedged = True
+                    pending[self._pool.submit(bind(backup.generate), prompt)] = backup
+                continue
+
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    text = future.result()
+                except Exception as e:
+                    error = e
+                    print(f"LLM provider {provider.name} failed: {e}")
+                    continue
+                if hedged and provider is not primary:
+                    self.counters["hedge_wins"] += 1
+                return text
+
+            if not pending:
+                backup = next(candidates, None)
+                if backup is not None:
+                    self.counters["failovers"] += 1
+                    hedge_at = None
+                    pending[self._pool.submit(bind(backup.generate), prompt)] = backup
+
+        raise self._unavailable(order) from error
+
+    def stream(self, prompt: str, order: list):
+        """
+        Streaming variant of generate(). Hedging and failover apply until the first chunk:
+        the first provider to produce text wins and the others are cancelled. A failure
+        after text was yielded is raised (the answer can't be switched mid-way).
+        """
+        candidates = self._candidates(order)
+        primary = next(candidates, None)
+        if primary is None:
+            raise self._unavailable(order)
+
+        events = queue.Queue()
+        attempts = {}  # provider -> cancel event
+
+        def produce(provider, cancelled):
+            try:
+                for chunk in provider.stream(prompt, cancelled):
+                    events.put(("chunk", provider, chunk))
+                events.put(("done", provider, None))
+            except Exception as e:
+                events.put(("error", provider, e))
+
+        def start(provider):
+            attempts[provider] = threading.Event()
+            self._pool.submit(bind(produce), provider, attempts[provider])
+
+        start(primary)
+        hedge_at = time.monotonic() + self.hedge_delay(primary, primary.first_token) if self.hedge else None
+        winner = None
+        live = 1
+        error = None
+
+        try:
+            while True:
+                timeout = None
+                if winner is None and hedge_at is not None:
+                    timeout = max(0.0, hedge_at - time.monotonic())
+                try:
+                    kind, provider, payload = events.get(timeout=timeout)
+                except queue.Empty:
+                    hedge_at = None
+                    backup = next(candidates, None)
+                    if backup is not None:
+                        self.counters["hedges"] += 1
+                        live += 1
+                        start(backup)
+                    continue
+
+                if winner is None:
+                    if kind == "error":
+                        error = payload
+                        print(f"LLM provider {provider.name} failed: {payload}")
+                        live -= 1
+                        if live == 0:
+                            backup = next(candidates, None)
+                            if backup is None:
+                                raise self._unavailable(order) from error
+                            self.counters["failovers"] += 1
+                            hedge_at = None
+                            live += 1
+                            start(backup)
+                        continue
+                    winner = provider
+                    if len(attempts) > 1 and provider is not primary:
+                        self.counters["hedge_wins"] += 1
+                    for other, cancelled in attempts.items():
+                        if other is not winner:
+                            cancelled.set()
+
+                if provider is not winner:
+                    continue
+                if kind == "chunk":
+                    yield payload
+                elif kind == "done":
+                    return
+                else:
+                    raise payload
+        finally:
+            for cancelled in attempts.values():
+                cancelled.set()
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "providers": {name: provider.stats() for name, provider in self.providers.items()},
+        }
+
+
+llm_router = LLMRouter({"gemini": GeminiProvider(), "groq": GroqProvider()})
@@ -1,23 +1,67 @@
-from fastapi import FastAPI, UploadFile, File
-from typing import List
-from fastapi.responses import PlainTextResponse
+import asyncio
+import time
+import uuid
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Form, HTTPException, Request, UploadFile, File
+from fastapi import Query as QueryParam
+from typing import List, Literal, Optional
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+from starlette.background import BackgroundTask
+import json
 import uvicorn
 
 # Import the LangGraph agent
 try:
-    from .aiagent import graph
-    from .medical_pipeline import analyze_medical_file, process_trends
+    from .aiagent import graph, maps_cache_stats, chat_cache_stats
+    from .cache import result_cache
+    from .medical_pipeline import analyze_medical_path, analyze_series_cached, process_trend_path, process_trend_paths, iter_trend_paths
+    from .concurrency import run_blocking
+    from .llm_router import llm_router
+    from .providers import start_warm_up, readiness
+    from .config import PRELOAD_IN_BACKGROUND, MAX_REQUEST_BYTES, DICOM_MAX_SERIES_BYTES
+    from .uploads import spool_upload, spool_uploads, remove_all
+    from .jobs import job_store, enqueue, keep_input, register_handler, start_workers, callback_allowed, FINAL_STATUSES
+    from .trends import build_series
+    from .timeline import timeline_store, valid_patient_id
+    from .sessions import session_store
+    from .emergency import emergency_outbox, start_dispatchers
+    from .tracing import start_trace, reset_trace, http_seconds, render_metrics
+    from .config import TRACING_ENABLED, SERVER_TIMING_ENABLED
 except ImportError:
     # Fallback for direct execution (not recommended but handles legacy run)
-    from aiagent import graph
-    from medical_pipeline import analyze_medical_file, process_trends
+    from aiagent import graph, maps_cache_stats, chat_cache_stats
+    from cache import result_cache
+    from medical_pipeline import analyze_medical_path, analyze_series_cached, process_trend_path, process_trend_paths, iter_trend_paths
+    from concurrency import run_blocking
+    from llm_router import llm_router
+    from providers import start_warm_up, readiness
+    from config import PRELOAD_IN_BACKGROUND, MAX_REQUEST_BYTES, DICOM_MAX_SERIES_BYTES
+    from uploads import spool_upload, spool_uploads, remove_all
+    from jobs import job_store, enqueue, keep_input, register_handler, start_workers, callback_allowed, FINAL_STATUSES
+    from trends import build_series
+    from timeline import timeline_store, valid_patient_id
+    from sessions import session_store
+    from emergency import emergency_outbox, start_dispatchers
+    from tracing import start_trace, reset_trace, http_seconds, render_metrics
+    from config import TRACING_ENABLED, SERVER_TIMING_ENABLED
 
 # -----------------------------------------------------------
 # App Initialization
 # -----------------------------------------------------------
-app = FastAPI(title="AI Health Assistant")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Heavy backends load lazily unless PRELOAD_BACKENDS asks for them at startup
+    start_warm_up(background=PRELOAD_IN_BACKGROUND)
+    # Background job workers (JOB_WORKERS threads; 0 = this process only accepts jobs)
+    start_workers()
+    # Emergency call dispatchers (EMERGENCY_DISPATCHERS threads; 0 = calls are placed by another process)
+    start_dispatchers()
+    yield
+
+
+app = FastAPI(title="AI Health Assistant", lifespan=lifespan)
 
 # Enable CORS
 app.add_middleware(
@@ -28,62 +72,508 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-path request limits (whole DICOM series are far larger than reports)
+REQUEST_LIMITS = {"/analyze_series": DICOM_MAX_SERIES_BYTES}
+
+
+# Reject oversized uploads from the Content-Length header, before the body is read
+@app.middleware("http")
+async def limit_request_size(request: Request, call_next):
+    limit = REQUEST_LIMITS.get(request.url.path, MAX_REQUEST_BYTES)
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > limit:
+        return JSONResponse(
+            {"detail": f"Upload too large: request exceeds {limit // (1024 * 1024)} MB."},
+            status_code=413,
+        )
+    return await call_next(request)
+
+
+# Request latency histogram + Server-Timing header with the stages of this request (tracing.py).
+# Registered only when TRACING_ENABLED, so disabled tracing adds nothing to the request path.
+async def trace_request(request: Request, call_next):
+    trace, token = start_trace()
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        reset_trace(token)
+    elapsed = time.perf_counter() - start
+
+    # Route template, not the raw path: /jobs/{job_id} is one series, not one per job
+    route = request.scope.get("route")
+    http_seconds.observe(
+        (request.method, getattr(route, "path", "unmatched"), str(response.status_code)), elapsed
+    )
+    # For streaming responses this is the time to the headers, with the stages finished by then
+    if SERVER_TIMING_ENABLED:
+        response.headers["Server-Timing"] = trace.server_timing(elapsed)
+        response.headers["Timing-Allow-Origin"] = "*"
+    return response
+
+
+if TRACING_ENABLED:
+    app.middleware("http")(trace_request)
+
+
 # -----------------------------------------------------------
 # Models
 # -----------------------------------------------------------
 class Query(BaseModel):
     message: str
+    # From POST /sessions; when set, the answer uses (and extends) the session's conversation
+    session_id: Optional[str] = None
 
 
 # -----------------------------------------------------------
 # Chat Endpoint (Now powered by LangGraph)
 # -----------------------------------------------------------
+async def session_context(query: Query):
+    """Prompt context of the query's session (None without one); 404 for unknown sessions."""
+    if query.session_id is None:
+        return None
+    if not await run_blocking(session_store.exists, query.session_id):
+        raise HTTPException(status_code=404, detail="Session not found.")
+    return await run_blocking(session_store.context, query.session_id)
+
+
+def record_exchange_task(query: Query, answer: str):
+    """Stores the turn (and compacts the session) after the response has been sent."""
+    if query.session_id is None:
+        return None
+    return BackgroundTask(session_store.record_exchange, query.session_id, query.message, answer)
+
+
+def caller_id(query: Query) -> str:
+    """
+    Who is asking, for emergency call deduplication. Only a session identifies one person:
+    without it every request is its own caller, so no emergency is ever folded into a
+    stranger's call from behind the same NAT or proxy.
+    """
+    if query.session_id is not None:
+        return f"session:{query.session_id}"
+    return f"anonymous:{uuid.uuid4().hex}"
+
+
 @app.post("/ask", response_class=PlainTextResponse)
 async def ask(query: Query):
+    history = await session_context(query)
     try:
         # The graph handles Safety -> Routing -> Tools -> Response
-        result = graph.invoke({"input": query.message})
-        return result.get("output", "No response generated.")
+        result = await graph.ainvoke({"input": query.message, "history": history, "caller": caller_id(query)})
+        output = result.get("output", "No response generated.")
+        return PlainTextResponse(output, background=record_exchange_task(query, output))
 
     except Exception as e:
         return f"Sorry, something went wrong: {str(e)}"
 
 
+# -----------------------------------------------------------
+# Streaming Chat Endpoint (Server-Sent Events)
+# -----------------------------------------------------------
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/ask/stream")
+async def ask_stream(query: Query):
+    """
+    Same graph as /ask, but the chat answer is sent token by token as it is generated.
+    Emergency and maps answers arrive as a single token event.
+    Events: `token` ({"text": ...}), then `done` ({}) or `error` ({"message": ...}).
+    """
+    history = await session_context(query)
+    caller = caller_id(query)
+
+    async def events():
+        streamed = False
+        output = None
+        try:
+            async for mode, chunk in graph.astream(
+                {"input": query.message, "stream": True, "history": history, "caller": caller},
+                stream_mode=["custom", "updates"],
+            ):
+                if mode == "custom" and "token" in chunk:
+                    streamed = True
+                    yield sse_event("token", {"text": chunk["token"]})
+                elif mode == "updates":
+                    for update in chunk.values():
+                        if update and update.get("output"):
+                            output = update["output"]
+
+            if not streamed:
+                output = output or "No response generated."
+                yield sse_event("token", {"text": output})
+            yield sse_event("done", {})
+            if query.session_id is not None and output:
+                await run_blocking(session_store.record_exchange, query.session_id, query.message, output)
+
+        except Exception as e:
+            yield sse_event("error", {"message": f"Sorry, something went wrong: {str(e)}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# -----------------------------------------------------------
+# Chat Sessions (server-side history with a bounded prompt context)
+# -----------------------------------------------------------
+@app.post("/sessions", status_code=201)
+async def create_session():
+    return {"session_id": await run_blocking(session_store.create)}
+
+
+@app.get("/sessions/{session_id}")
+async def get_session(session_id: str):
+    """Turn counts, the running summary of compacted turns and the unsummarized token estimate."""
+    session = await run_blocking(session_store.get, session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found.")
+    return session
+
+
+@app.get("/sessions/{session_id}/history")
+async def get_session_history(
+    session_id: str,
+    before: Optional[int] = None,
+    limit: int = QueryParam(default=20, ge=1, le=100),
+):
+    """
+    Full turn history, newest first. Pass the returned next_before as ?before=
+    for the previous page (next_before is null on the last page).
+    """
+    if not await run_blocking(session_store.exists, session_id):
+        raise HTTPException(status_code=404, detail="Session not found.")
+    return {"session_id": session_id, **await run_blocking(session_store.history, session_id, before, limit)}
+
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    if not await run_blocking(session_store.delete, session_id):
+        raise HTTPException(status_code=404, detail="Session not found.")
+    return {"session_id": session_id, "deleted": True}
+
+
 # -----------------------------------------------------------
 # Report Analysis Endpoint (Standalone Pipeline)
 # -----------------------------------------------------------
 @app.post("/analyze_report", response_class=PlainTextResponse)
 async def analyze_report(file: UploadFile = File(...)):
+    # Spooled to a temp file in chunks; raises 413 past MAX_UPLOAD_BYTES
+    upload = await spool_upload(file)
     try:
-        file_bytes = await file.read()
-        filename = file.filename
-        result = analyze_medical_file(file_bytes, filename)
+        result = await run_blocking(
+            analyze_medical_path, upload.path, upload.filename, upload.sha256, upload.head
+        )
         return result
 
     except Exception as e:
         return f"Error analyzing report: {str(e)}"
 
+    finally:
+        upload.remove()
+
+
+# -----------------------------------------------------------
+# DICOM Series Analysis
+# -----------------------------------------------------------
+@app.post("/analyze_series", response_class=PlainTextResponse)
+async def analyze_series(files: List[UploadFile] = File(...)):
+    """
+    A whole imaging study (many .dcm files and/or zip archives of them) analyzed in one
+    imaging-agent call on a few representative slices per series (see dicom.py).
+    """
+    uploads = await spool_uploads(
+        files, max_request_bytes=DICOM_MAX_SERIES_BYTES, max_file_bytes=DICOM_MAX_SERIES_BYTES
+    )
+    try:
+        return await run_blocking(
+            analyze_series_cached, [u.path for u in uploads], [u.sha256 for u in uploads]
+        )
+    finally:
+        remove_all(uploads)
+
 
 # -----------------------------------------------------------
 # Trend Analysis Endpoint (New)
 # -----------------------------------------------------------
 @app.post("/analyze_trends")
-async def analyze_trends(files: List[UploadFile] = File(...)):
+async def analyze_trends(
+    files: List[UploadFile] = File(...),
+    stream: bool = False,
+    view: Literal["reports", "series"] = "reports",
+):
+    """
+    Extracts dated biomarkers from every uploaded report (processed concurrently).
+    With ?view=series the response is {"series", "reports"} from trends.build_series:
+    canonical names and units, date-sorted columnar series with delta/slope and range flags.
+    With ?stream=true the response is NDJSON: one line per report as soon as it is done,
+    {"index", "filename", "date", "metrics"} or {"index", "filename", "error"};
+    with view=series a final {"series", "reports"} line follows.
+    """
+    # Each file is spooled to its own temp file; raises 413 past the per-file/per-request limits
+    uploads = await spool_uploads(files)
+    files_data = [(u.filename, u.path, u.sha256, u.head) for u in uploads]
+
     try:
-        # Read all files into memory (careful with large files, but okay for MVP)
-        files_data = []
-        for file in files:
-            content = await file.read()
-            files_data.append((file.filename, content))
-            
+        if stream:
+            def lines():
+                results = [None] * len(files_data)
+                try:
+                    for index, result in iter_trend_paths(files_data):
+                        results[index] = result
+                        yield json.dumps({"index": index, **result}) + "\n"
+                finally:
+                    remove_all(uploads)
+                if view == "series":
+                    yield json.dumps(build_series(results)) + "\n"
+
+            # Starlette iterates sync generators in its threadpool, off the event loop.
+            # The generator frees the uploads as soon as parsing ends; the background task
+            # covers a client that disconnects before the generator is ever started.
+            return StreamingResponse(
+                lines(), media_type="application/x-ndjson", background=BackgroundTask(remove_all, uploads)
+            )
+
         # Process in pipeline
-        results = process_trends(files_data)
+        results = await run_blocking(process_trend_paths, files_data)
+        remove_all(uploads)
+        if view == "series":
+            return build_series(results)
         return results
 
     except Exception as e:
+        remove_all(uploads)
         return {"error": str(e)}
 
 
+# -----------------------------------------------------------
+# Patient Timelines (persistent, incremental trends)
+# -----------------------------------------------------------
+def check_patient_id(patient_id: str):
+    if not valid_patient_id(patient_id):
+        raise HTTPException(status_code=400, detail="patient_id must be 1-64 letters, digits, '.', '_' or '-'.")
+
+
+@app.post("/timelines/{patient_id}/reports")
+async def add_timeline_report(patient_id: str, file: UploadFile = File(...)):
+    """
+    Adds one report to the patient's stored timeline and returns the updated series.
+    A report already on the timeline (same content hash) is not processed again.
+    """
+    check_patient_id(patient_id)
+    upload = await spool_upload(file)
+    try:
+        added = False
+        if not await run_blocking(timeline_store.has_report, patient_id, upload.sha256):
+            result = await run_blocking(
+                process_trend_path, upload.filename, upload.path, upload.sha256, upload.head
+            )
+            if result.get("error"):
+                raise HTTPException(status_code=422, detail=result["error"])
+            added = await run_blocking(timeline_store.add_report, patient_id, upload.sha256, result)
+    finally:
+        upload.remove()
+
+    return {
+        "patient_id": patient_id,
+        "digest": upload.sha256,
+        "added": added,
+        "reports": await run_blocking(timeline_store.reports, patient_id),
+        "series": await run_blocking(timeline_store.series, patient_id),
+    }
+
+
+@app.get("/timelines/{patient_id}")
+async def get_timeline(patient_id: str):
+    """Reports stored on the patient's timeline, oldest first."""
+    check_patient_id(patient_id)
+    return {"patient_id": patient_id, "reports": await run_blocking(timeline_store.reports, patient_id)}
+
+
+@app.get("/timelines/{patient_id}/series")
+async def get_timeline_series(
+    patient_id: str,
+    metric: List[str] = QueryParam(default=[]),
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+):
+    """
+    Stored series (same format as /analyze_trends?view=series; "reports" hold report digests).
+    ?metric= may repeat and accepts any known alias; start/end are inclusive YYYY-MM-DD dates.
+    """
+    check_patient_id(patient_id)
+    try:
+        series = await run_blocking(timeline_store.series, patient_id, metric, start, end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start/end must be dates in YYYY-MM-DD format.")
+    return {"patient_id": patient_id, "series": series}
+
+
+@app.delete("/timelines/{patient_id}/reports/{digest}")
+async def remove_timeline_report(patient_id: str, digest: str):
+    check_patient_id(patient_id)
+    if not await run_blocking(timeline_store.remove_report, patient_id, digest):
+        raise HTTPException(status_code=404, detail="Report not found on this timeline.")
+    return {"patient_id": patient_id, "digest": digest, "removed": True}
+
+
+# -----------------------------------------------------------
+# Background Jobs (submit → poll / SSE progress / webhook)
+# -----------------------------------------------------------
+def run_report_job(payload: dict, progress):
+    report = analyze_medical_path(
+        payload["path"], payload["filename"], payload["sha256"], progress=progress
+    )
+    return {"filename": payload["filename"], "report": report}
+
+
+def run_trends_job(payload: dict, progress):
+    files_data = [(f["filename"], f["path"], f["sha256"], None) for f in payload["files"]]
+    results = [None] * len(files_data)
+
+    progress(f"extracting (0/{len(files_data)})")
+    for done, (index, result) in enumerate(iter_trend_paths(files_data), start=1):
+        results[index] = result
+        progress(f"extracting ({done}/{len(files_data)})")
+
+    return results
+
+
+register_handler("analyze_report", run_report_job)
+register_handler("analyze_trends", run_trends_job)
+
+
+def job_links(job_id: str) -> dict:
+    return {
+        "job_id": job_id,
+        "status_url": f"/jobs/{job_id}",
+        "events_url": f"/jobs/{job_id}/events",
+    }
+
+
+def queue_job(kind: str, uploads: list, callback_url: Optional[str]) -> dict:
+    """Moves the spooled uploads into the job directory and enqueues the job."""
+    job_id = uuid.uuid4().hex
+    try:
+        files = [
+            {"filename": u.filename, "sha256": u.sha256, "path": keep_input(job_id, u.path, i, u.filename)}
+            for i, u in enumerate(uploads)
+        ]
+    finally:
+        remove_all(uploads)  # no-op for files already moved
+
+    payload = files[0] if kind == "analyze_report" else {"files": files}
+    enqueue(kind, payload, callback_url, job_id)
+    return job_links(job_id)
+
+
+def check_callback_url(callback_url: Optional[str]):
+    if callback_url and not callback_allowed(callback_url):
+        raise HTTPException(
+            status_code=400, detail="callback_url must be an https URL on a host listed in JOB_CALLBACK_HOSTS."
+        )
+
+
+@app.post("/jobs/analyze_report", status_code=202)
+async def submit_report_job(file: UploadFile = File(...), callback_url: Optional[str] = Form(None)):
+    """Queues /analyze_report work and returns a job id immediately."""
+    check_callback_url(callback_url)
+    upload = await spool_upload(file)
+    return await run_blocking(queue_job, "analyze_report", [upload], callback_url)
+
+
+@app.post("/jobs/analyze_trends", status_code=202)
+async def submit_trends_job(files: List[UploadFile] = File(...), callback_url: Optional[str] = Form(None)):
+    """Queues /analyze_trends work and returns a job id immediately."""
+    check_callback_url(callback_url)
+    uploads = await spool_uploads(files)
+    return await run_blocking(queue_job, "analyze_trends", uploads, callback_url)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await run_blocking(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    SSE progress stream: a `progress` event ({"status", "stage"}) on every change,
+    then a final `done` or `failed` event with the full job. Safe to reconnect at any time.
+    """
+    if await run_blocking(job_store.get, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+    async def events():
+        last = None
+        while True:
+            job = await run_blocking(job_store.get, job_id)
+            if job is None:
+                yield sse_event("failed", {"job_id": job_id, "error": "Job expired."})
+                return
+
+            state = (job["status"], job["stage"])
+            if state != last:
+                last = state
+                yield sse_event("progress", {"status": job["status"], "stage": job["stage"]})
+
+            if job["status"] in FINAL_STATUSES:
+                yield sse_event(job["status"], job)
+                return
+
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# -----------------------------------------------------------
+# Readiness Endpoint
+# -----------------------------------------------------------
+@app.get("/ready")
+async def ready():
+    """503 until the backends listed in PRELOAD_BACKENDS have finished loading."""
+    status = readiness()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+# -----------------------------------------------------------
+# Cache Statistics
+# -----------------------------------------------------------
+@app.get("/stats")
+async def stats():
+    """
+    Hit/miss counters of the in-process caches (with the in-flight work they coalesced),
+    LLM provider latency and breaker state, and the
+    emergency outbox (calls by status, repeats deduplicated).
+    """
+    return {
+        "maps": maps_cache_stats(),
+        "chat": chat_cache_stats(),
+        "llm": llm_router.stats(),
+        "result_cache": {**result_cache.stats, "coalesced": result_cache.flight.stats()},
+        "emergency": await run_blocking(emergency_outbox.stats),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text format: request, stage and upstream histograms of this worker process."""
+    if not TRACING_ENABLED:
+        raise HTTPException(status_code=404, detail="Tracing is disabled (TRACING_ENABLED=false).")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 # -----------------------------------------------------------
 # Run Server
 # -----------------------------------------------------------
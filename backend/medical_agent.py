@@ -1,26 +1,29 @@
-import os
+try:
+    from .config import GOOGLE_API_KEY, GEMINI_MODEL
+except ImportError:
+    from config import GOOGLE_API_KEY, GEMINI_MODEL
+
+
+def build_medical_agent():
+    """
+    Initialize the Medical Agent.
+    Agno and its tools are imported here so the import cost is only paid on first use
+    (see providers.get_medical_agent, which caches the result).
+    """
+    # Ensure API Key is provided
+    if not GOOGLE_API_KEY:
+        raise ValueError("⚠️ Please set your Google API Key in GOOGLE_API_KEY (or GEMINI_API_KEY)")
+
+    from agno.agent import Agent
+    from agno.models.google import Gemini
+    from agno.tools.duckduckgo import DuckDuckGoTools
+
+    return Agent(
+        model=Gemini(id=GEMINI_MODEL, api_key=GOOGLE_API_KEY),
+        tools=[DuckDuckGoTools()],
+        markdown=True
+    )
 
-from agno.agent import Agent
-from agno.models.google import Gemini
-from agno.tools.duckduckgo import DuckDuckGoTools
-
-
-# Set your API Key (Replace with your actual key)
-GOOGLE_API_KEY = ""
-os.environ["GOOGLE_API_KEY"] = GOOGLE_API_KEY
-
-# Ensure API Key is provided
-if not GOOGLE_API_KEY:
-    raise ValueError("⚠️ Please set your Google API Key in GOOGLE_API_KEY")
-
-# Initialize the Medical Agent
-
-# Initialize the Medical Agent
-medical_agent = Agent(
-    model=Gemini(id="gemini-2.5-flash", api_key=GOOGLE_API_KEY),
-    tools=[DuckDuckGoTools()],
-    markdown=True
-)
 
 # Medical Analysis Query
 MRI_PROMPT = """
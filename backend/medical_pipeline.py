@@ -1,34 +1,54 @@
 import os
 import io
+import hashlib
 import imghdr
+import json
+from functools import lru_cache
 import tempfile
 import warnings
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-import pydicom
+import numpy as np
 from PIL import Image
 
 # OCR + PDF imports (your original pipeline)
-import cv2
-import numpy as np
-from paddleocr import PaddleOCR
-from pdf2image import convert_from_path
+# PaddleOCR, pdf2image, pydicom and Agno are imported lazily (see providers.py)
 from PyPDF2 import PdfReader
 import re
 from rapidfuzz import process, fuzz
 
-# LLM
-from langchain_groq import ChatGroq
-from langchain_groq import ChatGroq
 try:
-    from .config import GROQ_API_KEY, GEMINI_API_KEY
-    from .medical_agent import medical_agent, MRI_PROMPT
+    from .medical_agent import MRI_PROMPT
+    from .concurrency import upstream_slot
+    from .providers import get_gemini_model, gemini_request_options, ocr_engine, get_medical_agent
+    from .config import OCR_WORKERS, OCR_DPI, GEMINI_MODEL, GROQ_MODEL, TRENDS_MAX_WORKERS
+    from .config import MEDICAL_KEYWORDS_FILE, FUZZY_THRESHOLD, FUZZY_WORKERS, FUZZY_MAX_CELLS
+    from .config import BIOMARKER_EXTRACTOR, BIOMARKER_DAY_FIRST
+    from .cache import result_cache, sha256_hex
+    from .llm_router import llm_router
+    from .config import LLM_REPORT_PROVIDERS, IMAGE_PREPROCESS, SUMMARY_CHUNK_TOKENS, SUMMARY_MAP_WORKERS
+    from .chunking import PAGE_BREAK, chunk_text, estimate_tokens
+    from .tracing import add_bytes, bind, span, traced
+    from .imaging import prepare_document_image, prepare_scan_image, preprocess_settings, read_bytes
+    from .dicom import DicomStudy, dicom_frames, montage
+    from .config import DICOM_SERIES_MODE, DICOM_SERIES_SLICES, DICOM_MAX_SERIES, DICOM_MONTAGE_TILE
+    from .biomarkers import parse_lab_text, canonical_name, PARSER_VERSION as BIOMARKER_PARSER_VERSION
 except ImportError:
-    from config import GROQ_API_KEY, GEMINI_API_KEY
-    from medical_agent import medical_agent, MRI_PROMPT
-
-import google.generativeai as genai
-
-genai.configure(api_key=GEMINI_API_KEY)
+    from medical_agent import MRI_PROMPT
+    from concurrency import upstream_slot
+    from providers import get_gemini_model, gemini_request_options, ocr_engine, get_medical_agent
+    from config import OCR_WORKERS, OCR_DPI, GEMINI_MODEL, GROQ_MODEL, TRENDS_MAX_WORKERS
+    from config import MEDICAL_KEYWORDS_FILE, FUZZY_THRESHOLD, FUZZY_WORKERS, FUZZY_MAX_CELLS
+    from config import BIOMARKER_EXTRACTOR, BIOMARKER_DAY_FIRST
+    from cache import result_cache, sha256_hex
+    from llm_router import llm_router
+    from config import LLM_REPORT_PROVIDERS, IMAGE_PREPROCESS, SUMMARY_CHUNK_TOKENS, SUMMARY_MAP_WORKERS
+    from chunking import PAGE_BREAK, chunk_text, estimate_tokens
+    from tracing import add_bytes, bind, span, traced
+    from imaging import prepare_document_image, prepare_scan_image, preprocess_settings, read_bytes
+    from dicom import DicomStudy, dicom_frames, montage
+    from config import DICOM_SERIES_MODE, DICOM_SERIES_SLICES, DICOM_MAX_SERIES, DICOM_MONTAGE_TILE
+    from biomarkers import parse_lab_text, canonical_name, PARSER_VERSION as BIOMARKER_PARSER_VERSION
 
 warnings.filterwarnings("ignore")
 os.environ["KMP_WARNINGS"] = "off"
@@ -36,20 +56,49 @@ os.environ["KMP_WARNINGS"] = "off"
 # -------------------------
 # ORIGINAL OCR CONFIG
 # -------------------------
-ocr = PaddleOCR(use_angle_cls=True, lang='en')
+# PaddleOCR engines are built on first use and pooled (see providers.ocr_engine)
 
-MEDICAL_KEYWORDS = [
+DEFAULT_MEDICAL_KEYWORDS = [
     "paracetamol", "amoxicillin", "metformin", "insulin", "bp", "sugar",
     "hypertension", "prescription", "tablet", "capsule", "mg", "ml", "ecg",
     "cholesterol", "ultrasound", "ct", "mri", "dose", "diabetes", "report"
 ]
-FUZZY_THRESHOLD = 80
+
+
+def load_medical_keywords(path=None) -> list:
+    """Built-in keywords plus those in path (one per line, '#' comments), lowercased and deduplicated."""
+    keywords = list(DEFAULT_MEDICAL_KEYWORDS)
+    if path:
+        with open(path, encoding="utf-8") as f:
+            keywords += [line.split("#", 1)[0].strip().lower() for line in f]
+    return list(dict.fromkeys(kw for kw in keywords if kw))
+
+
+MEDICAL_KEYWORDS = load_medical_keywords(MEDICAL_KEYWORDS_FILE)
 
 
 # ============================================================
 #                 1️⃣   MRI HANDLING SECTION
 # ============================================================
 
+# Leading bytes needed by every signature check below (DICOM, imghdr, PDF/JPEG/PNG)
+HEAD_BYTES = 512
+
+
+def read_head(path) -> bytes:
+    with open(path, "rb") as f:
+        return f.read(HEAD_BYTES)
+
+
+def file_sha256(path) -> str:
+    """SHA-256 of a file, read in 1 MB chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
 def is_dicom_bytes(b: bytes) -> bool:
     return len(b) > 132 and b[128:132] == b"DICM"
 
@@ -74,122 +123,263 @@ def detect_mri(filename: str, file_bytes: bytes) -> bool:
 
 
 def dicom_bytes_to_pil(file_bytes: bytes) -> Image.Image:
-    ds = pydicom.dcmread(io.BytesIO(file_bytes))
-    arr = ds.pixel_array.astype(float)
-    arr = (255 * (arr - arr.min()) / (arr.ptp() + 1e-8)).astype("uint8")
+    return dicom_to_pil(io.BytesIO(file_bytes))
 
-    if arr.ndim == 2:
-        pil = Image.fromarray(arr).convert("RGB")
-    else:
-        pil = Image.fromarray(arr[:, :, 0]).convert("RGB")
 
-    return pil
+def dicom_to_pil(source) -> Image.Image:
+    """
+    source: a path or a binary file object. The (middle) frame, windowed (dicom.window_frame);
+    multi-frame files decode only that frame.
+    """
+    _, frames = dicom_frames(source, max_frames=1)
+    return Image.fromarray(frames[0]).convert("RGB")
 
 
 def image_bytes_to_pil(file_bytes: bytes) -> Image.Image:
     return Image.open(io.BytesIO(file_bytes)).convert("RGB")
 
 
-def pil_to_tempfile(pil_img):
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
-    pil_img.save(tmp.name, "JPEG")
-    tmp.close()
-    return tmp.name
+def pil_to_jpeg_bytes(pil_img) -> bytes:
+    buffer = io.BytesIO()
+    pil_img.save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def encode_scan_array(array) -> tuple:
+    """(bytes, format) of a uint8 image array (grayscale or RGB) for the imaging agent."""
+    if not IMAGE_PREPROCESS:
+        return pil_to_jpeg_bytes(Image.fromarray(array).convert("RGB")), "jpeg"
+    prepared = prepare_scan_image(array=array)
+    return prepared.data, prepared.mime_type.split("/")[1]
+
+
+def series_images(arrays: list) -> list:
+    """Encoded images for a set of slices: one per slice, or a single montage (DICOM_SERIES_MODE)."""
+    if DICOM_SERIES_MODE == "montage" and len(arrays) > 1:
+        arrays = [montage(arrays)]
+    return [encode_scan_array(array) for array in arrays]
+
+
+@traced("pipeline.scan_decode")
+def scan_images(source, filename: str, head: bytes) -> list:
+    """
+    [(bytes, format), ...] sent to the imaging agent, encoded in memory: the image itself, or
+    for DICOM the windowed slice (representative frames of a multi-frame file).
+    With IMAGE_PREPROCESS images are capped at SCAN_MAX_SIDE and re-encoded (imaging.prepare_scan_image).
+    """
+    if filename.lower().endswith((".dcm", ".dicom")) or is_dicom_bytes(head):
+        _, frames = dicom_frames(source)
+        return series_images(frames)
+
+    if not IMAGE_PREPROCESS:
+        return [(pil_to_jpeg_bytes(Image.open(source).convert("RGB")), "jpeg")]
+    prepared = prepare_scan_image(read_bytes(source))
+    return [(prepared.data, prepared.mime_type.split("/")[1])]
+
+
+@traced("pipeline.imaging_agent")
+def run_imaging_agent(prompt: str, images: list) -> str:
+    """One imaging-agent call with every (bytes, format) image attached."""
+    from agno.media import Image as AgnoImage
+    agno_images = [AgnoImage(content=data, format=fmt) for data, fmt in images]
+    add_bytes("gemini", sent=len(prompt.encode()) + sum(len(data) for data, _ in images))
+
+    medical_agent = get_medical_agent()
+    with upstream_slot("gemini"):
+        response = medical_agent.run(prompt, images=agno_images)
+
+    report_text = (
+        response if isinstance(response, str)
+        else getattr(response, "content", str(response))
+    )
+
+    if not report_text.startswith("📋"):
+        report_text = "📋 Analysis Report\n\n" + report_text
+
+    return report_text
 
 
 def analyze_mri_image(file_bytes: bytes, filename: str) -> str:
     """
     Sends MRI image ONLY to Gemini medical imaging agent.
     """
+    return analyze_mri_source(io.BytesIO(file_bytes), filename, file_bytes[:HEAD_BYTES])
 
-    # Convert bytes → PIL
-    if filename.lower().endswith((".dcm", ".dicom")) or is_dicom_bytes(file_bytes):
-        pil = dicom_bytes_to_pil(file_bytes)
-    else:
-        pil = image_bytes_to_pil(file_bytes)
 
-    temp_path = pil_to_tempfile(pil)
+def analyze_mri_source(source, filename: str, head: bytes) -> str:
+    """
+    Same as analyze_mri_image, reading from a path or binary file object.
+    head: the first HEAD_BYTES bytes of the file (used for DICOM detection).
+    """
 
     try:
-        from agno.media import Image as AgnoImage
-        agno_img = AgnoImage(filepath=temp_path)
+        # Encoded in memory (no temp file), downscaled for upload
+        images = scan_images(source, filename, head)
+        prompt = MRI_PROMPT
+        if len(images) > 1:
+            prompt += "\n\nThe images are representative frames of one multi-frame DICOM file, in order."
+        return run_imaging_agent(prompt, images)
 
-        response = medical_agent.run(MRI_PROMPT, images=[agno_img])
+    except Exception as e:
+        return f"⚠️ MRI Analysis Error: {e}"
+
+
+def series_prompt(selections: list) -> str:
+    """MRI_PROMPT plus which slices of which series the attached images show."""
+    lines = []
+    image = 1
+    for selection in selections:
+        slices = ", ".join(map(str, selection.slices))
+        if DICOM_SERIES_MODE == "montage" and len(selection.images) > 1:
+            shown = f"image {image}, a montage of slices {slices} (left to right, top to bottom)"
+            image += 1
+        else:
+            last = image + len(selection.images) - 1
+            shown = f"images {image}-{last}, slices {slices}" if last > image else f"image {image}, slice {slices}"
+            image = last + 1
+        lines.append(f"- {selection.description}: {selection.total} slices; {shown}")
+    return (
+        MRI_PROMPT
+        + "\n\nThe images are representative slices of a DICOM study, ordered by position:\n"
+        + "\n".join(lines)
+        + "\nAnalyze the study as a whole."
+    )
 
-        report_text = (
-            response if isinstance(response, str)
-            else getattr(response, "content", str(response))
-        )
 
-        if not report_text.startswith("📋"):
-            report_text = "📋 Analysis Report\n\n" + report_text
+def analyze_dicom_series(paths: list) -> str:
+    """
+    A whole study (.dcm files and/or zip archives) in one imaging-agent call: headers are read
+    lazily, and only DICOM_SERIES_SLICES representative slices of the DICOM_MAX_SERIES largest
+    series are decoded and sent (one image each, or one montage per series).
+    """
+    try:
+        with span("pipeline.dicom_decode"):
+            with DicomStudy(paths) as study:
+                selections = [s for s in study.select() if s.images]
+            if not selections:
+                return "⚠️ MRI Analysis Error: no DICOM images found in the upload."
 
-        return report_text
+            images = [image for s in selections for image in series_images(s.images)]
+        return run_imaging_agent(series_prompt(selections), images)
 
     except Exception as e:
         return f"⚠️ MRI Analysis Error: {e}"
 
-    finally:
-        try:
-            os.remove(temp_path)
-        except:
-            pass
-
 
 # ============================================================
 #                 2️⃣   ORIGINAL OCR SECTION
 # ============================================================
 
-def extract_keywords_fuzzy(text):
+@traced("pipeline.keywords")
+def extract_keywords_fuzzy(text, keywords=None, threshold=FUZZY_THRESHOLD, workers=FUZZY_WORKERS):
+    """
+    Keywords that occur in the text verbatim, or are the best fuzzy match
+    (partial_ratio >= threshold) of one of its tokens.
+    Each distinct token is scored once: the unique-token × keyword matrix is computed
+    by rapidfuzz.process.cdist in batches of at most FUZZY_MAX_CELLS scores.
+    """
+    keywords = MEDICAL_KEYWORDS if keywords is None else keywords
+    if not keywords:
+        return []
+
     found = set()
     lower_text = text.lower()
-    for kw in MEDICAL_KEYWORDS:
+    for kw in keywords:
         if kw in lower_text:
             found.add(kw)
 
-    tokens = re.findall(r"[A-Za-z0-9\/\-]+", lower_text)
+    tokens = list(dict.fromkeys(re.findall(r"[A-Za-z0-9\/\-]+", lower_text)))
 
-    for token in tokens:
-        match = process.extractOne(
-            token, MEDICAL_KEYWORDS, scorer=fuzz.partial_ratio
+    batch = max(1, FUZZY_MAX_CELLS // len(keywords))
+    for start in range(0, len(tokens), batch):
+        scores = process.cdist(
+            tokens[start:start + batch], keywords,
+            scorer=fuzz.partial_ratio, score_cutoff=threshold, dtype=np.uint8, workers=workers,
         )
-        if match and match[1] >= FUZZY_THRESHOLD:
-            found.add(match[0])
+        # Best keyword per token (first one on ties, like extractOne); 0 = below the cutoff
+        best = scores.argmax(axis=1)
+        matched = scores[np.arange(len(best)), best] >= threshold
+        found.update(keywords[i] for i in np.unique(best[matched]))
 
     return sorted(found)
 
 
-def extract_text_from_pdf(file_path):
-    try:
-        reader = PdfReader(file_path)
-        text = " ".join(page.extract_text() or "" for page in reader.pages)
+OCR_MIN_CONFIDENCE = 0.55
 
-        if len(text.strip()) > 20:
-            return text
 
-        images = convert_from_path(file_path, dpi=300, fmt="jpeg")
-        text_blocks = []
+def ocr_result_lines(result) -> list:
+    """Confident text lines from a PaddleOCR result."""
+    lines = []
+    for page in result or []:
+        for line in page or []:
+            if isinstance(line, list) and len(line) >= 2:
+                t = line[1][0]
+                conf = line[1][1]
 
-        for img in images:
-            tmp_path = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg").name
-            img.save(tmp_path, "JPEG")
+                if conf > OCR_MIN_CONFIDENCE:
+                    lines.append(t)
+    return lines
 
-            result = ocr.ocr(tmp_path)
 
-            for page in result:
-                for line in page:
-                    if isinstance(line, list) and len(line) >= 2:
-                        t = line[1][0]
-                        conf = line[1][1]
+def ocr_pdf_page(file_path, page_number: int) -> list:
+    """
+    Rasterizes a single PDF page and OCRs it straight from memory.
+    The OCR engine is checked out before rasterizing, so across all requests at most
+    OCR_WORKERS page bitmaps are alive in the process at once.
+    """
+    from pdf2image import convert_from_path
 
-                        if conf > 0.55:
-                            text_blocks.append(t)
+    with ocr_engine() as engine:
+        with span("pipeline.rasterize"):
+            images = convert_from_path(
+                file_path, dpi=OCR_DPI, first_page=page_number, last_page=page_number
+            )
+        if not images:
+            return []
+
+        # PaddleOCR expects BGR arrays (as returned by cv2.imread)
+        img = np.asarray(images[0].convert("RGB"))[:, :, ::-1]
+        del images
+
+        with span("pipeline.ocr"):
+            result = engine.ocr(img)
+
+    return ocr_result_lines(result)
+
+
+def ocr_pdf(file_path) -> list:
+    """
+    OCRs every page of a scanned PDF on a pool of OCR_WORKERS threads.
+    Pages are rasterized inside the worker while it holds an OCR engine, so peak memory
+    is bounded by OCR_WORKERS (per process, not per request) rather than the page count. Returns each page's lines, in page order.
+    """
+    from pdf2image import pdfinfo_from_path
+
+    page_count = int(pdfinfo_from_path(file_path).get("Pages", 0))
+    if page_count == 0:
+        return []
+
+    workers = max(1, min(OCR_WORKERS, page_count))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mediflow-ocr") as pool:
+        pages = pool.map(bind(lambda n: ocr_pdf_page(file_path, n)), range(1, page_count + 1))
+        return list(pages)
 
-            os.remove(tmp_path)
+
+def extract_text_from_pdf(file_path):
+    try:
+        with span("pipeline.pdf_text"):
+            reader = PdfReader(file_path)
+            # Pages stay separated so long reports can be chunked on page boundaries
+            text = PAGE_BREAK.join(page.extract_text() or "" for page in reader.pages)
+
+        if len(text.strip()) > 20:
+            return text
+
+        pages = ocr_pdf(file_path)
 
         return (
-            " ".join(text_blocks)
-            if text_blocks
+            PAGE_BREAK.join(" ".join(lines) for lines in pages)
+            if any(pages)
             else "No text found in PDF."
         )
 
@@ -197,19 +387,38 @@ def extract_text_from_pdf(file_path):
         return f"PDF extraction error: {e}"
 
 
+TRANSCRIBE_PROMPT = "Transcribe this medical document text exactly as it appears. If it is handwriting, do your best to transcribe it."
+
+
+def document_image_part(file_path):
+    """The image as sent to Gemini: a preprocessed inline blob, or the PIL image as-is."""
+    if IMAGE_PREPROCESS:
+        try:
+            prepared = prepare_document_image(read_bytes(file_path))
+            return {"mime_type": prepared.mime_type, "data": prepared.data}
+        except Exception as e:
+            # e.g. formats OpenCV can't decode (GIF); Gemini still gets the original
+            print(f"Image preprocessing skipped: {e}")
+    return Image.open(file_path)
+
+
 def extract_text_from_image(file_path):
     try:
         # Use Gemini Flash for fast and accurate handwriting recognition (OCR)
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        
-        # Load image properly
-        img = Image.open(file_path)
+        model = get_gemini_model()
         
+        # Cropped, downscaled and re-encoded in memory (imaging.py); raw image if disabled
+        with span("pipeline.image_preprocess"):
+            img = document_image_part(file_path)
+
         # Prompt for extraction
-        response = model.generate_content([
-            "Transcribe this medical document text exactly as it appears. If it is handwriting, do your best to transcribe it.", 
-            img
-        ])
+        with span("pipeline.transcribe"), upstream_slot("gemini"):
+            response = model.generate_content([
+                TRANSCRIBE_PROMPT,
+                img
+            ], request_options=gemini_request_options())
+        # PIL images (preprocessing disabled) are encoded by the SDK; only inline blobs have a known size
+        add_bytes("gemini", sent=len(img["data"]) if isinstance(img, dict) else 0, received=len((response.text or "").encode()))
         
         return response.text if response.text else "No text found in image."
     except Exception as e:
@@ -220,145 +429,430 @@ def extract_text_from_image(file_path):
 #                 3️⃣   ORIGINAL LLM SUMMARIZER
 # ============================================================
 
-def interpret_report_with_llm(extracted_text):
-    system_prompt = (
-        "You are a medical report summarizer and analyzer.\n"
-        "1. Detect report type\n"
-        "2. Extract main findings\n"
-        "3. Patient-friendly summary\n"
-        "4. If unclear → say 'Invalid or unreadable'"
-    )
+SUMMARY_SYSTEM_PROMPT = (
+    "You are a medical report summarizer and analyzer.\n"
+    "1. Detect report type\n"
+    "2. Extract main findings\n"
+    "3. Patient-friendly summary\n"
+    "4. If unclear → say 'Invalid or unreadable'"
+)
+
+
+CHUNK_SUMMARY_PROMPT = (
+    "You are reading part {part} of {parts} of a long medical report.\n"
+    "Write concise notes on this part only: report type and sections, diagnoses, findings, "
+    "test results with values, units and reference ranges, medications and doses, procedures, dates. "
+    "Keep every abnormal value. Do not add anything that is not in the text."
+)
+
+# Rounds of chunk summaries before the reduce call (notes of notes for very long reports)
+MAX_CONDENSE_ROUNDS = 3
+
+REDUCE_SUMMARY_PROMPT = (
+    "The report was too long to read at once. Below are notes taken on each of its parts, in order; "
+    "treat them together as the extracted text of one report."
+)
+
 
-    llm = ChatGroq(model_name="llama-3.1-8b-instant", api_key=GROQ_API_KEY)
+@traced("pipeline.summary_chunk")
+def summarize_chunk(chunk: str, part: int, parts: int) -> str:
+    prompt = f"{CHUNK_SUMMARY_PROMPT.format(part=part, parts=parts)}\n\nText:\n{chunk}"
+    return llm_router.generate(prompt, LLM_REPORT_PROVIDERS)
 
-    prompt = f"{system_prompt}\n\nExtracted Text:\n{extracted_text}"
+
+def summarize_chunks(chunks: list) -> list:
+    """Notes on every chunk, in order; the chunks are summarized concurrently."""
+    if len(chunks) == 1:
+        return [summarize_chunk(chunks[0], 1, 1)]
+    workers = max(1, min(SUMMARY_MAP_WORKERS, len(chunks)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mediflow-summary") as pool:
+        return list(pool.map(bind(lambda item: summarize_chunk(item[1], item[0], len(chunks))), enumerate(chunks, 1)))
+
+
+def condense_report_text(text: str, max_tokens: int = SUMMARY_CHUNK_TOKENS) -> str:
+    """
+    Map step: text that doesn't fit max_tokens is replaced by notes on its chunks
+    (again, until the notes fit). Latency grows with the number of rounds, not the page count.
+    """
+    for _ in range(MAX_CONDENSE_ROUNDS):
+        if estimate_tokens(text) <= max_tokens:
+            break
+        chunks = chunk_text(text, max_tokens)
+        notes = summarize_chunks(chunks)
+        text = "\n\n".join(f"[Part {i}/{len(notes)}]\n{note.strip()}" for i, note in enumerate(notes, 1))
+        if len(chunks) == 1:
+            break  # a single chunk's notes are as short as they get
+    return text
+
+
+@traced("pipeline.summary")
+def interpret_report_with_llm(extracted_text, keywords=None):
+    """
+    Patient-friendly summary of the report. Short reports go to the LLM in one call; longer ones
+    are summarized chunk by chunk first (condense_report_text) and the notes reduced in a final call.
+    """
+    suffix = "\n\n[Detected Keywords]: " + ", ".join(keywords) if keywords else ""
 
     try:
-        response = llm.invoke(prompt)
-        return response.content if hasattr(response, "content") else str(response)
+        if estimate_tokens(extracted_text) <= SUMMARY_CHUNK_TOKENS:
+            prompt = f"{SUMMARY_SYSTEM_PROMPT}\n\nExtracted Text:\n{extracted_text}{suffix}"
+        else:
+            notes = condense_report_text(extracted_text)
+            prompt = f"{SUMMARY_SYSTEM_PROMPT}\n\n{REDUCE_SUMMARY_PROMPT}\n\nExtracted Text:\n{notes}{suffix}"
+
+        # Groq first; Gemini takes over on failure or races it when Groq is slow (llm_router)
+        return llm_router.generate(prompt, LLM_REPORT_PROVIDERS)
     except Exception as e:
         return f"Error interpreting report: {str(e)}"
 
 
 # ============================================================
-#                 4️⃣   MAIN ENTRYPOINT (UNIFIED)
+#                 CACHED STAGES (CONTENT-ADDRESSED)
 # ============================================================
 
-def analyze_medical_file(file_bytes, filename="upload"):
+# Bump when a stage changes in a way its prompt/model/settings don't capture
+PIPELINE_VERSION = "1"
+
+TEXT_ERROR_PREFIXES = ("PDF extraction error", "Image OCR error")
+
+_STAGE_PARTS = {
+    "text": lambda: (OCR_DPI, OCR_MIN_CONFIDENCE, GEMINI_MODEL, TRANSCRIBE_PROMPT, PAGE_BREAK) + preprocess_settings(),
+    "keywords": lambda: (stage_version("text"), FUZZY_THRESHOLD, sha256_hex("\n".join(MEDICAL_KEYWORDS))),
+    "summary": lambda: (
+        stage_version("keywords"), LLM_REPORT_PROVIDERS, GROQ_MODEL, GEMINI_MODEL, SUMMARY_SYSTEM_PROMPT,
+        SUMMARY_CHUNK_TOKENS, CHUNK_SUMMARY_PROMPT, REDUCE_SUMMARY_PROMPT,
+    ),
+    "biomarkers": lambda: (
+        stage_version("text"), GEMINI_MODEL, BIOMARKER_SYSTEM_PROMPT,
+        BIOMARKER_EXTRACTOR, BIOMARKER_DAY_FIRST, BIOMARKER_PARSER_VERSION,
+    ),
+    "mri": lambda: (
+        GEMINI_MODEL, MRI_PROMPT, DICOM_SERIES_MODE, DICOM_SERIES_SLICES, DICOM_MAX_SERIES, DICOM_MONTAGE_TILE,
+    ) + preprocess_settings(),
+}
+
+
+@lru_cache(maxsize=None)
+def stage_version(stage: str) -> str:
+    """Version tag of a stage; changes whenever its prompt, model, settings or upstream stage change."""
+    parts = (PIPELINE_VERSION, stage) + tuple(_STAGE_PARTS[stage]())
+    return sha256_hex("|".join(map(str, parts)))[:16]
+
+
+def extract_text_cached(path, ext, digest):
+    """Text of the file (PDF text layer/OCR, or Gemini transcription), cached by file digest."""
+    def compute():
+        if ext == ".pdf":
+            return extract_text_from_pdf(path)
+        return extract_text_from_image(path)
 
-    # --- NEW: MRI AUTO-DETECTION ---
-    if detect_mri(filename, file_bytes):
-        return analyze_mri_image(file_bytes, filename)
+    return result_cache.get_or_compute(
+        "text", stage_version("text"), digest, compute,
+        cacheable=lambda text: not text.startswith(TEXT_ERROR_PREFIXES),
+    )
 
-    # --- ORIGINAL PIPELINE BELOW ---
-    signatures = {
-        b"%PDF": ".pdf",
-        b"\xFF\xD8\xFF": ".jpg",
-        b"\x89PNG\r\n\x1a\n": ".png"
-    }
 
-    ext = next((ext for sig, ext in signatures.items() if file_bytes.startswith(sig)), None)
+def extract_keywords_cached(text, digest):
+    return result_cache.get_or_compute(
+        "keywords", stage_version("keywords"), digest, lambda: extract_keywords_fuzzy(text)
+    )
+
+
+def interpret_report_cached(text, keywords, digest):
+    return result_cache.get_or_compute(
+        "summary", stage_version("summary"), digest, lambda: interpret_report_with_llm(text, keywords),
+        cacheable=lambda summary: not summary.startswith("Error interpreting report"),
+    )
+
+
+def extract_biomarkers_cached(text, digest) -> dict:
+    """
+    Biomarker JSON, cached by file digest. Raises on failure (failures are not cached);
+    partial results (Gemini failed for the fragments the local parser left) are not cached either.
+    """
+    data = result_cache.get_or_compute(
+        "biomarkers", stage_version("biomarkers"), digest,
+        lambda: extract_biomarkers_hybrid(text),
+        cacheable=lambda result: not result.get("partial"),
+    )
+    # Callers annotate the result (e.g. filename); never hand out the cached object itself
+    return dict(data)
+
+
+def analyze_mri_cached(path, filename, head, digest):
+    return result_cache.get_or_compute(
+        "mri", stage_version("mri"), digest, lambda: analyze_mri_source(path, filename, head),
+        cacheable=lambda report: not report.startswith("⚠️ MRI Analysis Error"),
+    )
+
+
+def analyze_series_cached(paths: list, digests: list):
+    """analyze_dicom_series, cached by the set of uploaded file digests (upload order doesn't matter)."""
+    digest = sha256_hex("\n".join(sorted(digests)))
+    return result_cache.get_or_compute(
+        "mri", stage_version("mri"), f"series:{digest}", lambda: analyze_dicom_series(paths),
+        cacheable=lambda report: not report.startswith("⚠️ MRI Analysis Error"),
+    )
 
-    if not ext:
-        return "Unsupported file type."
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as tmp:
+# ============================================================
+#                 4️⃣   MAIN ENTRYPOINT (UNIFIED)
+# ============================================================
+
+FILE_SIGNATURES = {
+    b"%PDF": ".pdf",
+    b"\xFF\xD8\xFF": ".jpg",
+    b"\x89PNG\r\n\x1a\n": ".png"
+}
+
+
+def detect_extension(file_bytes: bytes):
+    """Document type from magic bytes (.pdf/.jpg/.png), or None."""
+    return next((ext for sig, ext in FILE_SIGNATURES.items() if file_bytes.startswith(sig)), None)
+
+
+def analyze_medical_file(file_bytes, filename="upload"):
+    """In-memory variant of analyze_medical_path (writes the bytes to a temp file once)."""
+    with tempfile.NamedTemporaryFile(delete=False) as tmp:
         tmp.write(file_bytes)
         path = tmp.name
 
     try:
-        if ext == ".pdf":
-            extracted_text = extract_text_from_pdf(path)
-        else:
-            extracted_text = extract_text_from_image(path)
+        return analyze_medical_path(path, filename, sha256_hex(file_bytes), file_bytes[:HEAD_BYTES])
+    finally:
+        os.remove(path)
 
-        if len(extracted_text.strip()) < 10 or "Error" in extracted_text:
-            return "Could not extract readable text."
 
-        keywords = extract_keywords_fuzzy(extracted_text)
+def analyze_medical_path(path, filename="upload", digest=None, head=None, progress=None):
+    """
+    Analyzes the report stored at path. The file is never loaded whole into memory here;
+    digest/head are computed from the file when the caller doesn't already have them.
+    progress(stage), if given, is called as the pipeline moves through its stages.
+    """
+    progress = progress or (lambda stage: None)
 
-        if keywords:
-            extracted_text += "\n\n[Detected Keywords]: " + ", ".join(keywords)
+    head = read_head(path) if head is None else head
+    # Content address shared by every cached stage of this file
+    digest = digest or file_sha256(path)
 
-        return interpret_report_with_llm(extracted_text)
+    # --- NEW: MRI AUTO-DETECTION ---
+    if detect_mri(filename, head):
+        progress("analyzing_image")
+        return analyze_mri_cached(path, filename, head, digest)
 
-    finally:
-        os.remove(path)
+    # --- ORIGINAL PIPELINE BELOW ---
+    ext = detect_extension(head)
+
+    if not ext:
+        return "Unsupported file type."
+
+    progress("extracting")
+    extracted_text = extract_text_cached(path, ext, digest)
+
+    if len(extracted_text.strip()) < 10 or "Error" in extracted_text:
+        return "Could not extract readable text."
+
+    keywords = extract_keywords_cached(extracted_text, digest)
+
+    progress("summarizing")
+    return interpret_report_cached(extracted_text, keywords, digest)
 
 
 # ============================================================
 #                 5️⃣   TREND ANALYSIS (NEW)
 # ============================================================
 
+BIOMARKER_SYSTEM_PROMPT = (
+    "You are a medical data extractor. Extract the date of the medical report and all quantitative biomarkers (lab results, vitals). "
+    "Return the output as a valid JSON object with this exact structure:\\n"
+    "{\\n"
+    "  \"date\": \"YYYY-MM-DD\" (or null if not found),\\n"
+    "  \"metrics\": [\\n"
+    "    { \"name\": \"Hemoglobin\", \"value\": 13.5, \"unit\": \"g/dL\" },\\n"
+    "    { \"name\": \"Total Cholesterol\", \"value\": 180, \"unit\": \"mg/dL\" }\\n"
+    "  ]\\n"
+    "}\\n"
+    "Rules:\\n"
+    "1. Standardize metric names (e.g., 'HbA1c', 'Glucose Fasting', 'Total Cholesterol').\\n"
+    "2. Convert all numeric values to floats/ints. Remove '<' or '>' symbols if present.\\n"
+    "3. Only include items with numeric values.\\n"
+    "4. Output ONLY valid JSON, no markdown formatting."
+)
+
+
+def _extract_biomarkers_gemini(text: str) -> dict:
+    """Gemini biomarker extraction; raises on upstream or JSON errors."""
+    model = get_gemini_model()
+    with span("pipeline.biomarkers_gemini"), upstream_slot("gemini"):
+        response = model.generate_content(
+            [BIOMARKER_SYSTEM_PROMPT, text], request_options=gemini_request_options()
+        )
+
+    # Clean response to ensure it's pure JSON
+    content = response.text
+    add_bytes("gemini", sent=len(BIOMARKER_SYSTEM_PROMPT) + len(text.encode()), received=len(content.encode()))
+    content = content.replace("```json", "").replace("```", "").strip()
+
+    return json.loads(content)
+
+
 def extract_biomarkers_gemini(text: str) -> dict:
     """
     Uses Gemini to extract structured JSON data (Date + Biomarkers) from report text.
     """
-    system_prompt = (
-        "You are a medical data extractor. Extract the date of the medical report and all quantitative biomarkers (lab results, vitals). "
-        "Return the output as a valid JSON object with this exact structure:\\n"
-        "{\\n"
-        "  \"date\": \"YYYY-MM-DD\" (or null if not found),\\n"
-        "  \"metrics\": [\\n"
-        "    { \"name\": \"Hemoglobin\", \"value\": 13.5, \"unit\": \"g/dL\" },\\n"
-        "    { \"name\": \"Total Cholesterol\", \"value\": 180, \"unit\": \"mg/dL\" }\\n"
-        "  ]\\n"
-        "}\\n"
-        "Rules:\\n"
-        "1. Standardize metric names (e.g., 'HbA1c', 'Glucose Fasting', 'Total Cholesterol').\\n"
-        "2. Convert all numeric values to floats/ints. Remove '<' or '>' symbols if present.\\n"
-        "3. Only include items with numeric values.\\n"
-        "4. Output ONLY valid JSON, no markdown formatting."
-    )
-    
     try:
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        response = model.generate_content([system_prompt, text])
-        
-        # Clean response to ensure it's pure JSON
-        content = response.text
-        content = content.replace("```json", "").replace("```", "").strip()
-        
-        import json
-        return json.loads(content)
-    
+        return _extract_biomarkers_gemini(text)
     except Exception as e:
         print(f"Error extracting biomarkers: {e}")
         return {"date": None, "metrics": []}
 
 
+# Sent along with the unresolved fragments when the local parser found no date (the header usually has it)
+DATE_CONTEXT_CHARS = 600
+
+
+def _merge_gemini_biomarkers(data: dict, llm: dict) -> dict:
+    """Adds Gemini's date/metrics to data where the local parser had nothing; local values win."""
+    if not data["date"] and llm.get("date"):
+        data["date"], data["date_source"] = llm["date"], "gemini"
+
+    known = {metric["name"] for metric in data["metrics"]}
+    for metric in llm.get("metrics") or []:
+        if not isinstance(metric, dict) or not metric.get("name"):
+            continue
+        name = canonical_name(str(metric["name"]))
+        if name in known:
+            continue
+        known.add(name)
+        data["metrics"].append({**metric, "name": name, "source": "gemini"})
+    return data
+
+
+@traced("pipeline.biomarkers")
+def extract_biomarkers_hybrid(text: str) -> dict:
+    """
+    {date, date_source, metrics} where every metric has "source": "local" or "gemini".
+    The local lab-report parser runs first; Gemini only sees the fragments it couldn't
+    resolve (or the whole text if it found nothing), per BIOMARKER_EXTRACTOR.
+    Raises if Gemini fails and the local parser found nothing.
+    """
+    data = {"date": None, "date_source": None, "metrics": []}
+    if BIOMARKER_EXTRACTOR == "gemini":
+        return _merge_gemini_biomarkers(data, _extract_biomarkers_gemini(text))
+
+    parsed = parse_lab_text(text, BIOMARKER_DAY_FIRST)
+    data = {"date": parsed.date, "date_source": "local" if parsed.date else None, "metrics": parsed.metrics}
+    if BIOMARKER_EXTRACTOR == "local":
+        return data
+
+    if not parsed.metrics:
+        remaining = text  # not a layout the parser knows: same single call as before
+    else:
+        fragments = list(parsed.unresolved)
+        if not parsed.date:
+            fragments.insert(0, text[:DATE_CONTEXT_CHARS])
+        if not fragments:
+            return data
+        remaining = "\n".join(fragments)
+
+    try:
+        llm = _extract_biomarkers_gemini(remaining)
+    except Exception as e:
+        if not parsed.metrics:
+            raise
+        print(f"Gemini biomarker fallback failed, keeping local results: {e}")
+        data["partial"] = True
+        return data
+
+    return _merge_gemini_biomarkers(data, llm)
+
+
+def process_trend_file(filename: str, file_bytes: bytes) -> dict:
+    """In-memory variant of process_trend_path."""
+    # We need to save to temp file because extract_text functions rely on file paths
+    with tempfile.NamedTemporaryFile(delete=False) as tmp:
+        tmp.write(file_bytes)
+        tmp_path = tmp.name
+
+    try:
+        return process_trend_path(filename, tmp_path, sha256_hex(file_bytes), file_bytes[:HEAD_BYTES])
+    finally:
+        try:
+            os.remove(tmp_path)
+        except:
+            pass
+
+
+def process_trend_path(filename: str, path, digest=None, head=None) -> dict:
+    """
+    Extracts {date, metrics} from one report for trend analysis.
+    Returns {"filename", "error"} instead of raising, so one bad file never aborts a batch.
+    """
+    try:
+        head = read_head(path) if head is None else head
+        digest = digest or file_sha256(path)
+
+        # Reuse existing text extraction logic
+        ext = detect_extension(head)
+        if not ext:
+            ext = ".pdf" if filename.lower().endswith(".pdf") else ".jpg"
+
+        text = extract_text_cached(path, ext, digest)
+
+        if len(text) <= 10 or text.startswith(TEXT_ERROR_PREFIXES):
+            return {"filename": filename, "error": "Could not extract readable text."}
+
+        data = extract_biomarkers_cached(text, digest)
+        data["filename"] = filename
+        return data
+
+    except Exception as e:
+        print(f"Error processing {filename} for trends: {e}")
+        return {"filename": filename, "error": f"Could not extract biomarkers: {e}"}
+
+
+def _iter_concurrently(func, items: list):
+    """Runs func(*item) for every item on TRENDS_MAX_WORKERS threads; yields (index, result) as they finish."""
+    if not items:
+        return
+
+    workers = max(1, min(TRENDS_MAX_WORKERS, len(items)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mediflow-trends") as pool:
+        futures = {pool.submit(bind(func), *item): index for index, item in enumerate(items)}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def iter_trends(files_data: list):
+    """
+    Processes the files concurrently (TRENDS_MAX_WORKERS at a time) and yields
+    (index, result) pairs in completion order, index being the file's position in files_data.
+    files_data is a list of tuples: (filename, file_bytes)
+    """
+    return _iter_concurrently(process_trend_file, files_data)
+
+
+def iter_trend_paths(files: list):
+    """Same as iter_trends for files already on disk: tuples of (filename, path, digest, head)."""
+    return _iter_concurrently(process_trend_path, files)
+
+
+def _ordered(indexed_results, count: int) -> list:
+    results = [None] * count
+    for index, result in indexed_results:
+        results[index] = result
+    return results
+
+
 def process_trends(files_data: list) -> list:
     """
     Process regular files for trend analysis.
     files_data is a list of tuples: (filename, file_bytes)
+    Results keep the upload order; files that failed appear as {"filename", "error"}.
     """
-    results = []
-    
-    for filename, file_bytes in files_data:
-        # Reuse existing text extraction logic
-        # We need to save to temp file because extract_text functions rely on file paths
-        ext = ".pdf" if filename.lower().endswith(".pdf") else ".jpg" 
-        
-        with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as tmp:
-            tmp.write(file_bytes)
-            tmp_path = tmp.name
-            
-        try:
-            text = ""
-            if ext == ".pdf":
-                text = extract_text_from_pdf(tmp_path)
-            else:
-                text = extract_text_from_image(tmp_path)
-                
-            if len(text) > 10:
-                data = extract_biomarkers_gemini(text)
-                data["filename"] = filename
-                results.append(data)
-                
-        finally:
-            try:
-                os.remove(tmp_path)
-            except:
-                pass
-                
-    return results
+    return _ordered(iter_trends(files_data), len(files_data))
+
+
+def process_trend_paths(files: list) -> list:
+    """Same as process_trends for files already on disk: tuples of (filename, path, digest, head)."""
+    return _ordered(iter_trend_paths(files), len(files))
@@ -0,0 +1,275 @@
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    from .config import (
+        GEMINI_API_KEY, GEMINI_MODEL, GEMINI_TIMEOUT, GEMINI_RETRY_DEADLINE,
+        GEMINI_RETRY_INITIAL_BACKOFF, GROQ_API_KEY, GROQ_MODEL, GROQ_TIMEOUT,
+        GROQ_MAX_RETRIES, GOOGLE_MAPS_API_KEY, PRELOAD_BACKENDS, OCR_WORKERS,
+        TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN,
+    )
+except ImportError:
+    from config import (
+        GEMINI_API_KEY, GEMINI_MODEL, GEMINI_TIMEOUT, GEMINI_RETRY_DEADLINE,
+        GEMINI_RETRY_INITIAL_BACKOFF, GROQ_API_KEY, GROQ_MODEL, GROQ_TIMEOUT,
+        GROQ_MAX_RETRIES, GOOGLE_MAPS_API_KEY, PRELOAD_BACKENDS, OCR_WORKERS,
+        TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN,
+    )
+
+# -----------------------------------------------------------
+# Process-wide client registry
+# -----------------------------------------------------------
+# Clients are created once per process and reused, so their HTTP/gRPC
+# connections stay pooled instead of paying setup + TLS on every request.
+# Heavy SDKs are imported inside the factories, so importing this module
+# (and backend.main) stays cheap until a backend is actually used.
+_instances = {}
+_lock = threading.Lock()
+_build_locks = {}  # key -> lock held while that key's factory runs
+
+
+def get_or_create(key: str, factory):
+    """
+    Returns the registered instance for key, building it with factory() on first use.
+    Builds are serialized per key only: a slow first build (PaddleOCR, the imaging agent)
+    doesn't hold up the first use of any other client.
+    """
+    instance = _instances.get(key)
+    if instance is None:
+        with _lock:
+            build_lock = _build_locks.setdefault(key, threading.Lock())
+        with build_lock:
+            instance = _instances.get(key)
+            if instance is None:
+                instance = factory()
+                with _lock:
+                    _instances[key] = instance
+    return instance
+
+
+def is_loaded(key: str) -> bool:
+    return key in _instances
+
+
+def set_instance(key: str, instance):
+    """Registers (or replaces) an instance, e.g. a local fake client for tests and benchmarks."""
+    with _lock:
+        _instances[key] = instance
+
+
+# -----------------------------------------------------------
+# Gemini
+# -----------------------------------------------------------
+def _configure_gemini():
+    import google.generativeai as genai
+    genai.configure(api_key=GEMINI_API_KEY)
+    return genai
+
+
+def get_gemini_model(model_name: str = None):
+    """Shared GenerativeModel (one per model name) on a once-configured client."""
+    model_name = model_name or GEMINI_MODEL
+    genai = get_or_create("gemini", _configure_gemini)
+    return get_or_create(f"gemini:{model_name}", lambda: genai.GenerativeModel(model_name))
+
+
+def gemini_request_options() -> dict:
+    """Timeout and retry policy passed to every generate_content call."""
+    options = {"timeout": GEMINI_TIMEOUT}
+    if GEMINI_RETRY_DEADLINE > 0:
+        from google.api_core import retry as api_retry
+        options["retry"] = api_retry.Retry(
+            initial=GEMINI_RETRY_INITIAL_BACKOFF,
+            maximum=GEMINI_RETRY_INITIAL_BACKOFF * 8,
+            multiplier=2.0,
+            timeout=GEMINI_RETRY_DEADLINE,
+        )
+    return options
+
+
+# -----------------------------------------------------------
+# Groq
+# -----------------------------------------------------------
+def get_groq_llm(model_name: str = None):
+    """Shared ChatGroq client (one per model name); its httpx pool is reused across calls."""
+    model_name = model_name or GROQ_MODEL
+
+    def build():
+        from langchain_groq import ChatGroq
+        return ChatGroq(
+            model_name=model_name,
+            api_key=GROQ_API_KEY,
+            timeout=GROQ_TIMEOUT,
+            max_retries=GROQ_MAX_RETRIES,
+        )
+
+    return get_or_create(f"groq:{model_name}", build)
+
+
+# -----------------------------------------------------------
+# Heavy local backends
+# -----------------------------------------------------------
+def _build_ocr():
+    from paddleocr import PaddleOCR
+    return PaddleOCR(use_angle_cls=True, lang='en')
+
+
+def get_ocr():
+    """Shared PaddleOCR engine (model weights are loaded on first call)."""
+    return get_or_create("ocr", _build_ocr)
+
+
+# PaddleOCR predictors are not thread-safe, so parallel OCR checks engines out
+# of a small pool (at most OCR_WORKERS engines, the first one being get_ocr()).
+_ocr_pool = queue.LifoQueue()
+_ocr_pool_size = 0
+_ocr_pool_lock = threading.Lock()
+
+
+@contextmanager
+def ocr_engine():
+    """Checks a PaddleOCR engine out of the pool, building one if the pool isn't full yet."""
+    global _ocr_pool_size
+
+    try:
+        engine = _ocr_pool.get_nowait()
+    except queue.Empty:
+        with _ocr_pool_lock:
+            build = _ocr_pool_size < max(1, OCR_WORKERS)
+            if build:
+                _ocr_pool_size += 1
+                first = _ocr_pool_size == 1
+        if build:
+            try:
+                engine = get_ocr() if first else _build_ocr()
+            except Exception:
+                with _ocr_pool_lock:
+                    _ocr_pool_size -= 1
+                raise
+        else:
+            engine = _ocr_pool.get()
+
+    try:
+        yield engine
+    finally:
+        _ocr_pool.put(engine)
+
+
+def get_cv2():
+    return get_or_create("cv2", lambda: __import__("cv2"))
+
+
+def get_gmaps():
+    """Shared Google Maps client."""
+    def build():
+        import googlemaps
+        return googlemaps.Client(key=GOOGLE_MAPS_API_KEY)
+
+    return get_or_create("gmaps", build)
+
+
+def get_twilio_client():
+    """Shared Twilio REST client (emergency calls)."""
+    def build():
+        from twilio.rest import Client
+        return Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+
+    return get_or_create("twilio", build)
+
+
+def get_medical_agent():
+    """Shared Agno imaging agent. Raises ValueError on first use if no Google API key is set."""
+    def build():
+        try:
+            from .medical_agent import build_medical_agent
+        except ImportError:
+            from medical_agent import build_medical_agent
+        return build_medical_agent()
+
+    return get_or_create("medical_agent", build)
+
+
+# -----------------------------------------------------------
+# Warm-up & Readiness
+# -----------------------------------------------------------
+# name -> (registry key, loader)
+LOADERS = {
+    "ocr": ("ocr", get_ocr),
+    "cv2": ("cv2", get_cv2),
+    "gmaps": ("gmaps", get_gmaps),
+    "medical_agent": ("medical_agent", get_medical_agent),
+    "gemini": (f"gemini:{GEMINI_MODEL}", get_gemini_model),
+    "groq": (f"groq:{GROQ_MODEL}", get_groq_llm),
+}
+
+_warmup = {"requested": [], "done": False, "timings": {}, "errors": {}}
+
+
+def preload_names(spec: str = PRELOAD_BACKENDS) -> list:
+    """Parses a PRELOAD_BACKENDS value ("all", "", or a comma-separated list)."""
+    spec = (spec or "").strip().lower()
+    if not spec or spec == "none":
+        return []
+    if spec == "all":
+        return list(LOADERS)
+    return [name.strip() for name in spec.split(",") if name.strip() in LOADERS]
+
+
+def warm_up(names: list = None) -> dict:
+    """
+    Loads the given backends now instead of on first request.
+    Returns per-backend load time in seconds; failures are recorded, not raised.
+    """
+    names = preload_names() if names is None else names
+    _warmup["requested"] = list(names)
+    _warmup["done"] = False
+
+    for name in names:
+        _, loader = LOADERS[name]
+        start = time.perf_counter()
+        try:
+            loader()
+            _warmup["timings"][name] = round(time.perf_counter() - start, 3)
+        except Exception as e:
+            _warmup["errors"][name] = str(e)
+            print(f"Warm-up failed for {name}: {e}")
+
+    _warmup["done"] = True
+    return dict(_warmup["timings"])
+
+
+def start_warm_up(names: list = None, background: bool = True):
+    """Startup hook: warms up inline, or in a daemon thread so the app can serve /ready meanwhile."""
+    names = preload_names() if names is None else names
+    # Mark the request before the thread starts so /ready can't report ready too early
+    _warmup["requested"] = list(names)
+    if not names:
+        _warmup["done"] = True
+        return
+    if background:
+        threading.Thread(target=warm_up, args=(names,), name="mediflow-warmup", daemon=True).start()
+    else:
+        warm_up(names)
+
+
+def readiness() -> dict:
+    """Load state of every backend, plus whether the requested warm-up has finished."""
+    backends = {}
+    for name, (key, _) in LOADERS.items():
+        if name in _warmup["errors"]:
+            backends[name] = "failed"
+        else:
+            backends[name] = "loaded" if is_loaded(key) else "lazy"
+
+    ready = _warmup["done"] or not _warmup["requested"]
+    ready = ready and not any(name in _warmup["errors"] for name in _warmup["requested"])
+
+    return {
+        "ready": ready,
+        "preload": _warmup["requested"],
+        "backends": backends,
+        "load_seconds": dict(_warmup["timings"]),
+        "errors": dict(_warmup["errors"]),
+    }
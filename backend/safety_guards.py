@@ -1,107 +1,343 @@
+from typing import NamedTuple, Optional
 
-import re
+# -----------------------------------------------------------
+# 1. Emergency Phrases
+# -----------------------------------------------------------
+# Matched as whole words, ignoring case, whitespace, apostrophes and hyphens
+# ("I'm", "im", "i m"; "self-harm", "self harm", "selfharm" all match).
+EMERGENCY_PHRASES = [
+    # 🔥 Explicit suicidal intent
+    "suicide", "suicidal", "kill myself", "end my life", "want to die",
+    "taking my life", "ending it all", "ready to die",
+    "die by suicide", "hang myself", "jump off", "overdose",
+    "poison myself", "shoot myself", "bleed out",
+
+    # 🔥 Strong indirect signals of self-harm
+    "self harm", "hurt myself", "cut myself",
+    "thinking about ending it",
+    "i'm scared of what i'll do",
+    "i might do something stupid",
+    "i don't trust myself",
+
+    # 🔥 Hopelessness (clinical danger zone)
+    "no reason to live", "life isn't worth living",
+    "nothing matters anymore", "i wish it would all end",
+    "why am i alive", "life has no purpose",
+    "everything is pointless", "i'm done with this life",
+    "i want out of this life", "no hope left",
+
+    # 🔥 Severe emotional collapse
+    "i'm breaking down", "i'm falling apart",
+    "i'm at my limit", "i can't handle this anymore",
+    "i can't go on", "i'm done fighting",
+    "i'm exhausted with life",
+
+    # 🔥 “Giving up” statements
+    "i'm giving up", "i give up on everything",
+    "what's the point anymore", "why should i try",
+    "i've lost all will to live",
+
+    # 🔥 Extreme sadness with danger indicators
+    "i'm in so much pain", "i'm drowning",
+    "i feel empty inside", "i feel numb",
+    "i'm completely alone", "i'm beyond tired",
+    "i'm so tired of everything",
+
+    # 🔥 Self-hate at dangerous intensity
+    "i hate myself so much", "i'm better off gone",
+    "nobody would miss me", "nobody cares if i die",
+    "i'm worthless", "i'm a burden",
+
+    # 🔥 “Disappearing” or “not existing”
+    "i don't want to exist",
+    "wish i could disappear",
+    "i'd be happier gone",
+    "i should vanish",
+]
 
 # -----------------------------------------------------------
-# 1. Emergency Detection Regex
+# 2. Location, Disease & Specialty Vocabulary
 # -----------------------------------------------------------
-EMERGENCY_PATTERN = re.compile(
-    r"""
-    \b(
-        # 🔥 Explicit suicidal intent
-        suicide|suicidal|kill\s*myself|end\s*my\s*life|want\s*to\s*die|
-        taking\s*my\s*life|ending\s*it\s*all|ready\s*to\s*die|
-        die\s*by\s*suicide|hang\s*myself|jump\s*off|overdose|
-        poison\s*myself|shoot\s*myself|bleed\s*out|
-
-        # 🔥 Strong indirect signals of self-harm
-        self[- ]?harm|hurt\s*myself|cut\s*myself|
-        thinking\s*about\s*ending\s*it|
-        i'?m\s*scared\s*of\s*what\s*i'?ll\s*do|
-        i\s*might\s*do\s*something\s*stupid|
-        i\s*don'?t\s*trust\s*myself|
-
-        # 🔥 Hopelessness (clinical danger zone)
-        no\s*reason\s*to\s*live|life\s*isn'?t\s*worth\s*living|
-        nothing\s*matters\s*anymore|i\s*wish\s*it\s*would\s*all\s*end|
-        why\s*am\s*i\s*alive|life\s*has\s*no\s*purpose|
-        everything\s*is\s*pointless|i'?m\s*done\s*with\s*this\s*life|
-        i\s*want\s*out\s*of\s*this\s*life|no\s*hope\s*left|
-
-        # 🔥 Severe emotional collapse
-        i'?m\s*breaking\s*down|i'?m\s*falling\s*apart|
-        i'?m\s*at\s*my\s*limit|i\s*can'?t\s*handle\s*this\s*anymore|
-        i\s*can'?t\s*go\s*on|i'?m\s*done\s*fighting|
-        i'?m\s*exhausted\s*with\s*life|
-
-        # 🔥 “Giving up” statements
-        i'?m\s*giving\s*up|i\s*give\s*up\s*on\s*everything|
-        what'?s\s*the\s*point\s*anymore|why\s*should\s*i\s*try|
-        i'?ve\s*lost\s*all\s*will\s*to\s*live|
-
-        # 🔥 Extreme sadness with danger indicators
-        i'?m\s*in\s*so\s*much\s*pain|i'?m\s*drowning|
-        i\s*feel\s*empty\s*inside|i\s*feel\s*numb|
-        i'?m\s*completely\s*alone|i'?m\s*beyond\s*tired|
-        i'?m\s*so\s*tired\s*of\s*everything|
-
-        # 🔥 Self-hate at dangerous intensity
-        i\s*hate\s*myself\s*so\s*much|i'?m\s*better\s*off\s*gone|
-        nobody\s*would\s*miss\s*me|nobody\s*cares\s*if\s*i\s*die|
-        i'?m\s*worthless|i'?m\s*a\s*burden|
-
-        # 🔥 “Disappearing” or “not existing”
-        i\s*don'?t\s*want\s*to\s*exist|
-        wish\s*i\s*could\s*disappear|
-        i'?d\s*be\s*happier\s*gone|
-        i\s*should\s*vanish
-    )\b
-    """,
-    re.IGNORECASE | re.VERBOSE,
-)
+# Disease / symptom keyword → specialist. Earlier entries win when several match.
+SPECIALTY_MAP = {
+    "depression": "psychiatrist", "anxiety": "psychiatrist", "stress": "therapist",
+    "mental": "psychologist", "suicide": "psychiatrist", "diabetes": "endocrinologist",
+    "skin": "dermatologist", "rash": "dermatologist", "acne": "dermatologist",
+    "heart": "cardiologist", "chest": "cardiologist", "blood": "hematologist",
+    "eye": "ophthalmologist", "vision": "ophthalmologist", "stomach": "gastroenterologist",
+    "cough": "general physician", "cold": "general physician", "fever": "general physician",
+    "infection": "general physician", "thyroid": "endocrinologist", "bone": "orthopedic",
+    "joint": "orthopedic", "teeth": "dentist", "dental": "dentist", "cancer": "oncologist",
+    "allergy": "immunologist"
+}
+
+# Words that name who/where the user is looking for ("doctors in Delhi")
+PROVIDER_WORDS = {"doctor", "therapist", "psychiatrist", "clinic", "hospital", "specialist", "physician"}
+# Named specialists also act as providers and fix the specialty ("cardiologist in Kolkata")
+SPECIALIST_WORDS = {spec for spec in SPECIALTY_MAP.values() if " " not in spec} | {"psychologist"}
+
+# Providers a location may follow without a preposition ("doctors Delhi"), as the regex version
+# allowed. Any other provider word needs one: "cardiologist in Delhi", not "cardiologist do".
+BARE_LOCATION_PROVIDERS = {"doctor", "therapist", "psychiatrist", "clinic", "hospital"}
+
+LOCATION_PREPOSITIONS = {"in", "near", "around", "at", "within", "nearby"}
+DISEASE_PREPOSITIONS = {"for", "treating"}
+
+# Leading words dropped from the disease phrase ("find me a good ...")
+FILLER_WORDS = {
+    "find", "me", "a", "an", "some", "the", "good", "best", "top", "nearby", "any", "i", "need",
+    "want", "looking", "search", "show", "get", "please", "can", "you", "recommend", "suggest",
+}
+
 
 # -----------------------------------------------------------
-# 2. Location & Disease Detection Regex
+# 3. Single-pass Multi-pattern Automaton (Aho-Corasick)
 # -----------------------------------------------------------
-LOCATION_PATTERN = re.compile(
-    r"""
-    (?:
-        (?:find\s*(?:me\s*)?(?:a|some)?\s*)?
-        (?:good|best|top)?\s*
-        (?:nearby\s*)?
-        (?:doctors?|therapists?|psychiatrists?|clinics?|hospitals?)
-        (?:\s*(?:in|near|around|at|within|close\s*to)\s+)?
-        ([A-Za-z\s]+)
-    )
-    |
-    (?:
-        (?:any\s*)?(?:doctors?|therapists?|psychiatrists?|hospitals?|clinics?)
-        \s*(?:available\s*)?(?:nearby|around|close\s*to|in|at)\s+([A-Za-z\s]+)
-    )
-    """,
-    re.IGNORECASE | re.VERBOSE,
-)
-
-DISEASE_PATTERN = re.compile(
-    r"""
-    (?:
-        (?:top|best|good)?\s*
-        ([A-Za-z\s]+?)\s*
-        (?:doctors?|therapists?|psychiatrists?|specialists?|clinics?)\s+
-        (?:in|near|around|at|within|close\s*to)
-    )
-    |
-    (?:
-        (?:doctor|specialist|therapist)\s*(?:for|treating|who\s*treats)\s*
-        ([A-Za-z\s]+)
+def _is_word_char(c: str) -> bool:
+    return c.isalnum() or c == "_"
+
+
+# Dropped before matching, so they can't break or separate a phrase
+_SKIPPED_CHARS = frozenset(" \t\r\n\f\v'’-")
+
+
+def _normalize_phrase(phrase: str) -> str:
+    return "".join(c for c in phrase.lower() if c not in _SKIPPED_CHARS)
+
+
+class PhraseAutomaton:
+    """
+    Aho-Corasick automaton over normalized characters. Feeding a text through it
+    costs O(len(text) + matches) regardless of how many phrases it holds.
+    """
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]  # state -> [(pattern_id, pattern_length)]
+        self.patterns = []
+
+    def add(self, phrase: str, payload) -> None:
+        key = _normalize_phrase(phrase)
+        state = 0
+        for c in key:
+            nxt = self.goto[state].get(c)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][c] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+            state = nxt
+        self.out[state].append((len(self.patterns), len(key)))
+        self.patterns.append(payload)
+
+    def build(self) -> "PhraseAutomaton":
+        queue = list(self.goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for c, nxt in self.goto[state].items():
+                queue.append(nxt)
+                if state:
+                    # Longest proper suffix of this prefix that is also a prefix in the trie
+                    self.fail[nxt] = self.step(self.fail[state], c)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+        return self
+
+    def step(self, state: int, c: str) -> int:
+        while state and c not in self.goto[state]:
+            state = self.fail[state]
+        return self.goto[state].get(c, 0)
+
+
+class Intent(NamedTuple):
+    is_emergency: bool
+    emergency_phrase: Optional[str]
+    location: Optional[str]
+    disease: Optional[str]
+    specialist: Optional[str]
+
+
+_EMERGENCY, _SPECIALTY = "emergency", "specialty"
+
+_automaton = PhraseAutomaton()
+for _phrase in EMERGENCY_PHRASES:
+    _automaton.add(_phrase, (_EMERGENCY, _phrase, 0))
+for _priority, _keyword in enumerate(SPECIALTY_MAP):
+    _automaton.add(_keyword, (_SPECIALTY, _keyword, _priority))
+_automaton.build()
+
+
+def _token_key(word: str) -> str:
+    """Singular form for provider/specialist lookups ("doctors" → "doctor")."""
+    return word[:-1] if word.endswith("s") and len(word) > 3 else word
+
+
+def _scan(text: str, automaton: PhraseAutomaton = _automaton):
+    """
+    One pass over text that both runs the automaton and splits ASCII words.
+    Returns (emergency_phrase, specialty_hits, tokens):
+      specialty_hits: [(start, end, priority, keyword)] in original offsets
+      tokens: [(word_lower, segment, start, end, word)]; a segment is a run of letters/whitespace
+              (any other character starts a new one, as in "doctors in Delhi, fast")
+    """
+    emergency = None
+    specialty_hits = []
+    tokens = []
+
+    positions = []  # original index of every normalized character fed to the automaton
+    state = 0
+    segment = 0
+    word_start = -1
+    n = len(text)
+
+    for i in range(n + 1):
+        c = text[i] if i < n else " "
+
+        # --- word / segment split ---
+        if ("a" <= c <= "z") or ("A" <= c <= "Z"):
+            if word_start < 0:
+                word_start = i
+        else:
+            if word_start >= 0:
+                word = text[word_start:i]
+                tokens.append((word.lower(), segment, word_start, i, word))
+                word_start = -1
+            if not c.isspace():
+                segment += 1
+
+        if i == n:
+            break
+
+        # --- automaton ---
+        if c in _SKIPPED_CHARS:
+            continue
+        lc = c.lower()
+        positions.append(i)
+        state = automaton.step(state, lc)
+
+        for pattern_id, length in automaton.out[state]:
+            kind, phrase, priority = automaton.patterns[pattern_id]
+            start = positions[len(positions) - length]
+
+            if kind == _EMERGENCY:
+                # Whole-word match only (like \b...\b)
+                if emergency is None and (start == 0 or not _is_word_char(text[start - 1])) \
+                        and (i + 1 >= n or not _is_word_char(text[i + 1])):
+                    emergency = phrase
+            elif i - start == length - 1:
+                # Specialty keywords are plain substrings, but must be contiguous in the text
+                specialty_hits.append((start, i + 1, priority, phrase))
+
+    return emergency, specialty_hits, tokens
+
+
+def _find_location_preposition(tokens: list):
+    """(start, end) token indices of the first "in"/"near"/"close to"/... or None."""
+    for k, token in enumerate(tokens):
+        if token[0] in LOCATION_PREPOSITIONS:
+            return k, k + 1
+        if token[0] == "close" and k + 1 < len(tokens) and tokens[k + 1][0] == "to":
+            return k, k + 2
+    return None
+
+
+def _extract_query(tokens: list):
+    """
+    Finds "<disease> <provider> <preposition> <location>" style requests.
+    Returns (location, disease_tokens, provider_key) or (None, [], None).
+    """
+    # Token index range of every segment, so each provider only looks at its own clause
+    bounds = {}
+    for idx, token in enumerate(tokens):
+        first, _ = bounds.get(token[1], (idx, idx))
+        bounds[token[1]] = (first, idx + 1)
+
+    for idx, (word, segment, *_) in enumerate(tokens):
+        key = _token_key(word)
+        if key not in PROVIDER_WORDS and key not in SPECIALIST_WORDS:
+            continue
+
+        seg_start, seg_end = bounds[segment]
+        rest = tokens[idx + 1:seg_end]
+        before = tokens[seg_start:idx]
+
+        # "doctor for diabetes in Kolkata": disease after the provider
+        disease_tokens = []
+        if rest and (rest[0][0] in DISEASE_PREPOSITIONS or [t[0] for t in rest[:2]] == ["who", "treats"]):
+            skip = 2 if rest[0][0] == "who" else 1
+            tail = rest[skip:]
+            prep = _find_location_preposition(tail)
+            disease_tokens = tail[:prep[0]] if prep else tail
+            rest = tail[prep[0]:] if prep else []
+        else:
+            disease_tokens = before
+
+        # Optional "available", then a preposition ("in", "near", "close to", ...)
+        if rest and rest[0][0] == "available":
+            rest = rest[1:]
+        prep = _find_location_preposition(rest)
+        if prep is not None and prep[0] == 0:
+            location_tokens = rest[prep[1]:]
+        elif key in BARE_LOCATION_PROVIDERS:
+            location_tokens = rest[prep[1]:] if prep else rest
+        else:
+            # "what does a cardiologist do", "my dentist said ...": a question for chat
+            location_tokens = []
+
+        if location_tokens:
+            location = " ".join(t[4] for t in location_tokens)
+            while disease_tokens and disease_tokens[0][0] in FILLER_WORDS:
+                disease_tokens = disease_tokens[1:]
+            return location, disease_tokens, key
+
+    return None, [], None
+
+
+def scan_intent(text: str) -> Intent:
+    """
+    Classifies a message in a single linear pass: emergency phrase, requested location,
+    disease/condition and the matching specialist.
+    """
+    emergency, specialty_hits, tokens = _scan(text)
+    location, disease_tokens, provider = _extract_query(tokens)
+
+    disease = None
+    specialist = None
+    if location:
+        if disease_tokens:
+            start, end = disease_tokens[0][2], disease_tokens[-1][3]
+            disease = " ".join(t[4] for t in disease_tokens)
+            in_span = [hit for hit in specialty_hits if hit[0] >= start and hit[1] <= end]
+            if in_span:
+                specialist = SPECIALTY_MAP[min(in_span, key=lambda hit: hit[2])[3]]
+        if specialist is None and provider in SPECIALIST_WORDS:
+            specialist = provider
+
+    return Intent(
+        is_emergency=emergency is not None,
+        emergency_phrase=emergency,
+        location=location,
+        disease=disease,
+        specialist=specialist,
     )
-    """,
-    re.IGNORECASE | re.VERBOSE,
-)
+
+
+def classify_specialty(disease: Optional[str]) -> str:
+    """Specialist for a disease/condition phrase ("doctor" if nothing matches)."""
+    if not disease:
+        return "doctor"
+    _, specialty_hits, _ = _scan(disease)
+    if not specialty_hits:
+        return "doctor"
+    return SPECIALTY_MAP[min(specialty_hits, key=lambda hit: hit[2])[3]]
 
 
 def detect_emergency(text: str) -> bool:
     """Returns True if the text contains suicidal or self-harm keywords."""
-    return bool(EMERGENCY_PATTERN.search(text))
+    return scan_intent(text).is_emergency
 
 
 def extract_location_and_disease(text: str) -> tuple[str | None, str | None]:
@@ -109,19 +345,5 @@ def extract_location_and_disease(text: str) -> tuple[str | None, str | None]:
     Attempts to extract a location and a disease/condition from the query.
     Returns (location, disease) or (None, None).
     """
-    location_match = LOCATION_PATTERN.search(text)
-    disease_match = DISEASE_PATTERN.search(text)
-
-    if location_match:
-        # Group 1 is first alternative, Group 2 is second alternative
-        location = location_match.group(1) or location_match.group(2)
-        location = location.strip() if location else None
-        
-        disease = None
-        if disease_match:
-             disease = disease_match.group(1) or disease_match.group(2)
-             disease = disease.strip() if disease else None
-             
-        return location, disease
-    
-    return None, None
+    intent = scan_intent(text)
+    return intent.location, intent.disease
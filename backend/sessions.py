@@ -0,0 +1,243 @@
+import time
+import uuid
+
+try:
+    from .config import (
+        SESSIONS_DB, SESSION_CONTEXT_TOKENS, SESSION_SUMMARY_TOKENS, SESSION_COMPACT_TO,
+        SESSION_RETENTION_SECONDS,
+    )
+    from .config import LLM_REPORT_PROVIDERS
+    from .llm_router import llm_router
+    from .storage import SQLiteStore
+except ImportError:
+    from config import (
+        SESSIONS_DB, SESSION_CONTEXT_TOKENS, SESSION_SUMMARY_TOKENS, SESSION_COMPACT_TO,
+        SESSION_RETENTION_SECONDS,
+    )
+    from config import LLM_REPORT_PROVIDERS
+    from llm_router import llm_router
+    from storage import SQLiteStore
+
+# ~4 characters per token for English text; only used to keep prompts bounded
+CHARS_PER_TOKEN = 4
+
+SESSION_SUMMARY_PROMPT = (
+    "Condense this conversation between a patient and a medical assistant into a short summary "
+    "of at most {words} words. Keep symptoms, conditions, medications, test values, locations and "
+    "advice already given. Write in the third person. Output only the summary."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, (len(text or "") + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
+
+
+def _tail(text: str, tokens: int) -> str:
+    """Last `tokens` (estimated) of text."""
+    limit = tokens * CHARS_PER_TOKEN
+    return text if len(text) <= limit else "…" + text[-limit:]
+
+
+def summarize_turns(summary: str, turns: list) -> str:
+    """New running summary from the previous one plus (role, content) turns (Groq first, see llm_router)."""
+    transcript = "\n".join(f"{role.title()}: {content}" for role, content in turns)
+    prompt = SESSION_SUMMARY_PROMPT.format(words=SESSION_SUMMARY_TOKENS * 3 // 4)
+    if summary:
+        prompt += f"\n\nSummary so far:\n{summary}"
+    prompt += f"\n\nNew messages:\n{transcript}"
+    return llm_router.generate(prompt, LLM_REPORT_PROVIDERS)
+
+
+def fallback_summary(summary: str, turns: list) -> str:
+    """Extractive summary used when the LLM is unavailable: the start of every compacted turn."""
+    notes = [f"{role.title()}: {content[:160]}" for role, content in turns]
+    return "\n".join(filter(None, [summary] + notes))
+
+
+class SessionStore(SQLiteStore):
+    """
+    Server-side chat sessions. Every turn is kept for history; the prompt context is the
+    running summary plus the newest turns that fit SESSION_CONTEXT_TOKENS, so it stays
+    bounded however long a session runs. compact() folds the oldest turns into the summary.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        id TEXT PRIMARY KEY,
+        created REAL NOT NULL,
+        updated REAL NOT NULL,
+        summary TEXT NOT NULL DEFAULT '',
+        summarized_upto INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE TABLE IF NOT EXISTS session_turns (
+        session_id TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        tokens INTEGER NOT NULL,
+        created REAL NOT NULL,
+        PRIMARY KEY (session_id, seq)
+    );
+    CREATE INDEX IF NOT EXISTS sessions_updated ON sessions(updated);
+    """
+
+    PURGE_EVERY = 3600  # seconds between purges of expired sessions
+
+    def __init__(self, db_path: str):
+        super().__init__(db_path)
+        self._last_purge = 0.0
+
+    def create(self) -> str:
+        if time.time() - self._last_purge > self.PURGE_EVERY:
+            self._last_purge = time.time()
+            self.purge()
+
+        session_id = uuid.uuid4().hex
+        now = time.time()
+        self.conn().execute(
+            "INSERT INTO sessions (id, created, updated) VALUES (?, ?, ?)", (session_id, now, now)
+        )
+        return session_id
+
+    def exists(self, session_id: str) -> bool:
+        return self.conn().execute("SELECT 1 FROM sessions WHERE id = ?", (session_id,)).fetchone() is not None
+
+    def get(self, session_id: str):
+        row = self.conn().execute("SELECT * FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        counts = self.conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(CASE WHEN seq > ? THEN tokens END), 0)"
+            " FROM session_turns WHERE session_id = ?",
+            (row["summarized_upto"], session_id),
+        ).fetchone()
+        return {
+            "session_id": row["id"],
+            "created": row["created"],
+            "updated": row["updated"],
+            "turns": counts[0],
+            "summarized_turns": row["summarized_upto"],
+            "summary": row["summary"] or None,
+            "pending_tokens": counts[1],
+        }
+
+    def delete(self, session_id: str) -> bool:
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM session_turns WHERE session_id = ?", (session_id,))
+            return conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,)).rowcount > 0
+
+    def purge(self, older_than: float = SESSION_RETENTION_SECONDS):
+        cutoff = time.time() - older_than
+        with self.transaction() as conn:
+            conn.execute(
+                "DELETE FROM session_turns WHERE session_id IN (SELECT id FROM sessions WHERE updated < ?)",
+                (cutoff,),
+            )
+            conn.execute("DELETE FROM sessions WHERE updated < ?", (cutoff,))
+
+    # --- Turns ---
+    def append(self, session_id: str, turns: list):
+        """Appends (role, content) turns ("user" / "assistant") in order, atomically."""
+        now = time.time()
+        with self.transaction() as conn:
+            last = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM session_turns WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+            conn.executemany(
+                "INSERT INTO session_turns (session_id, seq, role, content, tokens, created)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (session_id, last + i, role, content, estimate_tokens(content), now)
+                    for i, (role, content) in enumerate(turns, start=1)
+                ],
+            )
+            conn.execute("UPDATE sessions SET updated = ? WHERE id = ?", (now, session_id))
+
+    def record_exchange(self, session_id: str, message: str, answer: str):
+        """Stores one user message and its answer, then compacts the session if it is over budget."""
+        self.append(session_id, [("user", message), ("assistant", answer)])
+        try:
+            self.compact(session_id)
+        except Exception as e:
+            print(f"Session compaction failed: {e}")
+
+    def history(self, session_id: str, before: int = None, limit: int = 20) -> dict:
+        """Turns newest first; pass the returned next_before to get the previous page."""
+        rows = self.conn().execute(
+            "SELECT seq, role, content, created FROM session_turns"
+            " WHERE session_id = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+            (session_id, before if before is not None else 2 ** 62, limit + 1),
+        ).fetchall()
+        page = [dict(row) for row in rows[:limit]]
+        return {"turns": page, "next_before": page[-1]["seq"] if len(rows) > limit else None}
+
+    # --- Prompt context ---
+    def context(self, session_id: str, budget: int = SESSION_CONTEXT_TOKENS) -> dict:
+        """
+        {"summary", "turns": [(role, content), ...]} for the prompt: the running summary plus
+        the newest not-yet-summarized turns within budget (the newest turn is trimmed if it alone is too big).
+        """
+        row = self.conn().execute(
+            "SELECT summary, summarized_upto FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return {"summary": None, "turns": []}
+
+        turns, used = [], 0
+        for turn in self.conn().execute(
+            "SELECT role, content, tokens FROM session_turns WHERE session_id = ? AND seq > ? ORDER BY seq DESC",
+            (session_id, row["summarized_upto"]),
+        ):
+            if used + turn["tokens"] > budget:
+                if not turns:
+                    turns.append((turn["role"], _tail(turn["content"], budget)))
+                break
+            turns.append((turn["role"], turn["content"]))
+            used += turn["tokens"]
+
+        turns.reverse()
+        return {"summary": row["summary"] or None, "turns": turns}
+
+    def compact(self, session_id: str, budget: int = SESSION_CONTEXT_TOKENS) -> bool:
+        """
+        When the unsummarized turns exceed budget, folds the oldest of them into the summary
+        until SESSION_COMPACT_TO of the budget is left. Safe to run concurrently: the update
+        only applies if nobody compacted the session in the meantime.
+        """
+        row = self.conn().execute(
+            "SELECT summary, summarized_upto FROM sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return False
+
+        pending = self.conn().execute(
+            "SELECT seq, role, content, tokens FROM session_turns WHERE session_id = ? AND seq > ? ORDER BY seq",
+            (session_id, row["summarized_upto"]),
+        ).fetchall()
+        remaining = sum(turn["tokens"] for turn in pending)
+        if remaining <= budget:
+            return False
+
+        folded = []
+        for turn in pending:
+            if remaining <= budget * SESSION_COMPACT_TO:
+                break
+            folded.append(turn)
+            remaining -= turn["tokens"]
+
+        turns = [(turn["role"], turn["content"]) for turn in folded]
+        try:
+            summary = summarize_turns(row["summary"], turns)
+        except Exception as e:
+            print(f"Session summary failed, using extractive fallback: {e}")
+            summary = fallback_summary(row["summary"], turns)
+        summary = _tail(summary.strip(), SESSION_SUMMARY_TOKENS)
+
+        updated = self.conn().execute(
+            "UPDATE sessions SET summary = ?, summarized_upto = ? WHERE id = ? AND summarized_upto = ?",
+            (summary, folded[-1]["seq"], session_id, row["summarized_upto"]),
+        ).rowcount
+        return updated > 0
+
+
+session_store = SessionStore(SESSIONS_DB)
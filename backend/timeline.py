@@ -0,0 +1,129 @@
+import re
+import time
+from datetime import date
+
+try:
+    from .config import TIMELINE_DB
+    from .storage import SQLiteStore
+    from .trends import report_day, report_points, series_from_points
+    from .biomarkers import canonical_name
+except ImportError:
+    from config import TIMELINE_DB
+    from storage import SQLiteStore
+    from trends import report_day, report_points, series_from_points
+    from biomarkers import canonical_name
+
+PATIENT_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.\-]{1,64}$")
+
+
+def valid_patient_id(patient_id: str) -> bool:
+    return bool(PATIENT_ID_PATTERN.match(patient_id or ""))
+
+
+def _day(iso_date):
+    """ISO date → day ordinal (None passes through); raises ValueError on bad input."""
+    return date.fromisoformat(iso_date).toordinal() if iso_date else None
+
+
+class TimelineStore(SQLiteStore):
+    """
+    Per-patient biomarker history. Every report is stored once, keyed by its content
+    hash, together with its normalized points (canonical name/unit, see trends.py),
+    so series are read back with one indexed query instead of re-processing the reports.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS timeline_reports (
+        patient_id TEXT NOT NULL,
+        digest TEXT NOT NULL,
+        filename TEXT,
+        date TEXT,
+        added REAL NOT NULL,
+        PRIMARY KEY (patient_id, digest)
+    );
+    CREATE TABLE IF NOT EXISTS timeline_points (
+        patient_id TEXT NOT NULL,
+        digest TEXT NOT NULL,
+        metric TEXT NOT NULL,
+        unit TEXT,
+        day INTEGER NOT NULL,
+        value REAL NOT NULL,
+        low REAL,
+        high REAL,
+        source TEXT
+    );
+    CREATE INDEX IF NOT EXISTS timeline_points_metric ON timeline_points(patient_id, metric, day);
+    CREATE INDEX IF NOT EXISTS timeline_points_report ON timeline_points(patient_id, digest);
+    """
+
+    def has_report(self, patient_id: str, digest: str) -> bool:
+        row = self.conn().execute(
+            "SELECT 1 FROM timeline_reports WHERE patient_id = ? AND digest = ?", (patient_id, digest)
+        ).fetchone()
+        return row is not None
+
+    def add_report(self, patient_id: str, digest: str, result: dict) -> bool:
+        """Stores an extracted report (process_trend_path output); False if it was already there."""
+        report_date = result.get("date") if report_day(result) else None
+        with self.transaction() as conn:
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO timeline_reports (patient_id, digest, filename, date, added)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (patient_id, digest, result.get("filename"), report_date, time.time()),
+            ).rowcount
+            if not inserted:
+                return False
+            conn.executemany(
+                "INSERT INTO timeline_points (patient_id, digest, metric, unit, day, value, low, high, source)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (patient_id, digest, name, unit, day, value, low, high, source)
+                    for name, unit, (day, value, low, high, _, source) in report_points(result, digest)
+                ],
+            )
+        return True
+
+    def remove_report(self, patient_id: str, digest: str) -> bool:
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM timeline_points WHERE patient_id = ? AND digest = ?", (patient_id, digest))
+            return conn.execute(
+                "DELETE FROM timeline_reports WHERE patient_id = ? AND digest = ?", (patient_id, digest)
+            ).rowcount > 0
+
+    def reports(self, patient_id: str) -> list:
+        rows = self.conn().execute(
+            "SELECT digest, filename, date, added FROM timeline_reports WHERE patient_id = ?"
+            " ORDER BY date IS NULL, date, added",
+            (patient_id,),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def series(self, patient_id: str, metrics: list = None, start: str = None, end: str = None) -> dict:
+        """
+        Series (trends.series_from_points format; "reports" hold report digests) for the
+        patient, optionally limited to some metrics and an inclusive ISO date range.
+        Raises ValueError for malformed dates.
+        """
+        sql = "SELECT metric, unit, day, value, low, high, digest, source FROM timeline_points WHERE patient_id = ?"
+        params = [patient_id]
+        if metrics:
+            names = list(dict.fromkeys(canonical_name(m) for m in metrics))
+            sql += f" AND metric IN ({', '.join('?' * len(names))})"
+            params += names
+        if start:
+            sql += " AND day >= ?"
+            params.append(_day(start))
+        if end:
+            sql += " AND day <= ?"
+            params.append(_day(end))
+
+        points, units = {}, {}
+        for row in self.conn().execute(sql + " ORDER BY metric, day", params):
+            units.setdefault(row["metric"], row["unit"])
+            points.setdefault(row["metric"], []).append(
+                (row["day"], row["value"], row["low"], row["high"], row["digest"], row["source"])
+            )
+        return series_from_points(points, units)
+
+
+timeline_store = TimelineStore(TIMELINE_DB)
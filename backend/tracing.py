@@ -0,0 +1,276 @@
+import bisect
+import contextvars
+import re
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+
+try:
+    from .config import TRACING_ENABLED, TRACING_BUCKETS
+except ImportError:
+    from config import TRACING_ENABLED, TRACING_BUCKETS
+
+# -----------------------------------------------------------
+# Metrics (Prometheus text exposition, per worker process)
+# -----------------------------------------------------------
+_NOOP = nullcontext()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple = (), amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(f"{self.name}{_labels(self.labels, key)} {value:g}" for key, value in items)
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = TRACING_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def totals(self) -> dict:
+        """labels -> (count, sum) of every series."""
+        with self._lock:
+            return {key: (sum(series[:-1]), series[-1]) for key, series in self._series.items()}
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                labels = _labels(self.labels, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+http_seconds = Histogram(
+    "mediflow_http_request_seconds", "Request latency by route.", ("method", "route", "status")
+)
+stage_seconds = Histogram(
+    "mediflow_stage_seconds", "Time spent in graph nodes and pipeline stages.", ("stage",)
+)
+upstream_seconds = Histogram(
+    "mediflow_upstream_seconds", "Upstream call latency (slot held).", ("upstream",)
+)
+upstream_wait_seconds = Histogram(
+    "mediflow_upstream_wait_seconds", "Time spent waiting for an upstream concurrency slot.", ("upstream",)
+)
+upstream_calls = Counter(
+    "mediflow_upstream_calls_total", "Upstream calls by outcome.", ("upstream", "outcome")
+)
+upstream_bytes = Counter(
+    "mediflow_upstream_bytes_total", "Payload bytes sent to and received from upstreams.", ("upstream", "direction")
+)
+
+METRICS = (http_seconds, stage_seconds, upstream_seconds, upstream_wait_seconds, upstream_calls, upstream_bytes)
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# -----------------------------------------------------------
+# Per-request traces (Server-Timing)
+# -----------------------------------------------------------
+_current = contextvars.ContextVar("mediflow_trace", default=None)
+
+# Server-Timing metric names are HTTP tokens
+_NON_TOKEN = re.compile(r"[^A-Za-z0-9!#$%&'*+.^_`|~-]")
+
+
+class Trace:
+    """Total time and count per stage within one request. Stages may finish on any thread."""
+
+    def __init__(self):
+        self.stages = {}  # name -> [seconds, count], in first-seen order
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            entry = self.stages.get(name)
+            if entry is None:
+                self.stages[name] = [seconds, 1]
+            else:
+                entry[0] += seconds
+                entry[1] += 1
+
+    def server_timing(self, total: float = None) -> str:
+        with self._lock:
+            items = list(self.stages.items())
+        parts = []
+        for name, (seconds, count) in items:
+            part = f"{_NON_TOKEN.sub('_', name)};dur={seconds * 1000:.1f}"
+            parts.append(part + (f';desc="{count} calls"' if count > 1 else ""))
+        if total is not None:
+            parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+
+def start_trace():
+    """(trace, token): the trace collects every stage recorded in this context until reset_trace(token)."""
+    trace = Trace()
+    return trace, _current.set(trace)
+
+
+def reset_trace(token):
+    _current.reset(token)
+
+
+def bind(func):
+    """
+    func, recording into the caller's trace when it runs on another thread. Worker pools don't
+    inherit contextvars; run_blocking copies the whole context, which pools can't share.
+    """
+    trace = _current.get()
+    if trace is None:
+        return func
+
+    @wraps(func)
+    def run(*args, **kwargs):
+        token = _current.set(trace)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current.reset(token)
+
+    return run
+
+
+# -----------------------------------------------------------
+# Spans
+# -----------------------------------------------------------
+def record(name: str, seconds: float):
+    stage_seconds.observe((name,), seconds)
+    trace = _current.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+
+
+def span(name: str):
+    """Context manager timing a stage (a shared no-op when tracing is disabled)."""
+    return _Span(name) if TRACING_ENABLED else _NOOP
+
+
+def traced(name: str):
+    """Decorator timing every call of a function as a stage; returns the function untouched when disabled."""
+    def decorate(func):
+        if not TRACING_ENABLED:
+            return func
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+# -----------------------------------------------------------
+# Upstream calls
+# -----------------------------------------------------------
+class _UpstreamCall:
+    __slots__ = ("upstream", "start")
+
+    def __init__(self, upstream: str):
+        self.upstream = upstream
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        upstream_seconds.observe((self.upstream,), seconds)
+        if exc_type is None:
+            outcome = "ok"
+        elif issubclass(exc_type, GeneratorExit):
+            outcome = "cancelled"  # a stream closed early by its consumer (e.g. a lost hedge)
+        else:
+            outcome = "error"
+        upstream_calls.inc((self.upstream, outcome))
+        trace = _current.get()
+        if trace is not None:
+            trace.add(f"upstream.{self.upstream}", seconds)
+
+
+def upstream_call(upstream: str):
+    """Times one upstream call (used by concurrency.upstream_slot while the slot is held)."""
+    return _UpstreamCall(upstream) if TRACING_ENABLED else _NOOP
+
+
+def record_wait(upstream: str, seconds: float):
+    if TRACING_ENABLED:
+        upstream_wait_seconds.observe((upstream,), seconds)
+
+
+def add_bytes(upstream: str, sent: int = 0, received: int = 0):
+    """Counts payload sizes of an upstream call (prompt/image bytes out, response bytes in)."""
+    if not TRACING_ENABLED:
+        return
+    if sent:
+        upstream_bytes.inc((upstream, "sent"), sent)
+    if received:
+        upstream_bytes.inc((upstream, "received"), received)
@@ -0,0 +1,256 @@
+from datetime import date
+
+import numpy as np
+
+try:
+    from .biomarkers import canonical_name, unit_key
+except ImportError:
+    from biomarkers import canonical_name, unit_key
+
+# -----------------------------------------------------------
+# 1. Canonical Units & Conversions
+# -----------------------------------------------------------
+# Analyte → unit every series is reported in
+CANONICAL_UNITS = {
+    "HbA1c": "%", "Glucose Fasting": "mg/dL", "Glucose Postprandial": "mg/dL", "Glucose Random": "mg/dL",
+    "Total Cholesterol": "mg/dL", "HDL Cholesterol": "mg/dL", "LDL Cholesterol": "mg/dL",
+    "VLDL Cholesterol": "mg/dL", "Triglycerides": "mg/dL",
+    "Hemoglobin": "g/dL", "WBC": "10^3/µL", "RBC": "10^6/µL", "Platelets": "10^3/µL", "Hematocrit": "%",
+    "MCV": "fL", "MCH": "pg", "MCHC": "g/dL", "ESR": "mm/hr",
+    "Creatinine": "mg/dL", "Urea": "mg/dL", "BUN": "mg/dL", "Uric Acid": "mg/dL", "eGFR": "mL/min/1.73m2",
+    "Sodium": "mEq/L", "Potassium": "mEq/L", "Chloride": "mEq/L", "Calcium": "mg/dL",
+    "ALT": "U/L", "AST": "U/L", "ALP": "U/L", "Bilirubin Total": "mg/dL", "Bilirubin Direct": "mg/dL",
+    "Albumin": "g/dL", "Total Protein": "g/dL",
+    "TSH": "mIU/L", "Free T3": "pg/mL", "Free T4": "ng/dL", "T3": "ng/dL", "T4": "µg/dL",
+    "Vitamin D": "ng/mL", "Vitamin B12": "pg/mL", "Ferritin": "ng/mL", "Iron": "µg/dL",
+    "hs-CRP": "mg/L", "CRP": "mg/L", "PSA": "ng/mL",
+    "Heart Rate": "bpm", "Systolic BP": "mmHg", "Diastolic BP": "mmHg", "Weight": "kg", "BMI": "kg/m2",
+}
+
+# Groups of analytes sharing conversion factors
+_GLUCOSE = ("Glucose Fasting", "Glucose Postprandial", "Glucose Random")
+_CHOLESTEROL = ("Total Cholesterol", "HDL Cholesterol", "LDL Cholesterol", "VLDL Cholesterol")
+_ELECTROLYTES = ("Sodium", "Potassium", "Chloride")
+_BILIRUBIN = ("Bilirubin Total", "Bilirubin Direct")
+_WHITE_COUNTS = ("WBC", "Platelets")
+
+# (analytes, unit) → (scale, offset): canonical = value * scale + offset
+_CONVERSION_TABLE = [
+    (_GLUCOSE, "mmol/L", (18.016, 0.0)),
+    (_CHOLESTEROL, "mmol/L", (38.67, 0.0)),
+    (("Triglycerides",), "mmol/L", (88.57, 0.0)),
+    (("HbA1c",), "mmol/mol", (0.09148, 2.152)),  # IFCC → NGSP
+    (("Hemoglobin", "MCHC", "Albumin", "Total Protein"), "g/L", (0.1, 0.0)),
+    (("Hemoglobin",), "mmol/L", (1.611, 0.0)),
+    (("Creatinine",), "µmol/L", (1 / 88.42, 0.0)),
+    (("Urea",), "mmol/L", (6.006, 0.0)),
+    (("BUN",), "mmol/L", (2.801, 0.0)),
+    (("Uric Acid",), "µmol/L", (1 / 59.48, 0.0)),
+    (("Calcium",), "mmol/L", (4.008, 0.0)),
+    (_ELECTROLYTES, "mmol/L", (1.0, 0.0)),
+    (_BILIRUBIN, "µmol/L", (1 / 17.1, 0.0)),
+    (("TSH",), "µIU/mL", (1.0, 0.0)),
+    (("TSH",), "mIU/mL", (1000.0, 0.0)),
+    (("Free T3",), "pmol/L", (0.651, 0.0)),
+    (("Free T4",), "pmol/L", (0.0777, 0.0)),
+    (("T3",), "nmol/L", (65.1, 0.0)),
+    (("T4",), "nmol/L", (0.0777, 0.0)),
+    (("Vitamin D",), "nmol/L", (1 / 2.496, 0.0)),
+    (("Vitamin B12",), "pmol/L", (1.355, 0.0)),
+    (("Ferritin",), "µg/L", (1.0, 0.0)),
+    (("Iron",), "µmol/L", (5.585, 0.0)),
+    (("CRP", "hs-CRP"), "mg/dL", (10.0, 0.0)),
+    (("Hematocrit",), "L/L", (100.0, 0.0)),
+    (_WHITE_COUNTS, "/µL", (0.001, 0.0)),
+    (_WHITE_COUNTS, "/cumm", (0.001, 0.0)),
+    (_WHITE_COUNTS, "cells/µL", (0.001, 0.0)),
+    (_WHITE_COUNTS, "cells/cumm", (0.001, 0.0)),
+    (_WHITE_COUNTS, "10^9/L", (1.0, 0.0)),
+    (("Platelets",), "lakhs/cumm", (100.0, 0.0)),
+    (("RBC",), "million/cumm", (1.0, 0.0)),
+    (("RBC",), "mill/cumm", (1.0, 0.0)),
+    (("RBC",), "10^12/L", (1.0, 0.0)),
+    (("ALT", "AST", "ALP"), "IU/L", (1.0, 0.0)),
+]
+
+CONVERSIONS = {
+    (analyte, unit_key(unit)): factors
+    for analytes, unit, factors in _CONVERSION_TABLE
+    for analyte in analytes
+}
+
+# Adult reference ranges in the canonical unit, used when a report doesn't print its own
+DEFAULT_RANGES = {
+    "HbA1c": (None, 5.7), "Glucose Fasting": (70, 100), "Glucose Postprandial": (None, 140),
+    "Glucose Random": (70, 140), "Total Cholesterol": (None, 200), "HDL Cholesterol": (40, None),
+    "LDL Cholesterol": (None, 100), "VLDL Cholesterol": (None, 30), "Triglycerides": (None, 150),
+    "Hemoglobin": (12.0, 17.5), "WBC": (4.0, 11.0), "RBC": (4.2, 5.9), "Platelets": (150, 450),
+    "Hematocrit": (36, 50), "MCV": (80, 100), "MCH": (27, 33), "MCHC": (32, 36), "ESR": (None, 20),
+    "Creatinine": (0.6, 1.3), "Urea": (15, 45), "BUN": (7, 20), "Uric Acid": (3.5, 7.2), "eGFR": (60, None),
+    "Sodium": (135, 145), "Potassium": (3.5, 5.1), "Chloride": (98, 107), "Calcium": (8.5, 10.5),
+    "ALT": (None, 40), "AST": (None, 40), "ALP": (44, 147), "Bilirubin Total": (0.1, 1.2),
+    "Bilirubin Direct": (None, 0.3), "Albumin": (3.5, 5.0), "Total Protein": (6.0, 8.3),
+    "TSH": (0.4, 4.5), "Free T3": (2.0, 4.4), "Free T4": (0.8, 1.8), "T3": (80, 200), "T4": (5.0, 12.0),
+    "Vitamin D": (30, 100), "Vitamin B12": (200, 900), "Ferritin": (20, 250), "Iron": (60, 170),
+    "hs-CRP": (None, 3.0), "CRP": (None, 10.0), "PSA": (None, 4.0),
+    "Heart Rate": (60, 100), "Systolic BP": (90, 130), "Diastolic BP": (60, 85), "BMI": (18.5, 25.0),
+}
+
+
+def _to_number(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace(",", "").lstrip("<>= "))
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_metric(metric: dict):
+    """
+    (series_name, unit, value, low, high) in the analyte's canonical unit, or None if the value isn't numeric.
+    Units that can't be converted get their own series ("Ferritin (nmol/L)") so they never mix.
+    """
+    value = _to_number(metric.get("value"))
+    if value is None:
+        return None
+
+    name = canonical_name(str(metric.get("name", "")).strip())
+    unit = metric.get("unit") or None
+    reference = metric.get("reference_range") or {}
+    low, high = _to_number(reference.get("low")), _to_number(reference.get("high"))
+
+    canonical_unit = CANONICAL_UNITS.get(name)
+    if canonical_unit is None:
+        return (f"{name} ({unit})" if unit else name), unit, value, low, high
+
+    if unit is None or unit_key(unit) == unit_key(canonical_unit):
+        scale, offset = 1.0, 0.0
+    elif (name, unit_key(unit)) in CONVERSIONS:
+        scale, offset = CONVERSIONS[(name, unit_key(unit))]
+    else:
+        return f"{name} ({unit})", unit, value, low, high
+
+    convert = lambda x: None if x is None else round(x * scale + offset, 4)
+    return name, canonical_unit, convert(value), convert(low), convert(high)
+
+
+# -----------------------------------------------------------
+# 2. Series
+# -----------------------------------------------------------
+def _statistics(days: np.ndarray, values: np.ndarray) -> dict:
+    delta = float(values[-1] - values[0])
+    stats = {
+        "first": float(values[0]),
+        "latest": float(values[-1]),
+        "min": float(values.min()),
+        "max": float(values.max()),
+        "delta": round(delta, 4),
+        "delta_pct": round(100 * delta / values[0], 2) if values[0] else None,
+        "slope_per_year": None,
+    }
+    if np.ptp(days) > 0:
+        slope_per_day = np.polyfit(days, values, 1)[0]
+        stats["slope_per_year"] = round(float(slope_per_day) * 365.25, 4)
+    return stats
+
+
+def _flags(values: np.ndarray, lows: np.ndarray, highs: np.ndarray) -> np.ndarray:
+    """-1 below range, 1 above range, 0 inside or no range known."""
+    with np.errstate(invalid="ignore"):
+        return np.where(values < lows, -1, np.where(values > highs, 1, 0))
+
+
+def _bounds(rows: list, position: int, default) -> np.ndarray:
+    """Per-point range bound: the report's own, else the default, else NaN (never flagged)."""
+    return np.array(
+        [row[position] if row[position] is not None else (np.nan if default is None else default) for row in rows],
+        dtype=np.float64,
+    )
+
+
+def report_day(result: dict):
+    """Date of an extracted report as a day ordinal, or None if it has no valid date."""
+    report_date = result.get("date")
+    try:
+        return date.fromisoformat(str(report_date)[:10]).toordinal() if report_date else None
+    except ValueError:
+        return None
+
+
+def report_points(result: dict, report):
+    """
+    Yields (series_name, unit, (day, value, low, high, report, source)) for every numeric
+    metric of one dated report; report is whatever key the caller uses to refer to it.
+    """
+    day = report_day(result)
+    if day is None:
+        return
+    for metric in result.get("metrics") or []:
+        normalized = normalize_metric(metric) if isinstance(metric, dict) else None
+        if normalized is None:
+            continue
+        name, unit, value, low, high = normalized
+        yield name, unit, (day, value, low, high, report, metric.get("source"))
+
+
+def series_from_points(points: dict, units: dict) -> dict:
+    """
+    {name: {unit, dates[], values[], flags[], reports[], sources[], reference_range,
+            first, latest, min, max, delta, delta_pct, slope_per_year}}
+    from points {name: [(day, value, low, high, report, source)]} and units {name: unit}.
+    """
+    series = {}
+    for name, rows in points.items():
+        # The same report uploaded twice gives identical (date, value) points; keep one
+        unique = {}
+        for row in rows:
+            unique.setdefault((row[0], row[1]), row)
+        rows = sorted(unique.values(), key=lambda row: row[0])  # stable: same-day points keep report order
+        days = np.fromiter((row[0] for row in rows), dtype=np.float64, count=len(rows))
+        values = np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows))
+
+        default_low, default_high = DEFAULT_RANGES.get(name, (None, None))
+        lows = _bounds(rows, 2, default_low)
+        highs = _bounds(rows, 3, default_high)
+
+        latest_low, latest_high = lows[-1], highs[-1]
+        series[name] = {
+            "unit": units[name],
+            "dates": [date.fromordinal(int(day)).isoformat() for day in days],
+            "values": values.tolist(),
+            "flags": _flags(values, lows, highs).tolist(),
+            "reports": [row[4] for row in rows],
+            "sources": [row[5] for row in rows],
+            "reference_range": {
+                "low": None if np.isnan(latest_low) else float(latest_low),
+                "high": None if np.isnan(latest_high) else float(latest_high),
+            },
+            **_statistics(days, values),
+        }
+    return dict(sorted(series.items()))
+
+
+def build_series(results: list) -> dict:
+    """
+    Columnar trend series from process_trends() results.
+      series: see series_from_points; each series' "reports" are indices into reports
+      reports: [{filename, date} | {filename, error}] in upload order
+    Points are sorted by date; a report without a date is listed but contributes no points.
+    """
+    reports = []
+    points = {}
+    units = {}
+
+    for index, result in enumerate(results):
+        result = result or {}
+        if result.get("error"):
+            reports.append({"filename": result.get("filename"), "error": result["error"]})
+            continue
+        reports.append({"filename": result.get("filename"), "date": result.get("date") if report_day(result) else None})
+
+        for name, unit, row in report_points(result, index):
+            units.setdefault(name, unit)
+            points.setdefault(name, []).append(row)
+
+    return {"series": series_from_points(points, units), "reports": reports}
@@ -0,0 +1,127 @@
+import hashlib
+import os
+import tempfile
+from typing import NamedTuple, Optional
+
+from fastapi import HTTPException, UploadFile
+
+try:
+    from .config import MAX_UPLOAD_BYTES, MAX_REQUEST_BYTES, UPLOAD_CHUNK_BYTES, UPLOAD_TMP_DIR
+    from .concurrency import run_blocking
+except ImportError:
+    from config import MAX_UPLOAD_BYTES, MAX_REQUEST_BYTES, UPLOAD_CHUNK_BYTES, UPLOAD_TMP_DIR
+    from concurrency import run_blocking
+
+HEAD_BYTES = 512  # enough for every signature check in medical_pipeline
+
+
+class SpooledUpload(NamedTuple):
+    filename: str
+    path: str
+    size: int
+    sha256: str
+    head: bytes
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class RequestBudget:
+    """Running byte count across all files of one request."""
+
+    def __init__(self, max_bytes: int = MAX_REQUEST_BYTES):
+        self.max_bytes = max_bytes
+        self.used = 0
+
+    def consume(self, n: int):
+        self.used += n
+        if self.used > self.max_bytes:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Upload too large: request exceeds {self.max_bytes // (1024 * 1024)} MB.",
+            )
+
+
+def too_large(filename: str, limit: int) -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"File '{filename}' is too large (limit {limit // (1024 * 1024)} MB).",
+    )
+
+
+def _append(tmp, digest, chunk: bytes):
+    digest.update(chunk)
+    tmp.write(chunk)
+
+
+async def spool_upload(
+    upload: UploadFile,
+    budget: Optional[RequestBudget] = None,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+) -> SpooledUpload:
+    """
+    Copies an upload to its own temp file in UPLOAD_CHUNK_BYTES chunks, hashing as it goes,
+    so only one chunk is in memory at a time. Hashing and disk writes run on the blocking
+    executor, off the event loop. Raises HTTPException(413) as soon as the file
+    or the request budget goes over its limit. The caller must remove() the result.
+    """
+    filename = upload.filename or "upload"
+
+    # Reject before copying anything when the size is already known
+    if upload.size is not None and upload.size > max_bytes:
+        raise too_large(filename, max_bytes)
+
+    suffix = os.path.splitext(filename)[1][:10]
+    digest = hashlib.sha256()
+    head = b""
+    size = 0
+
+    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=UPLOAD_TMP_DIR)
+    try:
+        with tmp:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+
+                size += len(chunk)
+                if size > max_bytes:
+                    raise too_large(filename, max_bytes)
+                if budget is not None:
+                    budget.consume(len(chunk))
+
+                if len(head) < HEAD_BYTES:
+                    head += chunk[:HEAD_BYTES - len(head)]
+                await run_blocking(_append, tmp, digest, chunk)
+    except BaseException:
+        os.remove(tmp.name)
+        raise
+    finally:
+        await upload.close()
+
+    return SpooledUpload(filename, tmp.name, size, digest.hexdigest(), head)
+
+
+async def spool_uploads(
+    uploads: list,
+    max_request_bytes: int = MAX_REQUEST_BYTES,
+    max_file_bytes: int = MAX_UPLOAD_BYTES,
+) -> list:
+    """Spools every file of a request under one request budget; cleans up on failure."""
+    budget = RequestBudget(max_request_bytes)
+    spooled = []
+    try:
+        for upload in uploads:
+            spooled.append(await spool_upload(upload, budget, max_file_bytes))
+    except BaseException:
+        remove_all(spooled)
+        raise
+    return spooled
+
+
+def remove_all(spooled: list):
+    for upload in spooled:
+        upload.remove()
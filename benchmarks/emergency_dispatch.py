@@ -0,0 +1,113 @@
+"""
+Emergency path under load: crisis messages from many sessions, against a slow and flaky fake Twilio.
+
+    python -m benchmarks.emergency_dispatch                            # 20 sessions x 5 messages
+    python -m benchmarks.emergency_dispatch --sessions 50 --fail-rate 0.5 --twilio const:1500
+
+The sessions run concurrently, each sending --messages crisis messages one after another through
+POST /ask (httpx ASGI transport, no sockets). Prints the /ask latency (the safety message no
+longer waits for Twilio), then waits for the dispatcher to drain the outbox and checks that each
+session got exactly one call, placed despite the injected failures (retried with backoff); exits
+with status 1 if not. tests/test_emergency.py covers the same rules without the app.
+No network access or API keys are needed.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+MESSAGES = ("I want to end my life", "I think I took an overdose", "I want to kill myself")
+
+
+async def run(args) -> list:
+    import httpx
+
+    from backend.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            sessions = [(await client.post("/sessions")).json()["session_id"] for _ in range(args.sessions)]
+
+            # First request pays lazy imports (graph, intent scanner); keep it out of the numbers
+            await client.post("/ask", json={"message": "What are the symptoms of asthma?"})
+            latencies = []
+
+            async def converse(session_id):
+                for i in range(args.messages):
+                    start = time.perf_counter()
+                    response = await client.post(
+                        "/ask", json={"message": MESSAGES[i % len(MESSAGES)], "session_id": session_id}
+                    )
+                    response.raise_for_status()
+                    latencies.append(time.perf_counter() - start)
+
+            await asyncio.gather(*(converse(s) for s in sessions))
+            cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+            print(f"/ask (emergency)  p50 {cuts[49] * 1000:7.1f} ms  p99 {cuts[98] * 1000:7.1f} ms  "
+                  f"max {max(latencies) * 1000:7.1f} ms  over {len(latencies)} requests")
+
+            # The calls themselves are placed in the background
+            start = time.perf_counter()
+            while True:
+                stats = (await client.get("/stats")).json()["emergency"]
+                pending = stats["calls"].get("pending", 0) + stats["calls"].get("sending", 0)
+                if not pending or time.perf_counter() - start > args.timeout:
+                    break
+                await asyncio.sleep(0.1)
+            print(f"outbox drained in {time.perf_counter() - start:.1f} s: {stats}")
+            return sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=5, help="crisis messages per session")
+    parser.add_argument("--twilio", default="const:800", help="Twilio call latency")
+    parser.add_argument("--fail-rate", type=float, default=0.3, help="share of Twilio calls that fail")
+    parser.add_argument("--dispatchers", type=int, default=2)
+    parser.add_argument("--retry-base", type=float, default=0.2, help="first retry delay (s), doubles per attempt")
+    parser.add_argument("--timeout", type=float, default=60.0, help="give up waiting for the outbox (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Configuration is read at import time: set it before anything imports backend.config
+    os.environ.update({
+        "MEDIFLOW_DATA_DIR": tempfile.mkdtemp(prefix="mediflow-emergency-"),
+        "PRELOAD_BACKENDS": "",
+        "JOB_WORKERS": "0",
+        "EMERGENCY_DISPATCHERS": str(args.dispatchers),
+        "EMERGENCY_RETRY_BASE_SECONDS": str(args.retry_base),
+        "EMERGENCY_RETRY_MAX_SECONDS": str(args.retry_base * 8),
+        "EMERGENCY_MAX_ATTEMPTS": "8",
+        "TWILIO_MAX_CONCURRENCY": str(args.dispatchers),
+    })
+
+    from benchmarks.fakes import FakeTwilio, Latency
+    from backend import providers
+
+    twilio = FakeTwilio(Latency.parse(args.twilio), args.seed, fail_rate=args.fail_rate)
+    providers.set_instance("twilio", twilio.client())
+
+    sessions = asyncio.run(run(args))
+
+    from backend.emergency import emergency_outbox
+
+    rows = emergency_outbox.conn().execute(
+        "SELECT caller, status, attempts FROM emergency_calls ORDER BY created"
+    ).fetchall()
+    callers = {row["caller"] for row in rows}
+    retried = sum(1 for row in rows if row["attempts"] > 1)
+    print(f"Twilio attempts {twilio.calls}, calls placed {twilio.placed}, calls retried {retried}, "
+          f"failed {sum(1 for row in rows if row['status'] == 'failed')}")
+    ok = len(rows) == len(callers) == len(sessions) and all(row["status"] == "sent" for row in rows)
+    print("one call per session: " + ("yes" if ok else "NO"))
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
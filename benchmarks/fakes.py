@@ -0,0 +1,223 @@
+"""
+Local stand-ins for every upstream the backend calls, with configurable latency.
+
+install() registers them through backend.providers.set_instance (Gemini, Groq, Maps, the imaging
+agent, Twilio), so nothing leaves the machine. Chat (query_medgemma) and
+report summaries keep going through the real llm_router, just against these clients.
+
+Latency specs: "const:MS", "uniform:LOW_MS:HIGH_MS" or "lognormal:MEDIAN_MS[:SIGMA]".
+"""
+import json
+import random
+import threading
+import time
+import types
+from dataclasses import dataclass
+
+LAB_TRANSCRIPTION = """CITY DIAGNOSTICS LABORATORY
+Report Date: 12/03/2024
+Fasting Blood Sugar 104 mg/dL 70 - 100
+HbA1c 6.1 % 4.0 - 5.6
+LDL Cholesterol 142 mg/dL < 100
+Haemoglobin 13.2 g/dL 13.0 - 17.0"""
+
+BIOMARKER_JSON = json.dumps({
+    "date": "2024-03-12",
+    "metrics": [{"name": "Vitamin D", "value": 18.0, "unit": "ng/mL"}],
+})
+
+CHAT_ANSWER = (
+    "Common causes include infections, dehydration and medication side effects. "
+    "Rest, fluids and monitoring usually help; see a doctor if symptoms persist beyond a few days "
+    "or you notice warning signs such as chest pain, confusion or difficulty breathing."
+)
+
+SUMMARY_ANSWER = (
+    "Report type: laboratory panel. Main findings: HbA1c 6.1% and fasting glucose 104 mg/dL are in the "
+    "prediabetic range; LDL 142 mg/dL is above target. Patient-friendly summary: blood sugar and "
+    "cholesterol are slightly high; diet, exercise and a follow-up with your doctor are advised."
+)
+
+IMAGING_REPORT = "📋 Analysis Report\n\nImage type: MRI brain, T2 axial. No acute abnormality detected."
+
+
+@dataclass
+class Latency:
+    kind: str
+    a: float
+    b: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: str) -> "Latency":
+        kind, *values = spec.split(":")
+        values = [float(v) for v in values]
+        if kind == "const" and len(values) == 1:
+            return cls(kind, values[0])
+        if kind == "uniform" and len(values) == 2:
+            return cls(kind, *values)
+        if kind == "lognormal" and len(values) in (1, 2):
+            return cls(kind, values[0], values[1] if len(values) == 2 else 0.35)
+        raise ValueError(f"Bad latency spec {spec!r} (const:MS | uniform:LOW:HIGH | lognormal:MEDIAN[:SIGMA])")
+
+    def sample(self, rng: random.Random) -> float:
+        """Seconds."""
+        if self.kind == "const":
+            ms = self.a
+        elif self.kind == "uniform":
+            ms = rng.uniform(self.a, self.b)
+        else:
+            ms = self.a * rng.lognormvariate(0, self.b)
+        return ms / 1000
+
+
+class FakeUpstream:
+    def __init__(self, latency: Latency, seed: int):
+        self.latency = latency
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        """Latency of one more call, in seconds."""
+        with self._lock:
+            self.calls += 1
+            return self.latency.sample(self._rng)
+
+    def wait(self):
+        time.sleep(self.sample())
+
+    def stream_text(self, text: str, wrap):
+        """Half the latency before the first chunk, the rest spread over the chunks."""
+        delay = self.sample()
+        time.sleep(delay / 2)
+        parts = _words(text)
+        for part in parts:
+            time.sleep(delay / 2 / len(parts))
+            yield wrap(part)
+
+
+class _Text:
+    def __init__(self, text):
+        self.text = text
+        self.content = text
+
+
+def _words(text: str, parts: int = 8) -> list:
+    words = text.split(" ")
+    step = max(1, len(words) // parts)
+    return [" ".join(words[i:i + step]) + " " for i in range(0, len(words), step)]
+
+
+class FakeGeminiModel(FakeUpstream):
+    """genai.GenerativeModel: transcription, biomarker JSON, report summaries or chat answers by prompt."""
+
+    def __init__(self, latency, seed, prompts):
+        super().__init__(latency, seed)
+        self.prompts = prompts
+
+    def _answer(self, contents) -> str:
+        first = contents[0] if isinstance(contents, list) else contents
+        if first == self.prompts["transcribe"]:
+            return LAB_TRANSCRIPTION
+        if first == self.prompts["biomarkers"]:
+            return BIOMARKER_JSON
+        if isinstance(first, str) and first.startswith(self.prompts["summary"]):
+            return SUMMARY_ANSWER
+        return CHAT_ANSWER
+
+    def generate_content(self, contents, stream=False, request_options=None, **kwargs):
+        answer = self._answer(contents)
+        if not stream:
+            self.wait()
+            return _Text(answer)
+
+        return self.stream_text(answer, _Text)
+
+
+class FakeGenAI:
+    """The configured google.generativeai module (providers registry key "gemini")."""
+
+    def __init__(self, latency, seed, prompts):
+        self._model = FakeGeminiModel(latency, seed, prompts)
+
+    def GenerativeModel(self, model_name):  # noqa: N802 - mirrors the SDK
+        return self._model
+
+    @property
+    def calls(self):
+        return self._model.calls
+
+
+class FakeChatGroq(FakeUpstream):
+    def invoke(self, prompt):
+        self.wait()
+        return _Text(SUMMARY_ANSWER)
+
+    def stream(self, prompt):
+        return self.stream_text(CHAT_ANSWER, _Text)
+
+
+class FakeMapsClient(FakeUpstream):
+    def geocode(self, location):
+        self.wait()
+        return [{"geometry": {"location": {"lat": 18.52, "lng": 73.86}}}]
+
+    def places_nearby(self, location=None, radius=None, keyword=None, type=None):
+        self.wait()
+        return {"results": [
+            {"name": f"Clinic {i}", "vicinity": f"{i} Main Road", "rating": 4.0 + i / 10} for i in range(6)
+        ]}
+
+
+class FakeMedicalAgent(FakeUpstream):
+    def run(self, prompt, images=None):
+        self.wait()
+        return _Text(IMAGING_REPORT)
+
+
+class FakeTwilio(FakeUpstream):
+    """Twilio REST client stand-in; fail_rate makes that share of calls raise (emergency retries)."""
+
+    def __init__(self, latency, seed, fail_rate: float = 0.0):
+        super().__init__(latency, seed)
+        self.fail_rate = fail_rate
+        self.placed = 0
+
+    def client(self):
+        fake = self
+
+        class Calls:
+            def create(self, **kwargs):
+                fake.wait()
+                with fake._lock:
+                    if fake._rng.random() < fake.fail_rate:
+                        raise ConnectionError("fake Twilio: 503 Service Unavailable")
+                    fake.placed += 1
+                    return types.SimpleNamespace(sid=f"CA{fake.placed:032d}")
+
+        return types.SimpleNamespace(calls=Calls())
+
+
+def install(latencies: dict, seed: int = 0) -> dict:
+    """
+    Registers the fakes; latencies maps gemini/groq/maps/agent/twilio to Latency.
+    Returns the fakes by name (their .calls count upstream calls).
+    """
+    from backend import providers
+    from backend.config import GROQ_MODEL
+    from backend.medical_pipeline import BIOMARKER_SYSTEM_PROMPT, SUMMARY_SYSTEM_PROMPT, TRANSCRIBE_PROMPT
+
+    prompts = {"transcribe": TRANSCRIBE_PROMPT, "biomarkers": BIOMARKER_SYSTEM_PROMPT, "summary": SUMMARY_SYSTEM_PROMPT}
+    fakes = {
+        "gemini": FakeGenAI(latencies["gemini"], seed, prompts),
+        "groq": FakeChatGroq(latencies["groq"], seed + 1),
+        "maps": FakeMapsClient(latencies["maps"], seed + 2),
+        "agent": FakeMedicalAgent(latencies["agent"], seed + 3),
+        "twilio": FakeTwilio(latencies["twilio"], seed + 4),
+    }
+    providers.set_instance("gemini", fakes["gemini"])
+    providers.set_instance(f"groq:{GROQ_MODEL}", fakes["groq"])
+    providers.set_instance("gmaps", fakes["maps"])
+    providers.set_instance("medical_agent", fakes["agent"])
+    providers.set_instance("twilio", fakes["twilio"].client())
+    return fakes
@@ -0,0 +1,194 @@
+"""
+Deterministic sample uploads for the load test (backend stages run on them for real).
+
+    python -m benchmarks.fixtures out/        # writes the set to out/ for manual testing
+
+text_report.pdf   - lab report with a text layer (PDF text extraction + local biomarker parser)
+scanned_report.pdf- the same report as an image-only PDF (rasterize + PaddleOCR)
+photo_report.jpg  - phone photo of a printed report (image preprocessing, then Gemini transcription)
+mri_slice.dcm     - 16-bit MR slice (DICOM decode + windowing, then the imaging agent)
+mri_series.zip    - 24-slice MR series (/analyze_series)
+"""
+import io
+import os
+import random
+import sys
+import zipfile
+
+import numpy as np
+
+from backend.providers import get_cv2
+from benchmarks.image_preprocessing import synthetic_photo, synthetic_scan
+
+REPORT_LINES = [
+    "CITY DIAGNOSTICS LABORATORY",
+    "Patient: J. Doe    Age: 52    Sex: M",
+    "Report Date: 12/03/2024",
+    "",
+    "BIOCHEMISTRY",
+    "Fasting Blood Sugar   104   mg/dL   70 - 100",
+    "HbA1c                 6.1   %       4.0 - 5.6",
+    "Serum Creatinine      0.9   mg/dL   0.7 - 1.3",
+    "",
+    "LIPID PROFILE",
+    "Total Cholesterol     212   mg/dL   < 200",
+    "LDL Cholesterol       142   mg/dL   < 100",
+    "HDL Cholesterol       41    mg/dL   > 40",
+    "Triglycerides         180   mg/dL   < 150",
+    "",
+    "HAEMATOLOGY",
+    "Haemoglobin           13.2  g/dL    13.0 - 17.0",
+    "Platelet Count        250   10^3/uL 150 - 450",
+    "",
+    "Impression: borderline glycaemic control, dyslipidaemia.",
+]
+
+PAGE_SIZE = (612, 792)  # US letter, points
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def text_pdf(pages: list) -> bytes:
+    """Minimal PDF with a real text layer (Helvetica), one list of lines per page."""
+    count = len(pages)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        ("<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            " ".join(f"{4 + 2 * i} 0 R" for i in range(count)), count)).encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, lines in enumerate(pages):
+        ops = ["BT", "/F1 11 Tf", "14 TL", f"56 {PAGE_SIZE[1] - 64} Td"]
+        ops += [f"({_pdf_escape(line)}) Tj T*" for line in lines]
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        objects.append((
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_SIZE[0]} {PAGE_SIZE[1]}] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        ).encode())
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def scanned_pdf(pages: list, dpi: int = 150) -> bytes:
+    """Image-only PDF (no text layer): every page rendered to a grayscale bitmap, as a scanner would."""
+    from PIL import Image
+
+    cv2 = get_cv2()
+    width, height = round(PAGE_SIZE[0] / 72 * dpi), round(PAGE_SIZE[1] / 72 * dpi)
+    images = []
+    for lines in pages:
+        page = np.full((height, width), 250, np.uint8)
+        y = round(0.9 * dpi)
+        for line in lines:
+            cv2.putText(page, line, (round(0.75 * dpi), y), cv2.FONT_HERSHEY_SIMPLEX, dpi / 220, 20, 2, cv2.LINE_AA)
+            y += round(dpi / 4.5)
+        images.append(Image.fromarray(page))
+
+    out = io.BytesIO()
+    images[0].save(out, format="PDF", resolution=dpi, save_all=True, append_images=images[1:])
+    return out.getvalue()
+
+
+def dicom_slice(pixels: np.ndarray, series_uid: str, instance: int = 1, position: float = 0.0) -> bytes:
+    """An MR image as a 12-bit-in-16 DICOM file with a VOI window."""
+    from pydicom.dataset import Dataset, FileMetaDataset
+    from pydicom.uid import ExplicitVRLittleEndian, MRImageStorage, generate_uid
+
+    meta = FileMetaDataset()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    meta.MediaStorageSOPClassUID = MRImageStorage
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+
+    ds = Dataset()
+    ds.file_meta = meta
+    ds.SOPClassUID = meta.MediaStorageSOPClassUID
+    ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    ds.Modality = "MR"
+    ds.SeriesDescription = "T2 AX BRAIN"
+    ds.SeriesInstanceUID = series_uid
+    ds.InstanceNumber = instance
+    ds.ImagePositionPatient = [0.0, 0.0, position]
+    ds.ImageOrientationPatient = [1.0, 0.0, 0.0, 0.0, 1.0, 0.0]
+    ds.Rows, ds.Columns = pixels.shape
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.BitsAllocated, ds.BitsStored, ds.HighBit, ds.PixelRepresentation = 16, 12, 11, 0
+    ds.WindowCenter, ds.WindowWidth = 1400, 2400
+    ds.PixelData = pixels.astype(np.uint16).tobytes()
+
+    out = io.BytesIO()
+    ds.save_as(out, enforce_file_format=True)
+    return out.getvalue()
+
+
+def _mr_pixels(rng: random.Random, side: int = 512) -> np.ndarray:
+    cv2 = get_cv2()
+    scan = cv2.imdecode(np.frombuffer(synthetic_scan(rng), np.uint8), cv2.IMREAD_GRAYSCALE)
+    return cv2.resize(scan, (side, side), interpolation=cv2.INTER_AREA).astype(np.uint16) * 16
+
+
+def dicom_series_zip(rng: random.Random, slices: int = 24) -> bytes:
+    from pydicom.uid import generate_uid
+
+    series_uid = generate_uid()
+    base = _mr_pixels(rng)
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as archive:
+        for i in range(slices):
+            pixels = np.roll(base, i * 4, axis=0)
+            archive.writestr(f"series/IM{i:04d}.dcm", dicom_slice(pixels, series_uid, i + 1, float(i * 5)))
+    return out.getvalue()
+
+
+def build_fixtures(seed: int = 0) -> dict:
+    """{filename: bytes} of every fixture."""
+    from pydicom.uid import generate_uid
+
+    rng = random.Random(seed)
+    pages = [REPORT_LINES, REPORT_LINES[4:] + ["", "Page 2 of 2"]]
+    return {
+        "text_report.pdf": text_pdf(pages),
+        "scanned_report.pdf": scanned_pdf(pages),
+        "photo_report.jpg": synthetic_photo(rng),
+        "mri_slice.dcm": dicom_slice(_mr_pixels(rng), generate_uid()),
+        "mri_series.zip": dicom_series_zip(rng),
+    }
+
+
+def load_fixtures(directory: str) -> dict:
+    fixtures = {}
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                fixtures[name] = f.read()
+    return fixtures
+
+
+def main():
+    if len(sys.argv) != 2:
+        sys.exit(__doc__)
+    os.makedirs(sys.argv[1], exist_ok=True)
+    for name, data in build_fixtures().items():
+        with open(os.path.join(sys.argv[1], name), "wb") as f:
+            f.write(data)
+        print(f"{name:<20} {len(data) / 1e3:8.1f} kB")
+
+
+if __name__ == "__main__":
+    main()
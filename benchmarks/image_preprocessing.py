@@ -0,0 +1,146 @@
+"""
+Measures what image preprocessing (backend/imaging.py) saves per Gemini request.
+
+    python -m benchmarks.image_preprocessing                       # synthetic 12 MP phone photos
+    python -m benchmarks.image_preprocessing --images ~/scans      # your own sample set
+    python -m benchmarks.image_preprocessing --live                # also time real Gemini transcriptions
+
+For each image: bytes sent before (raw file) and after preprocessing, preprocessing time and the
+estimated end-to-end cost of the upload at --uplink-mbps. With --live (needs GEMINI_API_KEY) both
+variants are transcribed by Gemini and the measured request latencies are reported too.
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+import numpy as np
+
+from backend.imaging import prepare_document_image, prepare_scan_image
+from backend.providers import get_cv2
+
+PHOTO_SIZE = (4032, 3024)  # 12 MP, the usual phone camera
+
+
+def synthetic_photo(rng: random.Random) -> bytes:
+    """A phone photo of a printed lab report on a desk: uneven light, sensor noise, JPEG q95."""
+    cv2 = get_cv2()
+    width, height = PHOTO_SIZE
+    nprng = np.random.default_rng(rng.randrange(2 ** 32))
+
+    desk = np.full((height, width, 3), (60, 90, 120), np.uint8)
+    desk = cv2.add(desk, nprng.integers(0, 40, (height, width, 3), dtype=np.uint8))
+
+    x0, y0 = rng.randint(200, 600), rng.randint(150, 400)
+    x1, y1 = width - rng.randint(200, 600), height - rng.randint(150, 400)
+    cv2.rectangle(desk, (x0, y0), (x1, y1), (235, 238, 240), -1)
+
+    line_y = y0 + 160
+    while line_y < y1 - 120:
+        text = rng.choice([
+            "Haemoglobin 13.2 g/dL 13.0 - 17.0", "Fasting Blood Sugar 104 mg/dL 70 - 100",
+            "HbA1c 6.1 % 4.0 - 5.6", "LDL Cholesterol 142 mg/dL < 100", "TSH 2.4 uIU/mL 0.4 - 4.0",
+            "Serum Creatinine 0.9 mg/dL 0.7 - 1.3", "Patient: J. Doe   Age: 52   Sex: M",
+        ])
+        cv2.putText(desk, text, (x0 + 120, line_y), cv2.FONT_HERSHEY_SIMPLEX, 2.2, (30, 30, 30), 4, cv2.LINE_AA)
+        line_y += rng.randint(90, 130)
+
+    # Light falling off towards one corner, plus sensor noise
+    gradient = np.linspace(1.0, 0.65, width, dtype=np.float32)[None, :, None]
+    photo = desk.astype(np.float32) * gradient + nprng.normal(0, 6, (height, width, 3))
+    ok, buffer = cv2.imencode(".jpg", np.clip(photo, 0, 255).astype(np.uint8), [cv2.IMWRITE_JPEG_QUALITY, 95])
+    return buffer.tobytes()
+
+
+def synthetic_scan(rng: random.Random) -> bytes:
+    """A 2048x2048 grayscale PNG with MRI-like structure (for the imaging-agent path)."""
+    cv2 = get_cv2()
+    size = 2048
+    nprng = np.random.default_rng(rng.randrange(2 ** 32))
+    img = np.zeros((size, size), np.uint8)
+    cv2.ellipse(img, (size // 2, size // 2), (800, 900), 0, 0, 360, 150, -1)
+    cv2.ellipse(img, (size // 2, size // 2), (600, 700), 0, 0, 360, 90, -1)
+    for _ in range(40):
+        center = (rng.randint(500, 1500), rng.randint(500, 1500))
+        cv2.circle(img, center, rng.randint(10, 80), rng.randint(60, 220), -1)
+    img = cv2.GaussianBlur(img, (0, 0), 6)
+    img = cv2.add(img, nprng.integers(0, 12, img.shape, dtype=np.uint8))
+    ok, buffer = cv2.imencode(".png", img)
+    return buffer.tobytes()
+
+
+def load_images(directory: str) -> list:
+    exts = (".jpg", ".jpeg", ".png", ".webp")
+    names = sorted(n for n in os.listdir(directory) if n.lower().endswith(exts))
+    samples = []
+    for name in names:
+        with open(os.path.join(directory, name), "rb") as f:
+            samples.append((name, f.read()))
+    return samples
+
+
+def transcribe(data: bytes, mime_type: str) -> float:
+    from backend.medical_pipeline import TRANSCRIBE_PROMPT
+    from backend.providers import get_gemini_model, gemini_request_options
+
+    start = time.perf_counter()
+    get_gemini_model().generate_content(
+        [TRANSCRIBE_PROMPT, {"mime_type": mime_type, "data": data}], request_options=gemini_request_options()
+    )
+    return time.perf_counter() - start
+
+
+def mime_of(data: bytes) -> str:
+    return "image/png" if data.startswith(b"\x89PNG") else "image/jpeg"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", help="directory of sample images (default: synthetic set)")
+    parser.add_argument("--count", type=int, default=6, help="synthetic photos to generate")
+    parser.add_argument("--uplink-mbps", type=float, default=10.0)
+    parser.add_argument("--live", action="store_true", help="also time real Gemini transcriptions")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    if args.images:
+        samples = [(name, data, prepare_document_image) for name, data in load_images(args.images)]
+    else:
+        samples = [(f"photo-{i}.jpg", synthetic_photo(rng), prepare_document_image) for i in range(args.count)]
+        samples.append(("scan.png", synthetic_scan(rng), lambda data: prepare_scan_image(data)))
+
+    def upload_seconds(size):
+        return size * 8 / (args.uplink_mbps * 1e6)
+
+    print(f"{'image':<14} {'before':>10} {'after':>10} {'ratio':>7} {'prep ms':>8} "
+          f"{'upload before':>14} {'e2e after':>10}   size after")
+    before_total = after_total = 0
+    gains = []
+    for name, data, prepare in samples:
+        start = time.perf_counter()
+        prepared = prepare(data)
+        prep = time.perf_counter() - start
+
+        before, after = len(data), len(prepared.data)
+        before_total += before
+        after_total += after
+        e2e_before, e2e_after = upload_seconds(before), prep + upload_seconds(after)
+        gains.append(e2e_before - e2e_after)
+        print(f"{name:<14} {before / 1e3:>8.0f}kB {after / 1e3:>8.0f}kB {before / after:>6.1f}x "
+              f"{prep * 1e3:>8.1f} {e2e_before * 1e3:>11.0f} ms {e2e_after * 1e3:>7.0f} ms   "
+              f"{prepared.width}x{prepared.height} {prepared.mime_type}")
+
+        if args.live:
+            raw = statistics.median(transcribe(data, mime_of(data)) for _ in range(2))
+            done = statistics.median(prep + transcribe(prepared.data, prepared.mime_type) for _ in range(2))
+            print(f"{'':<14} live Gemini transcription: raw {raw * 1e3:.0f} ms, preprocessed {done * 1e3:.0f} ms")
+
+    print(f"\ntotal bytes: {before_total / 1e6:.1f} MB -> {after_total / 1e6:.2f} MB "
+          f"({before_total / after_total:.1f}x less); mean upload time saved at {args.uplink_mbps:g} Mbps: "
+          f"{statistics.mean(gains) * 1e3:.0f} ms per request")
+
+
+if __name__ == "__main__":
+    main()
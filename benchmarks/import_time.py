@@ -0,0 +1,79 @@
+"""
+Measures cold-start cost of the backend.
+
+    python -m benchmarks.import_time            # import time of backend.main
+    python -m benchmarks.import_time --warm all # plus per-backend warm-up time
+
+Each measurement runs in a fresh interpreter so module caches don't hide the cost.
+Run it on the commit before and after a change to compare.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+IMPORT_SNIPPET = "import backend.main"
+
+WARM_SNIPPET = """
+import json
+from backend.providers import warm_up
+print(json.dumps(warm_up({names!r})))
+"""
+
+
+def slowest_imports(stderr: str, top: int) -> list:
+    """Parses `-X importtime` output into (cumulative_us, module) pairs, slowest first."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time:  <self us> | <cumulative us> | <module>"
+        _, cumulative_us, module = line[len("import time:"):].split("|", 2)
+        rows.append((int(cumulative_us), module.strip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def measure_import(top: int):
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_SNIPPET],
+        capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+
+    if proc.returncode != 0:
+        print(proc.stderr.strip().splitlines()[-1])
+        sys.exit(proc.returncode)
+
+    print(f"import backend.main: {wall:.2f}s wall (incl. interpreter start)")
+    for cumulative_us, module in slowest_imports(proc.stderr, top):
+        print(f"  {cumulative_us / 1e6:8.3f}s  {module}")
+
+
+def measure_warm(names: list):
+    proc = subprocess.run(
+        [sys.executable, "-c", WARM_SNIPPET.format(names=names)],
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        print(proc.stderr.strip())
+        sys.exit(proc.returncode)
+
+    timings = json.loads(proc.stdout.strip().splitlines()[-1])
+    print("warm-up:")
+    for name, seconds in timings.items():
+        print(f"  {seconds:8.3f}s  {name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=15, help="number of slowest imports to list")
+    parser.add_argument("--warm", default="", help='backends to warm up after import ("all" or comma list)')
+    args = parser.parse_args()
+
+    measure_import(args.top)
+    if args.warm:
+        from backend.providers import preload_names
+        measure_warm(preload_names(args.warm))
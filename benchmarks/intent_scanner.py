@@ -0,0 +1,100 @@
+"""
+Shows that the /ask intent scan is linear in message length.
+
+    python -m benchmarks.intent_scanner                 # scanner vs. the old regexes
+    python -m benchmarks.intent_scanner --sizes 1000 8000 64000 --no-legacy
+
+Inputs include the worst case for the old DISEASE_PATTERN: a long run of letters and
+spaces with no provider word, which its lazy group retries from every offset.
+The "per_char_ns" column should stay flat for the scanner as the size grows.
+"""
+import argparse
+import re
+import time
+
+from backend.safety_guards import scan_intent
+
+# Copies of the regexes the scanner replaced (kept here only for comparison)
+LEGACY_LOCATION_PATTERN = re.compile(
+    r"""
+    (?:
+        (?:find\s*(?:me\s*)?(?:a|some)?\s*)?
+        (?:good|best|top)?\s*
+        (?:nearby\s*)?
+        (?:doctors?|therapists?|psychiatrists?|clinics?|hospitals?)
+        (?:\s*(?:in|near|around|at|within|close\s*to)\s+)?
+        ([A-Za-z\s]+)
+    )
+    |
+    (?:
+        (?:any\s*)?(?:doctors?|therapists?|psychiatrists?|hospitals?|clinics?)
+        \s*(?:available\s*)?(?:nearby|around|close\s*to|in|at)\s+([A-Za-z\s]+)
+    )
+    """,
+    re.IGNORECASE | re.VERBOSE,
+)
+
+LEGACY_DISEASE_PATTERN = re.compile(
+    r"""
+    (?:
+        (?:top|best|good)?\s*
+        ([A-Za-z\s]+?)\s*
+        (?:doctors?|therapists?|psychiatrists?|specialists?|clinics?)\s+
+        (?:in|near|around|at|within|close\s*to)
+    )
+    |
+    (?:
+        (?:doctor|specialist|therapist)\s*(?:for|treating|who\s*treats)\s*
+        ([A-Za-z\s]+)
+    )
+    """,
+    re.IGNORECASE | re.VERBOSE,
+)
+
+CASES = {
+    # Letters and spaces with no provider word: the lazy disease group retries from every offset
+    "no_provider": lambda n: ("a " * (n // 2))[:n],
+    # Repeated almost-phrases: many partial emergency matches that never complete
+    "near_miss": lambda n: ("i'm so tired of everythin " * (n // 26 + 1))[:n],
+    # A real question buried in a pasted wall of text
+    "pasted_text": lambda n: ("blood test results look normal " * (n // 31 + 1))[:n]
+                             + " find a good skin doctor in Pune",
+}
+
+
+def legacy_scan(text: str):
+    LEGACY_LOCATION_PATTERN.search(text)
+    LEGACY_DISEASE_PATTERN.search(text)
+
+
+def best_of(func, text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 1000, 2000, 4000, 8000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-legacy", action="store_true", help="skip the (quadratic) old regexes")
+    args = parser.parse_args()
+
+    print(f"{'case':<12} {'chars':>7} {'scanner_ms':>11} {'per_char_ns':>12}"
+          + ("" if args.no_legacy else f" {'legacy_ms':>10} {'per_char_ns':>12}"))
+    for name, make in CASES.items():
+        for size in args.sizes:
+            text = make(size)
+            scanner = best_of(scan_intent, text, args.repeat)
+            line = f"{name:<12} {len(text):>7} {scanner * 1e3:>11.2f} {scanner * 1e9 / len(text):>12.0f}"
+            if not args.no_legacy:
+                legacy = best_of(legacy_scan, text, args.repeat)
+                line += f" {legacy * 1e3:>10.2f} {legacy * 1e9 / len(text):>12.0f}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
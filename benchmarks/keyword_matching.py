@@ -0,0 +1,107 @@
+"""
+Times fuzzy keyword extraction on a large synthetic OCR'd report.
+
+    python -m benchmarks.keyword_matching                        # 30 pages, built-in keywords
+    python -m benchmarks.keyword_matching --pages 60 --keywords 5000 --workers 1
+
+Compares the batched cdist pass (extract_keywords_fuzzy) with the old loop that called
+process.extractOne once per token, and checks that both find the same keywords.
+Pass --skip-legacy for large keyword lists, where the old loop takes minutes.
+"""
+import argparse
+import random
+import re
+import string
+import time
+
+from rapidfuzz import fuzz, process
+
+from backend.medical_pipeline import MEDICAL_KEYWORDS, FUZZY_THRESHOLD, extract_keywords_fuzzy
+
+WORDS_PER_PAGE = 450
+
+FILLER = (
+    "patient name age sex referred by date of collection sample serum plasma result unit "
+    "reference range normal high low test method remarks signature pathologist clinic"
+).split()
+
+
+def synthetic_keywords(count: int, rng: random.Random) -> list:
+    """The built-in list padded with random drug/test-like names."""
+    keywords = list(MEDICAL_KEYWORDS)
+    while len(keywords) < count:
+        size = rng.randint(5, 14)
+        keywords.append("".join(rng.choice(string.ascii_lowercase) for _ in range(size)))
+    return list(dict.fromkeys(keywords))[:count]
+
+
+def synthetic_report(pages: int, keywords: list, rng: random.Random) -> str:
+    """Lab-report-like text with numbers, units, OCR typos and a sprinkling of keywords."""
+    words = []
+    for _ in range(pages * WORDS_PER_PAGE):
+        roll = rng.random()
+        if roll < 0.05:
+            word = rng.choice(keywords)
+            if len(word) > 4 and rng.random() < 0.5:
+                i = rng.randrange(len(word))
+                word = word[:i] + rng.choice(string.ascii_lowercase) + word[i + 1:]  # OCR typo
+        elif roll < 0.25:
+            word = f"{rng.uniform(0, 500):.1f}{rng.choice(['', 'mg/dl', 'mmol/l', '%', 'g/dl'])}"
+        else:
+            word = rng.choice(FILLER)
+        words.append(word)
+    return " ".join(words)
+
+
+def legacy_extract(text: str, keywords: list) -> list:
+    """The per-token extractOne loop extract_keywords_fuzzy used before batching."""
+    found = set()
+    lower_text = text.lower()
+    for kw in keywords:
+        if kw in lower_text:
+            found.add(kw)
+
+    for token in re.findall(r"[A-Za-z0-9\/\-]+", lower_text):
+        match = process.extractOne(token, keywords, scorer=fuzz.partial_ratio)
+        if match and match[1] >= FUZZY_THRESHOLD:
+            found.add(match[0])
+
+    return sorted(found)
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=30)
+    parser.add_argument("--keywords", type=int, default=len(MEDICAL_KEYWORDS))
+    parser.add_argument("--workers", type=int, default=-1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    keywords = synthetic_keywords(args.keywords, rng)
+    text = synthetic_report(args.pages, keywords, rng)
+    tokens = re.findall(r"[A-Za-z0-9\/\-]+", text.lower())
+    print(f"report: {args.pages} pages, {len(text):,} chars, {len(tokens):,} tokens "
+          f"({len(set(tokens)):,} unique); keywords: {len(keywords):,}")
+
+    batched, batched_s = timed(extract_keywords_fuzzy, text, keywords, workers=args.workers)
+    print(f"batched cdist : {batched_s * 1e3:9.1f} ms  ({len(batched)} keywords found)")
+
+    if not args.skip_legacy:
+        legacy, legacy_s = timed(legacy_extract, text, keywords)
+        print(f"per-token loop: {legacy_s * 1e3:9.1f} ms  ({len(legacy)} keywords found)")
+        print(f"speed-up      : {legacy_s / batched_s:9.1f}x")
+        if legacy != batched:
+            print(f"MISMATCH: only legacy {sorted(set(legacy) - set(batched))}, "
+                  f"only batched {sorted(set(batched) - set(legacy))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Exercises the LLM router against local fake providers with injected delays and failures.
+
+    python -m benchmarks.llm_router                          # all scenarios, 300 requests each
+    python -m benchmarks.llm_router --requests 1000 --spike-rate 0.1 --concurrency 16
+
+Scenarios:
+  spikes  - the primary is usually fast but sometimes stalls; compares no hedging with hedging
+  outage  - the primary fails every call; shows failover and the circuit breaker opening
+  stream  - like spikes, through the streaming path (time to first chunk)
+No network access or API keys are needed.
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.llm_router import LLMProvider, LLMRouter
+
+
+class FakeProvider(LLMProvider):
+    """Answers after base*lognormal seconds; with spike_rate, after `spike` seconds; fails with fail_rate."""
+
+    def __init__(self, name, base, spike=0.0, spike_rate=0.0, fail_rate=0.0, seed=0):
+        super().__init__()
+        self.name = name
+        self.base = base
+        self.spike = spike
+        self.spike_rate = spike_rate
+        self.fail_rate = fail_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _delay(self):
+        with self._lock:
+            fail = self._rng.random() < self.fail_rate
+            spiked = self._rng.random() < self.spike_rate
+            jitter = self._rng.lognormvariate(0, 0.25)
+        return fail, (self.spike if spiked else self.base * jitter)
+
+    def _generate(self, prompt):
+        fail, delay = self._delay()
+        time.sleep(delay)
+        if fail:
+            raise RuntimeError(f"{self.name} injected failure")
+        return f"{self.name}: answer"
+
+    def _stream(self, prompt):
+        fail, delay = self._delay()
+        time.sleep(delay)
+        if fail:
+            raise RuntimeError(f"{self.name} injected failure")
+        for word in ("answer ", "from ", self.name):
+            time.sleep(self.base / 10)
+            yield word
+
+
+def percentiles(samples):
+    cuts = statistics.quantiles(samples, n=100)
+    return {"p50": cuts[49], "p95": cuts[94], "p99": cuts[98], "max": max(samples)}
+
+
+def drive(call, requests, concurrency):
+    """Runs call() `requests` times over `concurrency` threads; returns latencies and error count."""
+    latencies, errors = [], [0]
+
+    def one(_):
+        start = time.perf_counter()
+        try:
+            call()
+        except Exception:
+            errors[0] += 1
+            return
+        latencies.append(time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    return latencies, errors[0]
+
+
+def report(label, router, latencies, errors):
+    cuts = percentiles(latencies) if len(latencies) > 1 else {}
+    timings = "  ".join(f"{key} {value * 1000:7.1f} ms" for key, value in cuts.items())
+    counters = router.stats()
+    print(f"{label:<22} {timings}  errors {errors:3d}  hedges {counters['hedges']:3d} "
+          f"(won {counters['hedge_wins']:3d})  failovers {counters['failovers']:3d}")
+    for name, provider in counters["providers"].items():
+        print(f"{'':<22} {name:<9} calls {provider['calls']:4d}  errors {provider['errors']:4d}  "
+              f"p50 {provider['p50_ms']} ms  p95 {provider['p95_ms']} ms  "
+              f"first chunk p95 {provider['first_token_p95_ms']} ms  breaker {provider['breaker']}")
+
+
+def spike_providers(args, fail_rate=0.0):
+    return {
+        "primary": FakeProvider("primary", args.base, args.spike, args.spike_rate, fail_rate, seed=args.seed),
+        "secondary": FakeProvider("secondary", args.base * 1.5, seed=args.seed + 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--base", type=float, default=0.05, help="typical primary latency (s)")
+    parser.add_argument("--spike", type=float, default=1.0, help="stalled call latency (s)")
+    parser.add_argument("--spike-rate", type=float, default=0.05)
+    parser.add_argument("--min-delay", type=float, default=0.02, help="hedge delay floor (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    order = ["primary", "secondary"]
+    # Scaled to the fake latencies: the production defaults assume multi-second LLM calls
+    hedging = {"min_samples": 10, "default_delay": args.spike / 2, "min_delay": args.min_delay}
+    print(f"{args.requests} requests, concurrency {args.concurrency}, primary ~{args.base * 1000:.0f} ms "
+          f"with {args.spike_rate:.0%} stalls of {args.spike * 1000:.0f} ms\n")
+
+    for hedge in (False, True):
+        router = LLMRouter(spike_providers(args), hedge=hedge, **hedging)
+        latencies, errors = drive(lambda: router.generate("q", order), args.requests, args.concurrency)
+        report(f"spikes, hedge={hedge}", router, latencies, errors)
+
+    router = LLMRouter(spike_providers(args, fail_rate=1.0), hedge=True, **hedging)
+    latencies, errors = drive(lambda: router.generate("q", order), args.requests, args.concurrency)
+    report("outage, hedge=True", router, latencies, errors)
+
+    for hedge in (False, True):
+        router = LLMRouter(spike_providers(args), hedge=hedge, **hedging)
+
+        def first_chunk():
+            stream = router.stream("q", order)
+            next(stream)
+            stream.close()
+
+        latencies, errors = drive(first_chunk, args.requests, args.concurrency)
+        report(f"stream, hedge={hedge}", router, latencies, errors)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Offline load test: drives the FastAPI app in-process with every upstream replaced by a local fake.
+
+    python -m benchmarks.load_test                                   # /ask, /analyze_report, /analyze_trends
+    python -m benchmarks.load_test --endpoints ask ask_stream --requests 500 --concurrency 32
+    python -m benchmarks.load_test --gemini lognormal:1200:0.5 --groq const:300 --fixtures my_reports/
+
+Requests go through httpx's ASGI transport (no sockets), so routing, middleware, upload spooling,
+the LangGraph graph, PDF text extraction, OCR, DICOM decoding and image preprocessing all run for
+real; only Gemini, Groq, Google Maps, the imaging agent and Twilio are fakes (benchmarks/fakes.py)
+answering after the given latency (const:MS | uniform:LOW:HIGH | lognormal:MEDIAN[:SIGMA]).
+
+Per endpoint: p50/p95/p99/max latency, requests per second, HTTP errors, and responses that report a
+failure in their body (e.g. OCR backends missing locally), followed by the time spent per stage
+(from tracing.py). Result and answer caches are off unless --caches is given, so repeated uploads
+and questions are recomputed; identical work in flight at the same moment is still coalesced
+unless --no-coalesce is given (compare the two to see what it saves). No network access or API keys are needed.
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import statistics
+import tempfile
+import time
+
+ENDPOINTS = ("ask", "ask_stream", "analyze_report", "analyze_trends", "analyze_series")
+
+DISEASES = ("diabetes", "migraine", "asthma", "hypertension", "dengue", "anemia", "arthritis", "thyroid problems")
+CITIES = ("Pune", "Mumbai", "Bangalore", "Delhi", "Chennai")
+QUESTIONS = (
+    "What are the symptoms of {disease}?",
+    "How is {disease} usually treated?",
+    "Can {disease} be prevented with diet?",
+    "What tests are used to diagnose {disease}?",
+)
+MAPS_QUESTIONS = ("Find a doctor for {disease} in {city}", "I need a specialist for {disease} near {city}")
+EMERGENCY_MESSAGES = ("I want to end my life", "I took too many pills and can't breathe")
+
+# Bodies that are a 200 but report a failure (pipeline errors are returned as text)
+FAILURE_PATTERN = re.compile(r"error|could not|unsupported|no text found|difficulties", re.IGNORECASE)
+
+
+def ask_message(rng: random.Random, maps_rate: float, emergency_rate: float) -> str:
+    roll = rng.random()
+    if roll < emergency_rate:
+        return rng.choice(EMERGENCY_MESSAGES)
+    if roll < emergency_rate + maps_rate:
+        return rng.choice(MAPS_QUESTIONS).format(disease=rng.choice(DISEASES), city=rng.choice(CITIES))
+    return rng.choice(QUESTIONS).format(disease=rng.choice(DISEASES))
+
+
+def mime_type(name: str) -> str:
+    ext = os.path.splitext(name)[1].lower()
+    return {
+        ".pdf": "application/pdf", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png",
+        ".dcm": "application/dicom", ".zip": "application/zip",
+    }.get(ext, "application/octet-stream")
+
+
+def request_factory(endpoint: str, fixtures: dict, args, rng: random.Random):
+    """Returns make() -> (method, url, httpx request kwargs) for the endpoint."""
+    reports = [name for name in fixtures if not name.endswith(".zip")]
+    documents = [name for name in reports if name.endswith((".pdf", ".jpg", ".jpeg", ".png"))]
+    series = [name for name in fixtures if name.endswith((".zip", ".dcm"))]
+
+    def upload(field, name):
+        return (field, (name, fixtures[name], mime_type(name)))
+
+    if endpoint in ("ask", "ask_stream"):
+        url = "/ask" if endpoint == "ask" else "/ask/stream"
+        return lambda: ("POST", url, {"json": {"message": ask_message(rng, args.maps_rate, args.emergency_rate)}})
+    if endpoint == "analyze_report":
+        return lambda: ("POST", "/analyze_report", {"files": [upload("file", rng.choice(reports))]})
+    if endpoint == "analyze_trends":
+        def make():
+            names = [rng.choice(documents) for _ in range(args.trends_files)]
+            return "POST", "/analyze_trends", {"files": [upload("files", name) for name in names]}
+        return make
+    return lambda: ("POST", "/analyze_series", {"files": [upload("files", name) for name in series]})
+
+
+async def drive(client, make, requests: int, concurrency: int) -> dict:
+    """Runs `requests` requests over `concurrency` concurrent clients."""
+    latencies, errors, failures = [], 0, {}
+    remaining = [requests]
+
+    def note(message: str):
+        sample = " ".join(message[:100].split())
+        failures[sample] = failures.get(sample, 0) + 1
+
+    async def worker():
+        nonlocal errors
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            method, url, kwargs = make()
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                body = response.text
+            except Exception as e:
+                errors += 1
+                note(f"{type(e).__name__}: {e}")
+                continue
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+                note(f"HTTP {response.status_code}: {body}")
+            elif FAILURE_PATTERN.search(body[:300]):
+                note(body)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    return {"latencies": latencies, "errors": errors, "failures": failures, "wall": wall}
+
+
+def print_result(endpoint: str, result: dict):
+    latencies = result["latencies"]
+    if len(latencies) > 1:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        timings = (f"p50 {cuts[49] * 1000:8.1f} ms  p95 {cuts[94] * 1000:8.1f} ms  "
+                   f"p99 {cuts[98] * 1000:8.1f} ms  max {max(latencies) * 1000:8.1f} ms")
+    else:
+        timings = "too few samples"
+    rps = len(latencies) / result["wall"] if result["wall"] else 0.0
+    failed = sum(result["failures"].values()) - result["errors"]
+    print(f"{endpoint:<15} {timings}  {rps:7.1f} req/s  errors {result['errors']}  failed bodies {failed}")
+    for sample, count in sorted(result["failures"].items(), key=lambda item: -item[1])[:3]:
+        print(f"{'':<15} {count:>5}x {sample}")
+
+
+def print_stages(before: dict, after: dict, top: int = 8):
+    rows = []
+    for (stage,), (count, total) in after.items():
+        prev_count, prev_total = before.get((stage,), (0, 0.0))
+        if count > prev_count:
+            rows.append((total - prev_total, count - prev_count, stage))
+    for total, count, stage in sorted(rows, reverse=True)[:top]:
+        print(f"{'':<15} {stage:<28} {count:6d} calls  mean {total / count * 1000:8.1f} ms  total {total:7.2f} s")
+
+
+async def run(args, fixtures: dict):
+    import httpx
+
+    from backend.main import app
+    from backend.tracing import stage_seconds, upstream_seconds
+
+    rng = random.Random(args.seed)
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+            for endpoint in args.endpoints:
+                make = request_factory(endpoint, fixtures, args, rng)
+                if args.warmup:
+                    await drive(client, make, args.warmup, 1)  # lazy imports, OCR engines, first-call costs
+
+                stages, upstreams = stage_seconds.totals(), upstream_seconds.totals()
+                result = await drive(client, make, args.requests, args.concurrency)
+                print_result(endpoint, result)
+                print_stages(stages, stage_seconds.totals())
+                print_stages(upstreams, upstream_seconds.totals(), top=5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=["ask", "analyze_report", "analyze_trends"])
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=3, help="sequential requests per endpoint before measuring")
+    parser.add_argument("--gemini", default="lognormal:900:0.4", help="Gemini latency (chat, transcription, biomarkers)")
+    parser.add_argument("--groq", default="lognormal:400:0.3", help="Groq latency (report summaries)")
+    parser.add_argument("--maps", default="lognormal:150:0.3", help="Google Maps latency (per geocode/places call)")
+    parser.add_argument("--agent", default="lognormal:3000:0.3", help="imaging agent latency")
+    parser.add_argument("--twilio", default="const:400", help="Twilio call latency")
+    parser.add_argument("--maps-rate", type=float, default=0.2, help="share of /ask messages that are doctor searches")
+    parser.add_argument("--emergency-rate", type=float, default=0.0, help="share of /ask messages that trigger the emergency path")
+    parser.add_argument("--trends-files", type=int, default=3, help="reports per /analyze_trends request")
+    parser.add_argument("--fixtures", help="directory of upload samples (default: generated, see benchmarks.fixtures)")
+    parser.add_argument("--caches", action="store_true", help="keep the result and chat answer caches on")
+    parser.add_argument("--no-coalesce", action="store_true", help="don't join identical in-flight work")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from benchmarks.fakes import Latency
+    latencies = {name: Latency.parse(getattr(args, name)) for name in ("gemini", "groq", "maps", "agent", "twilio")}
+
+    # Configuration is read at import time: set it before anything imports backend.config
+    data_dir = tempfile.mkdtemp(prefix="mediflow-loadtest-")
+    os.environ.update({
+        "MEDIFLOW_DATA_DIR": data_dir,
+        "PRELOAD_BACKENDS": "",
+        "JOB_WORKERS": "0",
+        "GEMINI_RETRY_DEADLINE": "0",
+        "GOOGLE_API_KEY": os.environ.get("GOOGLE_API_KEY") or "loadtest",
+    })
+    if not args.caches:
+        os.environ.update({"RESULT_CACHE_ENABLED": "false", "CHAT_CACHE_ENABLED": "false"})
+    if args.no_coalesce:
+        os.environ["COALESCE_ENABLED"] = "false"
+
+    from benchmarks.fakes import install
+    from benchmarks.fixtures import build_fixtures, load_fixtures
+
+    fakes = install(latencies, args.seed)
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else build_fixtures(args.seed)
+
+    print(f"{args.requests} requests per endpoint, concurrency {args.concurrency}; fixtures: "
+          f"{', '.join(f'{name} ({len(data) / 1e3:.0f} kB)' for name, data in fixtures.items())}")
+    print("upstream latency: " + ", ".join(f"{name} {getattr(args, name)}" for name in latencies) + "\n")
+    asyncio.run(run(args, fixtures))
+    print("\nfake upstream calls: " + ", ".join(f"{name} {fake.calls}" for name, fake in fakes.items()))
+
+
+if __name__ == "__main__":
+    main()
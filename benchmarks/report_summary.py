@@ -0,0 +1,86 @@
+"""
+Compares one-call and map-reduce report summaries against a fake LLM whose latency grows with prompt size.
+
+    python -m benchmarks.report_summary                         # 2, 10, 25 and 50 page reports
+    python -m benchmarks.report_summary --pages 100 --workers 16
+
+The fake provider answers after overhead + prompt tokens / --tokens-per-second and returns
+--notes-tokens of text, roughly what an 8B model on Groq does for long prompts. For every report
+length it prints the latency of a single call on the whole text (the previous behaviour) and of
+interpret_report_with_llm (chunks summarized concurrently, then one reduce call).
+No network access or API keys are needed.
+"""
+import argparse
+import random
+import time
+
+import backend.medical_pipeline as pipeline
+from backend.chunking import CHARS_PER_TOKEN, PAGE_BREAK, estimate_tokens
+from backend.llm_router import LLMProvider, LLMRouter
+
+SECTIONS = ("HISTORY OF PRESENT ILLNESS", "Medications:", "Hospital Course:", "LABORATORY DATA", "Plan:")
+WORDS = (
+    "patient admitted stable afebrile sodium 138 mmol/L potassium 4.1 creatinine 1.2 mg/dL "
+    "metformin 500 mg twice daily chest pain resolved echo normal ejection fraction 55% follow up"
+).split()
+
+
+class FakeLLM(LLMProvider):
+    def __init__(self, name, overhead, tokens_per_second, notes_tokens):
+        super().__init__()
+        self.name = name
+        self.overhead = overhead
+        self.tokens_per_second = tokens_per_second
+        self.notes = "note " * notes_tokens
+
+    def _generate(self, prompt):
+        time.sleep(self.overhead + estimate_tokens(prompt) / self.tokens_per_second)
+        return self.notes
+
+
+def discharge_summary(pages: int, rng: random.Random) -> str:
+    """About 1300 tokens per page, five headed sections each."""
+    def paragraph():
+        return "\n".join(" ".join(rng.choice(WORDS) for _ in range(14)) for _ in range(10))
+
+    return PAGE_BREAK.join("\n".join(f"{s}\n{paragraph()}" for s in SECTIONS) for _ in range(pages))
+
+
+def timed(call):
+    start = time.perf_counter()
+    call()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[2, 10, 25, 50])
+    parser.add_argument("--chunk-tokens", type=int, default=pipeline.SUMMARY_CHUNK_TOKENS)
+    parser.add_argument("--workers", type=int, default=pipeline.SUMMARY_MAP_WORKERS)
+    parser.add_argument("--overhead", type=float, default=0.3, help="fixed latency per call (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=20000, help="prompt processing rate")
+    parser.add_argument("--notes-tokens", type=int, default=250, help="length of every fake answer")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    llm = FakeLLM("fake", args.overhead, args.tokens_per_second, args.notes_tokens)
+    pipeline.llm_router = LLMRouter({"fake": llm}, hedge=False)
+    pipeline.LLM_REPORT_PROVIDERS = ["fake"]
+    pipeline.SUMMARY_CHUNK_TOKENS = args.chunk_tokens
+    pipeline.SUMMARY_MAP_WORKERS = args.workers
+
+    rng = random.Random(args.seed)
+    print(f"chunks of {args.chunk_tokens} tokens, {args.workers} workers, "
+          f"fake LLM {args.overhead * 1000:.0f} ms + {args.tokens_per_second:g} tokens/s\n")
+    print(f"{'pages':>5} {'tokens':>8} {'one call':>10} {'map-reduce':>11} {'LLM calls':>10}")
+    for pages in args.pages:
+        text = discharge_summary(pages, rng)
+        single = timed(lambda: llm.generate(f"{pipeline.SUMMARY_SYSTEM_PROMPT}\n\nExtracted Text:\n{text}"))
+        calls = llm.calls
+        chunked = timed(lambda: pipeline.interpret_report_with_llm(text, ["HbA1c", "Creatinine"]))
+        print(f"{pages:>5} {len(text) // CHARS_PER_TOKEN:>8} {single * 1000:>7.0f} ms "
+              f"{chunked * 1000:>8.0f} ms {llm.calls - calls:>10}")
+
+
+if __name__ == "__main__":
+    main()
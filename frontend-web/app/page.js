@@ -14,15 +14,44 @@ export default function Home() {
   const [isTyping, setIsTyping] = useState(false);
   const [docContext, setDocContext] = useState(null);
   const [historySessions, setHistorySessions] = useState([]); // New state for history
+  const [sessionId, setSessionId] = useState(null); // Server-side conversation (POST /sessions)
 
   // Backend Endpoints
   const CHAT_ENDPOINT = "http://localhost:8000/ask";
+  const SESSIONS_ENDPOINT = "http://localhost:8000/sessions";
   const UPLOAD_ENDPOINT = "http://localhost:8000/analyze_report";
 
   const getCurrentTime = () => {
     return new Date().toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
   };
 
+  // The backend keeps the conversation (with a bounded prompt context) per session.
+  // fresh=true replaces the current one (e.g. after the server expired or deleted it)
+  const ensureSession = async (fresh = false) => {
+    if (sessionId && !fresh) return sessionId;
+    try {
+      const response = await axios.post(SESSIONS_ENDPOINT);
+      setSessionId(response.data.session_id);
+      return response.data.session_id;
+    } catch (error) {
+      console.error("Session Error:", error);
+      return null; // Chat still works, just without server-side memory
+    }
+  };
+
+  // Sessions expire on the server (or get deleted): on a 404, start a new one and resend once
+  const askInSession = async (message) => {
+    const session = await ensureSession();
+    try {
+      return await axios.post(CHAT_ENDPOINT, { message, session_id: session });
+    } catch (error) {
+      if (!session || error.response?.status !== 404) throw error;
+      setSessionId(null);
+      const freshSession = await ensureSession(true);
+      return axios.post(CHAT_ENDPOINT, { message, session_id: freshSession });
+    }
+  };
+
   const handleSendMessage = async (text) => {
     const timestamp = getCurrentTime();
     // Optimistic UI Update
@@ -38,7 +67,7 @@ export default function Home() {
         payload = `[System Note: Context from uploaded medical file]\n${docContext}\n\n[User Question]: ${text}`;
       }
 
-      const response = await axios.post(CHAT_ENDPOINT, { message: payload });
+      const response = await askInSession(payload);
 
       const aiMsg = {
         role: 'assistant',
@@ -10,7 +10,8 @@ const TrendAnalyzer = () => {
     const [error, setError] = useState(null);
     const [selectedMetric, setSelectedMetric] = useState(null);
 
-    const UPLOAD_ENDPOINT = "http://localhost:8000/analyze_trends";
+    // Series are grouped, unit-normalized and date-sorted by the backend (trends.py)
+    const UPLOAD_ENDPOINT = "http://localhost:8000/analyze_trends?view=series";
 
     const handleFileDrop = (e) => {
         e.preventDefault();
@@ -41,36 +42,13 @@ const TrendAnalyzer = () => {
             const results = response.data;
             if (results.error) throw new Error(results.error);
 
-            // Process data for charts
-            // 1. Collect all unique metrics
-            const metricsMap = {}; // { "Hemoglobin": [{date: "2024-01", value: 13}, ...] }
-
-            results.forEach(report => {
-                if (report.date && report.metrics) {
-                    report.metrics.forEach(m => {
-                        if (!metricsMap[m.name]) metricsMap[m.name] = [];
-                        metricsMap[m.name].push({
-                            date: report.date,
-                            value: m.value,
-                            unit: m.unit,
-                            filename: report.filename
-                        });
-                    });
-                }
-            });
-
-            // Filter out metrics with only 1 data point (no trend)
-            const validMetrics = Object.keys(metricsMap).filter(k => metricsMap[k].length > 1);
-
-            if (validMetrics.length === 0 && results.length > 0) {
-                // Fallback: Show even single points if that's all we have
-                setTrendData(metricsMap);
-                setSelectedMetric(Object.keys(metricsMap)[0]);
-            } else {
-                setTrendData(metricsMap);
-                setSelectedMetric(validMetrics[0] || Object.keys(metricsMap)[0]);
-            }
+            // { "Hemoglobin": { unit, dates: [...], values: [...], flags: [...], delta, slope_per_year, ... } }
+            const series = results.series || {};
+            const names = Object.keys(series);
 
+            // Prefer a metric with more than 1 data point (a trend), else show single points
+            setTrendData(series);
+            setSelectedMetric(names.find(name => series[name].values.length > 1) || names[0]);
         } catch (err) {
             console.error(err);
             let msg = "Failed to analyze trends.";
@@ -90,11 +68,14 @@ const TrendAnalyzer = () => {
     };
 
     const chartData = useMemo(() => {
-        if (!trendData || !selectedMetric) return [];
-        // Sort by date (create copy first to avoid mutating state)
-        return [...trendData[selectedMetric]].sort((a, b) => new Date(a.date) - new Date(b.date));
+        if (!trendData || !selectedMetric || !trendData[selectedMetric]) return [];
+        // Columnar series → recharts rows (already sorted by date)
+        const { dates, values, flags, unit } = trendData[selectedMetric];
+        return dates.map((date, i) => ({ date, value: values[i], flag: flags[i], unit }));
     }, [trendData, selectedMetric]);
 
+    const selectedSeries = trendData && selectedMetric ? trendData[selectedMetric] : null;
+
     return (
         <main className="analyzer-container glass-panel">
             <div className="layout-grid">
@@ -211,7 +192,7 @@ const TrendAnalyzer = () => {
                                     <h4>Trend</h4>
                                     <p>
                                         {(chartData.length > 1)
-                                            ? (chartData[chartData.length - 1]?.value < chartData[0]?.value ? '⬇️ Decreasing' : '⬆️ Increasing')
+                                            ? (selectedSeries.delta < 0 ? '⬇️ Decreasing' : '⬆️ Increasing')
                                             : 'Not enough data'}
                                     </p>
                                 </div>
@@ -0,0 +1,11 @@
+import os
+import tempfile
+
+# backend.config reads the environment at import time: point every store at a scratch
+# directory and keep background threads and warm-up out of the tests
+os.environ.update({
+    "MEDIFLOW_DATA_DIR": tempfile.mkdtemp(prefix="mediflow-tests-"),
+    "PRELOAD_BACKENDS": "",
+    "JOB_WORKERS": "0",
+    "EMERGENCY_DISPATCHERS": "0",
+})
@@ -0,0 +1,26 @@
+import pytest
+
+from backend.biomarkers import parse_lab_text
+
+# (report line, expected (name, value, unit, reference range or None))
+SAMPLES = [
+    ("Fasting Blood Sugar 104 mg/dL 70 - 100", ("Glucose Fasting", 104, "mg/dL", {"low": 70, "high": 100})),
+    ("HbA1c (HPLC) : 6.1 % 4.0 - 5.6", ("HbA1c", 6.1, "%", {"low": 4.0, "high": 5.6})),
+    ("LDL Cholesterol 142 mg/dL < 100", ("LDL Cholesterol", 142, "mg/dL", {"high": 100})),
+    ("Glucose, Fasting (FBS) : 110 mg/dL H 70-100", ("Glucose Fasting", 110, "mg/dL", {"low": 70, "high": 100})),
+]
+
+
+@pytest.mark.parametrize("line, expected", SAMPLES)
+def test_parses_sample_lines(line, expected):
+    parsed = parse_lab_text(line)
+    assert parsed.unresolved == []
+    [metric] = parsed.metrics
+    name, value, unit, reference_range = expected
+    assert (metric["name"], metric["value"], metric["unit"]) == (name, value, unit)
+    assert metric.get("reference_range") == reference_range
+
+
+def test_gap_naming_another_analyte_is_rejected():
+    parsed = parse_lab_text("Hemoglobin  Platelet count 250 10^3/uL")
+    assert [m["name"] for m in parsed.metrics] == ["Platelets"]
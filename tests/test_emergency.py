@@ -0,0 +1,116 @@
+import time
+
+import pytest
+
+from backend import emergency
+from backend.emergency import EmergencyOutbox, deliver, retry_delay
+
+
+class FakeTwilio:
+    """place_call stand-in: fails the first `failures` calls, then returns call SIDs."""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.attempts = 0
+
+    def __call__(self) -> str:
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise ConnectionError("503 Service Unavailable")
+        return f"CA{self.attempts:032d}"
+
+
+@pytest.fixture
+def outbox(tmp_path, monkeypatch):
+    store = EmergencyOutbox(str(tmp_path / "emergency.sqlite3"))
+    monkeypatch.setattr(emergency, "emergency_outbox", store)
+    monkeypatch.setattr(emergency, "EMERGENCY_RETRY_BASE_SECONDS", 0.05)
+    monkeypatch.setattr(emergency, "EMERGENCY_RETRY_MAX_SECONDS", 0.2)
+    monkeypatch.setattr(emergency, "EMERGENCY_MAX_ATTEMPTS", 3)
+    return store
+
+
+def drain(outbox, place_call, timeout: float = 5.0):
+    """Delivers every due call until none is pending, like dispatcher_loop."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        claimed = outbox.claim()
+        if claimed is not None:
+            deliver(*claimed, place_call=place_call)
+        elif not outbox.stats()["calls"].get("pending"):
+            return
+        else:
+            time.sleep(0.01)
+    raise AssertionError("outbox did not drain")
+
+
+def test_one_call_per_caller_within_cooldown(outbox):
+    first, queued = outbox.enqueue("session:a")
+    assert queued
+    for _ in range(3):
+        assert outbox.enqueue("session:a") == (first, False)
+    _, queued = outbox.enqueue("session:b")
+    assert queued
+
+    rows = outbox.conn().execute("SELECT caller, suppressed FROM emergency_calls ORDER BY caller").fetchall()
+    assert [(row["caller"], row["suppressed"]) for row in rows] == [("session:a", 3), ("session:b", 0)]
+    assert outbox.stats() == {"calls": {"pending": 2}, "deduplicated": 3}
+
+
+def test_new_call_after_cooldown(outbox):
+    first, _ = outbox.enqueue("session:a", cooldown=0.05)
+    time.sleep(0.1)
+    second, queued = outbox.enqueue("session:a", cooldown=0.05)
+    assert queued and second != first
+
+
+def test_repeats_join_a_sent_call(outbox):
+    call_id, _ = outbox.enqueue("session:a")
+    drain(outbox, FakeTwilio())
+    assert outbox.enqueue("session:a") == (call_id, False)
+    assert outbox.get(call_id)["suppressed"] == 1
+
+
+def test_failed_call_is_retried_with_backoff_until_sent(outbox):
+    call_id, _ = outbox.enqueue("session:a")
+    twilio = FakeTwilio(failures=2)
+
+    deliver(*outbox.claim(), place_call=twilio)
+    call = outbox.get(call_id)
+    assert call["status"] == "pending" and call["attempts"] == 1
+    assert call["next_attempt"] > time.time()  # not due again right away
+    assert outbox.claim() is None
+
+    drain(outbox, twilio)
+    call = outbox.get(call_id)
+    assert (call["status"], call["attempts"], call["call_sid"]) == ("sent", 3, f"CA{3:032d}")
+    assert call["error"] is None
+
+
+def test_call_fails_after_max_attempts(outbox):
+    call_id, _ = outbox.enqueue("session:a")
+    twilio = FakeTwilio(failures=100)
+    drain(outbox, twilio)
+
+    call = outbox.get(call_id)
+    assert call["status"] == "failed"
+    assert call["attempts"] == twilio.attempts == emergency.EMERGENCY_MAX_ATTEMPTS
+    assert "503" in call["error"]
+
+    # A failed call doesn't suppress the next emergency from the same caller
+    _, queued = outbox.enqueue("session:a")
+    assert queued
+
+
+def test_expired_lease_is_claimed_again(outbox, monkeypatch):
+    monkeypatch.setattr(emergency, "EMERGENCY_LEASE_SECONDS", 0.05)
+    call_id, _ = outbox.enqueue("session:a")
+    assert outbox.claim() == (call_id, 1)  # dispatcher dies without an outcome
+    assert outbox.claim() is None
+    time.sleep(0.1)
+    assert outbox.claim() == (call_id, 2)
+
+
+def test_retry_delay_doubles_and_is_capped(outbox):
+    for attempt, base in ((1, 0.05), (2, 0.1), (3, 0.2), (6, 0.2)):
+        assert base * 0.8 <= retry_delay(attempt) <= base * 1.2
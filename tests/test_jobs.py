@@ -0,0 +1,82 @@
+import os
+import threading
+import time
+
+import pytest
+
+from backend import jobs
+from backend.jobs import JobStore, job_dir, run_job
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(jobs, "job_store", store)
+    monkeypatch.setattr(jobs, "JOB_LEASE_SECONDS", 0.15)
+    return store
+
+
+def with_input(job_id: str) -> str:
+    directory = job_dir(job_id)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "0.pdf")
+    open(path, "wb").close()
+    return path
+
+
+def test_stale_attempt_cannot_overwrite_the_new_owner(store):
+    job_id = store.submit("echo", {})
+    assert store.claim()[:2] == (job_id, 1)
+    time.sleep(0.2)  # worker stalls past its lease
+    assert store.claim()[:2] == (job_id, 2)
+
+    assert not store.set_stage(job_id, 1, "summarizing")
+    assert not store.fail(job_id, 1, "late failure")
+    assert store.finish(job_id, 2, {"ok": True})
+    job = store.get(job_id)
+    assert (job["status"], job["result"], job["error"]) == ("done", {"ok": True}, None)
+
+
+def test_heartbeat_keeps_a_long_handler_leased(store, monkeypatch):
+    claimed_meanwhile = []
+
+    def slow(payload, progress):
+        for _ in range(4):  # no progress() calls, well past the lease
+            time.sleep(0.1)
+            claimed_meanwhile.append(store.claim())
+        return {"ok": True}
+
+    monkeypatch.setitem(jobs.HANDLERS, "slow", slow)
+    job_id = store.submit("slow", {})
+    path = with_input(job_id)
+    run_job(*store.claim())
+
+    assert claimed_meanwhile == [None] * 4
+    job = store.get(job_id)
+    assert (job["status"], job["attempts"]) == ("done", 1)
+    assert not os.path.exists(path)
+
+
+def test_superseded_attempt_leaves_inputs_to_the_new_owner(store, monkeypatch):
+    takeover = threading.Event()
+
+    def stalled(payload, progress):
+        takeover.wait(5)
+        raise RuntimeError("stale worker")
+
+    monkeypatch.setitem(jobs.HANDLERS, "stalled", stalled)
+    monkeypatch.setattr(jobs, "heartbeat", lambda *args: None)  # a worker that stopped renewing
+    job_id = store.submit("stalled", {})
+    path = with_input(job_id)
+    first = store.claim()
+
+    worker = threading.Thread(target=run_job, args=first)
+    worker.start()
+    time.sleep(0.2)
+    assert store.claim()[:2] == (job_id, 2)
+    takeover.set()
+    worker.join(5)
+
+    assert os.path.exists(path)
+    job = store.get(job_id)
+    assert (job["status"], job["error"]) == ("running", None)
@@ -0,0 +1,162 @@
+import time
+
+import pytest
+
+from backend.llm_router import CircuitBreaker, LLMRouter
+from benchmarks.llm_router import FakeProvider
+
+FAST = 0.01
+SLOW = 0.6
+HEDGE_AFTER = 0.1
+
+
+def fast(name):
+    return FakeProvider(name, base=FAST)
+
+
+def slow(name):
+    """Every call stalls for SLOW seconds."""
+    return FakeProvider(name, base=FAST, spike=SLOW, spike_rate=1.0)
+
+
+def failing(name):
+    return FakeProvider(name, base=FAST, fail_rate=1.0)
+
+
+def make_router(primary, backup, **kwargs):
+    kwargs = {"default_delay": HEDGE_AFTER, "min_delay": HEDGE_AFTER, "min_samples": 1000, **kwargs}
+    return LLMRouter({"gemini": primary, "groq": backup}, **kwargs)
+
+
+ORDER = ["gemini", "groq"]
+
+
+def timed(call):
+    start = time.perf_counter()
+    result = call()
+    return result, time.perf_counter() - start
+
+
+# -----------------------------------------------------------
+# generate
+# -----------------------------------------------------------
+def test_fast_primary_answers_without_hedging():
+    router = make_router(fast("gemini"), fast("groq"))
+    assert router.generate("q", ORDER) == "gemini: answer"
+    assert router.counters["hedges"] == 0
+    assert router.providers["groq"].calls == 0
+
+
+def test_failure_fails_over_to_next_provider():
+    router = make_router(failing("gemini"), fast("groq"))
+    assert router.generate("q", ORDER) == "groq: answer"
+    assert router.counters["failovers"] == 1
+
+
+def test_slow_primary_is_hedged_and_backup_wins():
+    router = make_router(slow("gemini"), fast("groq"))
+    answer, elapsed = timed(lambda: router.generate("q", ORDER))
+    assert answer == "groq: answer"
+    assert elapsed < SLOW / 2
+    assert router.counters["hedges"] == 1
+    assert router.counters["hedge_wins"] == 1
+
+
+def test_hedging_disabled_waits_for_primary():
+    router = make_router(slow("gemini"), fast("groq"), hedge=False)
+    answer, elapsed = timed(lambda: router.generate("q", ORDER))
+    assert answer == "gemini: answer"
+    assert elapsed >= SLOW
+    assert router.providers["groq"].calls == 0
+
+
+def test_every_provider_failing_raises():
+    router = make_router(failing("gemini"), failing("groq"))
+    with pytest.raises(RuntimeError, match="No LLM provider answered"):
+        router.generate("q", ORDER)
+    assert router.counters["unavailable"] == 1
+
+
+def test_breaker_opens_then_half_open_trial_closes_it():
+    primary = failing("gemini")
+    primary.breaker = CircuitBreaker(failures=2, cooldown=0.2)
+    router = make_router(primary, fast("groq"))
+
+    for _ in range(2):
+        assert router.generate("q", ORDER) == "groq: answer"
+    assert primary.breaker.state == "open"
+
+    # Open: the primary is skipped entirely
+    assert router.generate("q", ORDER) == "groq: answer"
+    assert primary.calls == 2
+
+    # After the cooldown one trial goes through; a success closes the breaker
+    time.sleep(0.25)
+    primary.fail_rate = 0.0
+    assert router.generate("q", ORDER) == "gemini: answer"
+    assert primary.breaker.state == "closed"
+    assert primary.calls == 3
+
+
+def test_failed_half_open_trial_reopens_breaker():
+    primary = failing("gemini")
+    primary.breaker = CircuitBreaker(failures=1, cooldown=0.2)
+    router = make_router(primary, fast("groq"))
+
+    router.generate("q", ORDER)
+    assert primary.breaker.state == "open"
+    time.sleep(0.25)
+    assert router.generate("q", ORDER) == "groq: answer"
+    assert primary.calls == 2
+    assert primary.breaker.state == "open"
+    assert primary.breaker.opened == 2
+
+
+# -----------------------------------------------------------
+# stream
+# -----------------------------------------------------------
+def test_stream_yields_primary_chunks():
+    router = make_router(fast("gemini"), fast("groq"))
+    assert "".join(router.stream("q", ORDER)) == "answer from gemini"
+
+
+def test_stream_fails_over_before_first_chunk():
+    router = make_router(failing("gemini"), fast("groq"))
+    assert "".join(router.stream("q", ORDER)) == "answer from groq"
+    assert router.counters["failovers"] == 1
+
+
+def test_stream_hedges_slow_first_chunk():
+    primary = slow("gemini")
+    router = make_router(primary, fast("groq"))
+    text, elapsed = timed(lambda: "".join(router.stream("q", ORDER)))
+    assert text == "answer from groq"
+    assert elapsed < SLOW / 2
+    assert router.counters["hedge_wins"] == 1
+
+    # The losing stream is cancelled: it records neither a latency nor a failure
+    time.sleep(SLOW + 0.1)
+    assert len(primary.latency) == 0
+    assert primary.errors == 0
+
+
+class MidStreamFailure(FakeProvider):
+    def _stream(self, prompt):
+        yield "partial "
+        raise RuntimeError("connection reset")
+
+
+def test_stream_failure_after_first_chunk_is_raised():
+    router = make_router(MidStreamFailure("gemini", base=FAST), fast("groq"))
+    chunks = []
+    with pytest.raises(RuntimeError, match="connection reset"):
+        for chunk in router.stream("q", ORDER):
+            chunks.append(chunk)
+    assert chunks == ["partial "]
+    assert router.providers["groq"].calls == 0
+
+
+def test_stream_with_every_provider_failing_raises():
+    router = make_router(failing("gemini"), failing("groq"))
+    with pytest.raises(RuntimeError, match="No LLM provider answered"):
+        list(router.stream("q", ORDER))
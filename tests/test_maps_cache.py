@@ -0,0 +1,105 @@
+import time
+
+import pytest
+
+from backend import aiagent, providers
+from backend.aiagent import geocode_cache, places_cache, geocode_location, nearby_places, execute_maps_search
+
+PUNE = {"geometry": {"location": {"lat": 18.5204, "lng": 73.8567}}}
+
+
+class FakeMapsClient:
+    """googlemaps.Client stand-in counting calls; fail=True makes the next calls raise."""
+
+    def __init__(self):
+        self.geocodes = []
+        self.searches = []
+        self.fail = False
+
+    def geocode(self, location):
+        self.geocodes.append(location)
+        if self.fail:
+            raise ConnectionError("maps unavailable")
+        if location.lower().startswith("nowhere"):
+            return []
+        return [PUNE]
+
+    def places_nearby(self, location=None, radius=None, keyword=None, type=None):
+        self.searches.append(keyword)
+        if self.fail:
+            raise ConnectionError("maps unavailable")
+        return {"results": [{"name": "City Clinic", "vicinity": "1 Main Road", "rating": 4.5}]}
+
+
+@pytest.fixture
+def maps(monkeypatch):
+    client = FakeMapsClient()
+    monkeypatch.setitem(providers._instances, "gmaps", client)
+    for cache in (geocode_cache, places_cache):
+        cache.clear()
+        monkeypatch.setattr(cache, "hits", 0)
+        monkeypatch.setattr(cache, "misses", 0)
+    return client
+
+
+def test_geocode_hits_cache_for_normalized_location(maps):
+    assert geocode_location("Pune") == (18.5204, 73.8567)
+    assert geocode_location("  pune, ") == (18.5204, 73.8567)
+    assert maps.geocodes == ["Pune"]
+    assert geocode_cache.stats()["hits"] == 1
+
+
+def test_places_hit_cache_for_same_area_and_specialist(maps):
+    coords = geocode_location("Pune")
+    first = nearby_places(coords, "cardiologist", "Pune")
+    assert nearby_places(coords, "cardiologist", "Pune") == first
+    nearby_places(coords, "dermatologist", "Pune")
+    assert maps.searches == ["cardiologist in Pune", "dermatologist in Pune"]
+    assert places_cache.stats()["hits"] == 1
+
+
+def test_entries_expire_after_ttl(maps, monkeypatch):
+    monkeypatch.setattr(geocode_cache, "ttl", 0.05)
+    geocode_location("Pune")
+    geocode_location("Pune")
+    time.sleep(0.1)
+    geocode_location("Pune")
+    assert maps.geocodes == ["Pune", "Pune"]
+
+
+def test_least_recently_used_entry_is_evicted(maps, monkeypatch):
+    monkeypatch.setattr(geocode_cache, "max_items", 2)
+    geocode_location("Pune")
+    geocode_location("Mumbai")
+    geocode_location("Pune")  # Mumbai is now the least recently used
+    geocode_location("Delhi")
+    assert len(geocode_cache) == 2
+
+    geocode_location("Pune")
+    geocode_location("Mumbai")
+    assert maps.geocodes == ["Pune", "Mumbai", "Delhi", "Mumbai"]
+
+
+def test_errors_and_empty_results_are_not_cached(maps):
+    maps.fail = True
+    assert execute_maps_search("Pune", specialist="cardiologist").startswith("❌ Could not fetch data")
+    assert len(geocode_cache) == 0 and len(places_cache) == 0
+
+    maps.fail = False
+    assert "City Clinic" in execute_maps_search("Pune", specialist="cardiologist")
+    assert maps.geocodes == ["Pune", "Pune"]
+
+    assert geocode_location("Nowhere Land") is None
+    assert geocode_location("Nowhere Land") is None
+    assert maps.geocodes.count("Nowhere Land") == 2
+
+
+def test_failed_place_search_is_retried(maps):
+    coords = geocode_location("Pune")
+    maps.fail = True
+    with pytest.raises(ConnectionError):
+        nearby_places(coords, "cardiologist", "Pune")
+    maps.fail = False
+    assert nearby_places(coords, "cardiologist", "Pune")
+    assert len(maps.searches) == 2
+    assert aiagent.maps_cache_stats()["places"]["size"] == 1
@@ -0,0 +1,71 @@
+import pytest
+
+from backend.safety_guards import detect_emergency, scan_intent
+
+# Where /ask sent each message when safety_guards used the three regexes (git 2d3cc28):
+# EMERGENCY_PATTERN -> "emergency", a LOCATION_PATTERN match -> "maps", anything else -> "chat"
+REGEX_ROUTES = [
+    ("I want to kill myself", "emergency"),
+    ("I think I took an overdose", "emergency"),
+    ("I've been thinking about suicide", "emergency"),
+    ("I keep wanting to hurt myself", "emergency"),
+    ("Nobody would miss me", "emergency"),
+    ("I'm a burden to everyone", "emergency"),
+    ("What's the point anymore", "emergency"),
+    ("I can't go on like this", "emergency"),
+    ("I don't want to exist", "emergency"),
+    ("I'm so tired of everything", "emergency"),
+    ("find me a good doctor in Pune", "maps"),
+    ("doctors near Andheri", "maps"),
+    ("best hospitals in Mumbai", "maps"),
+    ("any clinics available near Baner", "maps"),
+    ("therapist around Koregaon Park", "maps"),
+    ("psychiatrists in Delhi", "maps"),
+    ("find a good skin doctor in Pune", "maps"),
+    ("doctor for diabetes in Kolkata", "maps"),
+    ("good clinics close to MG Road", "maps"),
+    ("What are the symptoms of asthma?", "chat"),
+    ("Is ibuprofen safe with alcohol?", "chat"),
+    ("my cholesterol is 240, is that bad", "chat"),
+    ("what does a cardiologist do", "chat"),
+    ("how do oncologists treat cancer", "chat"),
+    ("my dentist said I need a root canal", "chat"),
+    ("should I see a dermatologist for acne", "chat"),
+    ("can an endocrinologist help with thyroid problems", "chat"),
+    ("is a cardiologist the right specialist for chest pain", "chat"),
+]
+
+# Deliberate differences: a named specialist followed by a preposition searches maps, and
+# emergency phrases ignore apostrophes and spacing
+NEW_ROUTES = [
+    ("Cardiologist in Kolkata", "maps"),
+    ("dentist near Baner", "maps"),
+    ("Heart specialist in Pune", "maps"),
+    ("self harm", "emergency"),
+    ("im a burden", "emergency"),
+]
+
+
+def route(text: str) -> str:
+    intent = scan_intent(text)
+    if intent.is_emergency:
+        return "emergency"
+    return "maps" if intent.location else "chat"
+
+
+@pytest.mark.parametrize("text, expected", REGEX_ROUTES + NEW_ROUTES)
+def test_routes(text, expected):
+    assert route(text) == expected
+    assert detect_emergency(text) == (expected == "emergency")
+
+
+@pytest.mark.parametrize("text, location, disease, specialist", [
+    ("find a good skin doctor in Pune", "Pune", "skin", "dermatologist"),
+    ("doctor for diabetes in Kolkata", "Kolkata", "diabetes", "endocrinologist"),
+    ("any clinics available near Baner", "Baner", None, None),
+    ("Cardiologist in Kolkata", "Kolkata", None, "cardiologist"),
+    ("dentist close to MG Road", "MG Road", None, "dentist"),
+])
+def test_maps_query_fields(text, location, disease, specialist):
+    intent = scan_intent(text)
+    assert (intent.location, intent.disease, intent.specialist) == (location, disease, specialist)